@@ -0,0 +1,208 @@
+"""
+* Append-only store of extracted document texts in a single memory-mapped file, shared between processes without copying.
+"""
+
+import json
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except (
+    ImportError
+):  # not available on Windows, where a store must only have one writing process
+    fcntl = None
+
+DATA_FILE = "texts.dat"
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = "write.lock"
+
+
+class CorpusStore:
+    """Texts appended to one data file, with an index of the byte range of each CELEX number.
+
+    The data file is memory-mapped for reading, so processes that open the same store share its pages, and
+    `get_bytes` slices a document without copying it. Texts are only ever appended: adding a CELEX number again
+    stores the new text and points the index to it. The index is a JSON lines file of `[celex, offset, length]`
+    that is appended after the text is written, so an interrupted write never leaves an entry without its text.
+    Several processes may add to the same store: each append holds an exclusive lock on a lock file of the store
+    (on POSIX systems; on Windows only one process may write to a store).
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.corpus import CorpusStore
+    >>> eur = Eurlex()
+    >>> with CorpusStore("corpus") as corpus:
+    ...     corpus.fetch(eur, ["32016R0679", "32014R0001"])
+    ...     corpus["32016R0679"][:100]
+    """
+
+    def __init__(self, path: str):
+        """
+        Parameters
+        ----------
+        path: str
+            The directory of the store, which is created if it does not exist
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._data_path = os.path.join(path, DATA_FILE)
+        self._index_path = os.path.join(path, INDEX_FILE)
+        self._lock_path = os.path.join(path, LOCK_FILE)
+        for filename in (self._data_path, self._index_path):
+            if not os.path.exists(filename):
+                open(filename, "ab").close()  # pylint: disable=consider-using-with
+        self.offsets = {}
+        self._index_position = 0
+        self._lock = threading.Lock()
+        # kept open for the lifetime of the store, as the memory map is created from it
+        self._reader = open(  # pylint: disable=consider-using-with
+            self._data_path, "rb"
+        )
+        self._mmap = None
+        self.refresh()
+
+    def refresh(self):
+        """Reads index entries appended since the store was opened or last refreshed, f.e. by another process."""
+        size = os.path.getsize(self._data_path)
+        with open(self._index_path, "rb") as reader:
+            reader.seek(self._index_position)
+            for line in reader:
+                if not line.endswith(b"\n"):
+                    # the writer has not finished this entry yet
+                    break
+                try:
+                    celex, offset, length = json.loads(line)
+                except ValueError:
+                    # an entry that a crashed writer left unfinished, which the next writer terminated
+                    self._index_position += len(line)
+                    continue
+                if offset + length > size:
+                    # the entry and its text were appended after the size was read
+                    size = os.path.getsize(self._data_path)
+                    if offset + length > size:
+                        # read again by the next refresh
+                        break
+                self.offsets[celex] = (offset, length)
+                self._index_position += len(line)
+
+    def _view(self, end: int):
+        """Returns the memory map of the data file, mapping it again if it has grown beyond `end`."""
+        if self._mmap is None or len(self._mmap) < end:
+            # the previous map is not closed, as views returned by get_bytes may still refer to it
+            self._mmap = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, celex):
+        return celex in self.offsets
+
+    def __iter__(self):
+        return iter(list(self.offsets))
+
+    def __getitem__(self, celex):
+        return self.get(celex)
+
+    def get_bytes(self, celex: str):
+        """Returns the UTF-8 encoded text of a document as a zero-copy memoryview of the memory-mapped data file."""
+        offset, length = self.offsets[celex]
+        if length == 0:
+            return memoryview(b"")
+        return memoryview(self._view(offset + length))[offset : offset + length]
+
+    def get(self, celex: str, default=None):
+        """Returns the text of a document, or `default` if it is not in the store."""
+        if celex not in self.offsets:
+            return default
+        view = self.get_bytes(celex)
+        try:
+            return str(view, "utf-8")
+        finally:
+            view.release()
+
+    def items(self):
+        """Yields the CELEX number and text of every document."""
+        for celex in self:
+            yield celex, self.get(celex)
+
+    def add(self, celex: str, text: str):
+        """Appends the text of a document, replacing any previous text of the same CELEX number in the index."""
+        content = text.encode("utf-8")
+        with self._lock, open(self._lock_path, "ab") as lock:
+            if fcntl is not None:
+                # released when the lock file is closed
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # entries of other processes come before this one in the index
+            self.refresh()
+            with open(self._data_path, "ab") as writer:
+                offset = writer.tell()
+                writer.write(content)
+            with open(self._index_path, "ab") as writer:
+                line = (json.dumps([celex, offset, len(content)]) + "\n").encode(
+                    "utf-8"
+                )
+                position = writer.tell()
+                if position > self._index_position:
+                    # terminate the unfinished entry of a crashed writer
+                    line = b"\n" + line
+                writer.write(line)
+            self.offsets[celex] = (offset, len(content))
+            self._index_position = position + len(line)
+
+    def update(self, documents):
+        """Appends several documents, given as a mapping or as pairs of CELEX number and text."""
+        if hasattr(documents, "items"):
+            documents = documents.items()
+        for celex, text in documents:
+            self.add(celex, text)
+
+    def fetch(self, eur, celex_ids, max_workers: int = 4, **kwargs):
+        """Downloads the texts of the documents that are not in the store yet and appends them.
+        Parameters
+        ----------
+        eur: Eurlex
+            The instance used to download the texts
+        celex_ids: iterable of str
+            The CELEX numbers of the documents
+        max_workers: int
+            How many texts are downloaded concurrently
+            Default: 4
+        Further keyword arguments are passed to `Eurlex.get_data`.
+        Returns
+        -------
+            The number of documents that were added
+        """
+        missing = [c for c in dict.fromkeys(celex_ids) if c not in self.offsets]
+        added = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            texts = executor.map(
+                lambda celex: eur.get_data(celex, data_type="text", **kwargs), missing
+            )
+            for celex, text in zip(missing, texts):
+                # get_data returns 1 or a status code instead of a text when nothing was retrieved
+                if isinstance(text, str) and not text.startswith("NaN"):
+                    self.add(celex, text)
+                    added += 1
+        return added
+
+    def close(self):
+        """Closes the memory map and the data file."""
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # still referenced by views returned by get_bytes, it is closed once they are released
+                pass
+            self._mmap = None
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,182 @@
+"""
+* Pool of SPARQL endpoints, f.e. a local mirror of parts of Cellar and the public endpoint, with failover and latency-based routing.
+"""
+
+import bisect
+import io
+import threading
+import time
+
+import pandas as pd
+import requests
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+def query_csv(endpoint: str, query: str, timeout: float = None):
+    """Runs a SELECT query on an endpoint and returns its CSV results as a data frame, like `sparql_dataframe.get`,
+    but raises a TimeoutError if the endpoint does not connect or send data for `timeout` seconds, so the request
+    does not hang."""
+    try:
+        response = requests.get(
+            endpoint,
+            params={"query": query},
+            headers={"Accept": "text/csv"},
+            timeout=timeout,
+        )
+    except requests.Timeout as e:
+        raise TimeoutError(
+            "{} did not answer within {} seconds".format(endpoint, timeout)
+        ) from e
+    response.raise_for_status()
+    return pd.read_csv(io.StringIO(response.content.decode("utf-8")))
+
+
+class EndpointPool:
+    """Routes queries to the healthy endpoint with the lowest latency and fails over to the next one on errors.
+
+    An endpoint that fails, or does not answer within `timeout` seconds, is skipped for `cooldown` seconds, unless all
+    endpoints are failing. The latency of each endpoint is tracked as an exponentially weighted moving average and as
+    a histogram.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.endpoints import EndpointPool
+    >>> pool = EndpointPool(["http://localhost:8890/sparql", "http://publications.europa.eu/webapi/rdf/sparql"])
+    >>> eur = Eurlex(endpoint=pool)
+    >>> eur.query_eurlex(eur.make_query(resource_type="directive", limit=10))
+    >>> pool.stats()
+    """
+
+    def __init__(
+        self,
+        endpoints: list,
+        cooldown: float = 60.0,
+        smoothing: float = 0.3,
+        timeout: float = 120.0,
+    ):
+        """
+        Parameters
+        ----------
+        endpoints: list
+            The URLs of the SPARQL endpoints
+        cooldown: float
+            The number of seconds a failing endpoint is skipped
+            Default: 60.0
+        smoothing: float
+            The weight of the latest latency in the moving average
+            Default: 0.3
+        timeout: float
+            The number of seconds to wait for an endpoint to connect or send data before failing over to the next one,
+            which is passed to the request. None waits forever.
+            Default: 120.0
+        """
+        assert endpoints, "At least one endpoint has to be specified"
+        self.endpoints = list(endpoints)
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._latency = {e: None for e in self.endpoints}
+        self._down_until = {e: 0.0 for e in self.endpoints}
+        self._requests = {e: 0 for e in self.endpoints}
+        self._errors = {e: 0 for e in self.endpoints}
+        self._timeouts = {e: 0 for e in self.endpoints}
+        self._histograms = {e: [0] * len(LATENCY_BUCKETS) for e in self.endpoints}
+
+    def __str__(self):
+        return "EndpointPool({})".format(", ".join(self.endpoints))
+
+    def ranked(self):
+        """Returns the endpoints in the order they are tried: healthy ones by latency, then failing ones by when they recover.
+        Endpoints without a measured latency are tried before slower ones, in the order they were given.
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e for e in self.endpoints if self._down_until[e] <= now]
+            failing = [e for e in self.endpoints if self._down_until[e] > now]
+            healthy.sort(
+                key=lambda e: -1.0 if self._latency[e] is None else self._latency[e]
+            )
+            failing.sort(key=lambda e: self._down_until[e])
+        return healthy + failing
+
+    def record(
+        self, endpoint: str, latency: float, error: bool = False, timeout: bool = False
+    ):
+        """Records the outcome of a query to an endpoint. A timeout counts as an error."""
+        with self._lock:
+            self._requests[endpoint] += 1
+            if timeout:
+                self._timeouts[endpoint] += 1
+            if error or timeout:
+                self._errors[endpoint] += 1
+                self._down_until[endpoint] = time.monotonic() + self.cooldown
+                return
+            self._down_until[endpoint] = 0.0
+            previous = self._latency[endpoint]
+            self._latency[endpoint] = (
+                latency
+                if previous is None
+                else self.smoothing * latency + (1 - self.smoothing) * previous
+            )
+            self._histograms[endpoint][
+                bisect.bisect_left(LATENCY_BUCKETS, latency)
+            ] += 1
+
+    def query(self, query: str, run=query_csv):
+        """Runs a query on the best endpoint, failing over to the others.
+        Parameters
+        ----------
+        query: str
+            The SPARQL query
+        run: callable
+            Called as run(endpoint, query, timeout=timeout) to query a single endpoint. It should raise a
+            TimeoutError when the endpoint does not answer in time.
+            Default: query_csv
+        Returns
+        -------
+            The result of `run` for the first endpoint that succeeded. If all endpoints fail, the last error is raised.
+        """
+        error = None
+        for endpoint in self.ranked():
+            start = time.monotonic()
+            try:
+                result = run(endpoint, query, timeout=self.timeout)
+            except Exception as e:
+                self.record(
+                    endpoint,
+                    time.monotonic() - start,
+                    error=True,
+                    timeout=isinstance(e, TimeoutError),
+                )
+                error = e
+                continue
+            self.record(endpoint, time.monotonic() - start)
+            return result
+        raise error
+
+    def stats(self):
+        """Returns the number of requests, errors and timeouts, the smoothed latency, the health and the latency histogram of each endpoint as a data frame."""
+        now = time.monotonic()
+        with self._lock:
+            rows = [
+                dict(
+                    {
+                        "endpoint": e,
+                        "requests": self._requests[e],
+                        "errors": self._errors[e],
+                        "timeouts": self._timeouts[e],
+                        "latency": self._latency[e],
+                        "healthy": self._down_until[e] <= now,
+                    },
+                    **{
+                        "le_{}".format(bound): count
+                        for bound, count in zip(LATENCY_BUCKETS, self._histograms[e])
+                    },
+                )
+                for e in self.endpoints
+            ]
+        return pd.DataFrame(rows)
@@ -2,18 +2,34 @@
 """
 * Python module to create eurlex cellar queries, query eurlex for metadata of documents with sparql queries, and subsequently download associated documents and notices.
 """
+import hashlib
+import logging
 import os
 import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from typing import Literal, get_args
+from urllib.parse import quote
 
+import lxml.html
 import pandas as pd
 import requests
 import sparql_dataframe
 from bs4 import BeautifulSoup
 from fire import Fire
-from halo import Halo
 from pdfminer.high_level import extract_text
+from urllib3.util.request import ACCEPT_ENCODING
+
+from eurlex.endpoints import EndpointPool
+from eurlex.instrumentation import NullTracer, traced
+from eurlex.query import Query, QueryBuilder, order_condition
+from eurlex.storage import compress, compressed_filename, compression_types
+
+logger = logging.getLogger(__name__)
 
 
 class Eurlex:
@@ -23,12 +39,71 @@ class Eurlex:
         self,
         endpoint="http://publications.europa.eu/webapi/rdf/sparql",
         sparql_query="",
+        format_preference: list = None,
+        hierarchy=None,
+        resource_url="http://publications.europa.eu/resource/",
+        curia_url="https://curia.europa.eu/",
+        tracer=None,
+        session=None,
+        memo=None,
     ):
         self.endpoint = endpoint
         self.sparql_query = sparql_query
+        # base URLs of Cellar resources and of Curia, f.e. to use a local mirror (see eurlex.mirror)
+        self.resource_url = resource_url
+        self.curia_url = curia_url
+        # manifestation formats, from cheapest to most expensive to parse
+        self.format_preference = list(
+            format_preference
+            if format_preference is not None
+            else self._FORMAT_PREFERENCE
+        )
+        # number of text responses per served media type
+        self.format_counts = Counter()
+        # bytes transferred and decoded on the wire, and raw and stored on disk
+        self.compression_stats = Counter()
+        # cached directory-code and EuroVoc hierarchies (eurlex.hierarchy.ConceptHierarchy)
+        self.hierarchy = hierarchy
+        # receives spans for every phase of queries, downloads and parsing (see eurlex.instrumentation)
+        self.tracer = tracer if tracer is not None else NullTracer()
+        # a requests.Session to reuse connections across requests, f.e. for the languages of get_data_multilingual
+        self.session = session
+        # an eurlex.memo.Memo of get_data results shared by the threads using the instance, or by several instances
+        self.memo = memo
+        # identifiers resolved by resolve_ids, by CELEX number or ECLI
+        self.resolved_ids = {}
+        self._lock = threading.Lock()
         # self.document_type = document_type
         # self.output_dir = output_dir
 
+    # Default order in which manifestation formats are preferred, cheapest to parse first
+    _FORMAT_PREFERENCE = (
+        "application/xhtml+xml",
+        "text/html",
+        "text/plain",
+        "application/pdf",
+        "application/msword",
+    )
+
+    # Content codings that can be decoded, br and zstd are only included if the optional decoders are installed
+    _ACCEPT_ENCODING = ACCEPT_ENCODING.replace(",", ", ")
+
+    # The variants Cellar uses for each media type when serving manifestations
+    _FORMAT_VARIANTS = {
+        "text/html": ["text/html", "text/html;type=simplified"],
+        "application/xhtml+xml": [
+            "application/xhtml+xml",
+            "application/xhtml+xml;type=simplified",
+        ],
+        "application/pdf": [
+            "application/pdf",
+            "application/pdf;type=pdf1x",
+            "application/pdf;type=pdfa1a",
+            "application/pdf;type=pdfx",
+            "application/pdf;type=pdfa1b",
+        ],
+    }
+
     # Language = ""ENG":"English""
     # Supported resource types if manual_type is not used
     _RESOURCE_TYPES = Literal[
@@ -50,7 +125,6 @@ class Eurlex:
     def make_query(
         self,
         resource_type: _RESOURCE_TYPES = "caselaw",
-        # language="ENG",  # could also add literals etc for these
         manual_type: str = "",
         directory=None,
         sector=None,
@@ -75,13 +149,19 @@ class Eurlex:
         include_proposal: bool = False,
         include_directory: bool = False,
         include_sector: bool = False,
-        order: bool = False,
+        include_title: bool = False,
+        language="en",
+        title_language=None,
+        order=False,
         limit: int = None,
+        date_from: str = None,
+        date_to: str = None,
+        as_query: bool = False,
     ):
         """
         Construct a SPARQL query to retrieve documents from EU Cellar repository
 
-        This function adds bits of SPARQL code together. It does some type and sanity checking, but it is likely still possible to make get nonsensical queries, and not the full range that is possible with handcoded SPARQL is supported. As an example, some language filtering is done to get mostly English results, but this is not consistent and no other language can be specified at the moment.
+        This function adds bits of SPARQL code together. It does some type and sanity checking, but it is likely still possible to make get nonsensical queries, and not the full range that is possible with handcoded SPARQL is supported. Labels are filtered on `language` and titles on `title_language`, which default to English and can each be one language or a list of languages returned in separate columns.
         Possible resource types can be found at http://publications.europa.eu/resource/authority/resource-type
 
         Parameters
@@ -93,7 +173,7 @@ class Eurlex:
             A string that specifies a custom resource type as set out in official documentation, if pre-defined resource types are not sufficient. Possible types can be found here: http://publications.europa.eu/resource/authority/resource-type This is a string that is inserted into the query, so it is possible to specify multiple types, but this is not checked for validity.
             Default: None
         directory: string
-            A string that specifies a directory to filter on. This is a string that is inserted into the query, so it is possible to specify multiple directories, but this is not checked for validity.
+            A string that specifies a directory to filter on. This is a string that is inserted into the query, so it is possible to specify multiple directories, but this is not checked for validity. If the instance has a cached `hierarchy`, the directory and its subdirectories are inserted as a flat VALUES list instead of being traversed by the endpoint.
             Default: None
         sector: string
             A string that specifies a sector to filter on. This is a string that is inserted into the query, so it is possible to specify multiple sectors, but this is not checked for validity.
@@ -161,11 +241,35 @@ class Eurlex:
         include_sector: bool
             Results include the EURLEX sector code.
             Default: False
-        order: bool
-            Whether to order the results by IDs
+        include_title: bool
+            Results include the title of the expression in `title_language`.
+            Default: False
+        language: str or list
+            The language of the labels of authors, court procedures and court formations, as a two letter code. With a
+            list of languages, the labels in each language are returned in their own column, f.e. author_en and author_fr,
+            so the number of rows does not grow with the number of languages.
+            Default: "en"
+        title_language: str or list
+            The language of the title, as a two letter code (f.e. "en") or a code of the language authority table (f.e. "ENG").
+            A list of languages returns the titles in their own columns like `language`.
+            Default: None, i.e. the same as `language`
+        order: bool, str or list
+            The fields to order the results by, f.e. "celex" or ["-date", "celex"], where a leading "-" orders
+            descending. The fields have to be selected. True orders by date.
+            Default: False
         limit: int
             The maximum number of results to return. If None, all results are returned.
             Default: None
+        date_from: str
+            Only include documents dated on or after this date (YYYY-MM-DD). Documents without a date are excluded.
+            Default: None
+        date_to: str
+            Only include documents dated before this date (YYYY-MM-DD). Documents without a date are excluded.
+            Default: None
+        as_query: bool
+            Whether to return the query as a `eurlex.query.Query`, which can be composed, compared, paginated and counted,
+            instead of a string. See also `query`.
+            Default: False
         Returns
         -------
         string
@@ -183,9 +287,6 @@ class Eurlex:
         >>> eur.make_query(resource_type = "manual", manual_type = "SWD") # doctest: +ELLIPSIS
         PREFIX ...
         """
-        if __name__ == "__main__":
-            spinner = Halo(text="Appending query text...", spinner="line")
-            spinner.start()
         assert resource_type is not None, "resource_type must be specified"
         assert resource_type in get_args(
             self._RESOURCE_TYPES
@@ -203,71 +304,88 @@ class Eurlex:
             )  # improve exception handling
         if include_date_transposed and resource_type != "directive":
             raise Exception("Transposition date only available for directives.")
+        languages = [language] if isinstance(language, str) else list(language)
+        assert languages and all(
+            isinstance(l, str) and re.fullmatch("[a-z]{2}", l) for l in languages
+        ), f"'{language}' is invalid - use two letter codes such as 'en'"
+        if title_language is None:
+            title_languages = languages
+        elif isinstance(title_language, str):
+            title_languages = [title_language]
+        else:
+            title_languages = list(title_language)
 
-        query = """PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
-  PREFIX annot: <http://publications.europa.eu/ontology/annotation#>
-  PREFIX skos:<http://www.w3.org/2004/02/skos/core#>
-  PREFIX dc:<http://purl.org/dc/elements/1.1/>
-  PREFIX xsd:<http://www.w3.org/2001/XMLSchema#>
-  PREFIX rdf:<http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-  PREFIX owl:<http://www.w3.org/2002/07/owl#>
-  select distinct ?work ?type"""
+        variables = ["?work", "?type"]
+        patterns = []
 
         # add parameter for celex id
         if include_celex:
-            query += " ?celex"
+            variables += ["?celex"]
         # add parameter for date
         if include_date:
-            query += " ?date"
+            variables += ["?date"]
         if include_date_force:
-            query += " ?dateforce"
+            variables += ["?dateforce"]
         if include_date_endvalid:
-            query += " ?dateendvalid"
+            variables += ["?dateendvalid"]
         if include_date_transposed:
-            query += " ?datetranspos"
+            variables += ["?datetranspos"]
         if include_date_lodged:
-            query += " ?datelodged"
+            variables += ["?datelodged"]
         if include_lbs:
             assert (
                 resource_type != "caselaw"
             ), "legal basis variable not compatible with caselaw resource type"
-            query += " ?lbs ?lbcelex ?lbsuffix"
+            variables += ["?lbs", "?lbcelex", "?lbsuffix"]
         if include_force:
             assert (
                 resource_type != "caselaw"
             ), "force variable not compatible with caselaw resource type"
-            query += " ?force"
+            variables += ["?force"]
         if include_eurovoc:
-            query += " ?eurovoc"
+            variables += ["?eurovoc"]
         if include_court_procedure:
-            query += " ?courtprocedure"
+            variables += self._label_variables("courtprocedure", languages)
         if include_ecli:
-            query += " ?ecli"
+            variables += ["?ecli"]
         if include_author:
-            query += " ?author"
+            variables += self._label_variables("author", languages)
         if include_citations:
-            query += " ?citationcelex"
+            variables += ["?citationcelex"]
         if include_directory:
-            query += " ?directory"
+            variables += ["?directory"]
         if include_sector:
-            query += " ?sector"
+            variables += ["?sector"]
         if include_advocate_general:
-            query += " ?ag"
+            variables += ["?ag"]
         if include_judge_rapporteur:
-            query += " ?jr"
+            variables += ["?jr"]
         if include_court_formation:
-            query += " ?cf"
+            variables += self._label_variables("cf", languages)
         if include_court_scholarship:
-            query += " ?scholarship"
+            variables += ["?scholarship"]
         if include_proposal:
-            query += " ?proposal"
-        if resource_type == "any":
-            query += " where{"
+            variables += ["?proposal"]
+        if include_title:
+            variables += self._label_variables(
+                "title", [l.lower() for l in title_languages]
+            )
         if resource_type != "any":
-            query += " where{ ?work cdm:work_has_resource-type ?type."
-        if directory:
+            patterns.append(" ?work cdm:work_has_resource-type ?type.")
+        if directory and self.hierarchy is not None:
+            assert isinstance(directory, str), "directory code must be of type string"
+            patterns.append(
+                """ VALUES ?directoryfilter { """
+                + " ".join(
+                    "<" + concept + ">"
+                    for concept in self.hierarchy.expand_directory(directory)
+                )
+                + """ }
+                    ?work cdm:resource_legal_is_about_concept_directory-code ?directoryfilter."""
+            )
+        elif directory:
             assert isinstance(directory, str), "directory code must be of type string"
-            query += (
+            patterns.append(
                 """ VALUES (?value)
                     { (<http://publications.europa.eu/resource/authority/fd_555/"""
                 + directory
@@ -287,31 +405,38 @@ class Eurlex:
         if sector:
             assert isinstance(sector, int), "sector code must be of type integer"
             assert sector in range(0, 10), "sector code must be between 0 and 9"
-            query += (
+            patterns.append(
                 """?work cdm:resource_legal_id_sector ?sector.
                     FILTER(str(?sector)='"""
                 + str(sector)
                 + "')"
             )
         if resource_type == "directive":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/DIR>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/DIR>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/DIR_IMPL>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/DIR_DEL>)"""
+            )
         if resource_type == "recommendation":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/RECO>||?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_DEC>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/RECO>||?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_DEC>||
                    ?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_DIR>||
                    ?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_OPIN>||
                    ?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_RES>||
                    ?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_REG>||
                    ?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_RECO>||
                    ?type=<http://publications.europa.eu/resource/authority/resource-type/RECO_DRAFT>)"""
+            )
         if resource_type == "regulation":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/REG>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/REG>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/REG_IMPL>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/REG_FINANC>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/REG_DEL>)"""
+            )
         if resource_type == "international_agreement":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/AGREE_INTERNATION>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/AGREE_INTERNATION>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/EXCH_LET>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/PROT>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/AGREE_PROT>||
@@ -323,15 +448,19 @@ class Eurlex:
   ?type=<http://publications.europa.eu/resource/authority/resource-type/REG_ADOPT_INTERNATION>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/DEC_ADOPT_INTERNATION>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/MEMORANDUM_UNDERST>)"""
+            )
         if resource_type == "decision":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/DEC>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/DEC>||
             ?type=<http://publications.europa.eu/resource/authority/resource-type/DEC_ENTSCHEID>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/DEC_IMPL>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/DEC_DEL>)||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/DEC_FRAMW>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/JOINT_DEC>)"""
+            )
         if resource_type == "caselaw":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/JUDG>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/JUDG>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/ORDER>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/OPIN_JUR>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/THIRDPARTY_PROCEED>||
@@ -339,15 +468,21 @@ class Eurlex:
   ?type=<http://publications.europa.eu/resource/authority/resource-type/RULING>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/JUDG_EXTRACT>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/INFO_JUDICIAL>)"""
+            )
         if resource_type == "caselaw_proper":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/JUDG>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/JUDG>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/ORDER>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/RULING>)"""
+            )
         if resource_type == "ag_opinion":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/VIEW_AG>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/VIEW_AG>||
             ?type=<http://publications.europa.eu/resource/authority/resource-type/OPIN_AG>)"""
+            )
         if resource_type == "proposal":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/PROP_DIR>||
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/PROP_DIR>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/PROP_REG>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/PROP_DEC>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/PROP_DEC_IMPL>||
@@ -396,105 +531,257 @@ class Eurlex:
   ?type=<http://publications.europa.eu/resource/authority/resource-type/AMEND_PROP_REG>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/AMEND_PROP_DEC>||
   ?type=<http://publications.europa.eu/resource/authority/resource-type/PROP_DEC_NO_ADDRESSEE>)"""
+            )
         if resource_type == "national_implementation":
-            query += """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/MEAS_NATION_IMPL>)"""
+            patterns.append(
+                """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/MEAS_NATION_IMPL>)"""
+            )
         if resource_type == "manual" and manual_type and len(manual_type) > 1:
-            query += (
+            patterns.append(
                 """ FILTER(?type=<http://publications.europa.eu/resource/authority/resource-type/"""
                 + manual_type
                 + """>)"""
             )
+        if date_from or date_to:
+            patterns.append(""" ?work cdm:work_date_document ?date.""")
+            if date_from:
+                patterns.append(
+                    """ FILTER(?date >= \""""
+                    + str(pd.Timestamp(date_from).date())
+                    + """\"^^xsd:date)"""
+                )
+            if date_to:
+                patterns.append(
+                    """ FILTER(?date < \""""
+                    + str(pd.Timestamp(date_to).date())
+                    + """\"^^xsd:date)"""
+                )
         if include_corrigenda is False and resource_type != "caselaw":
-            query += """ FILTER not exists{?work cdm:work_has_resource-type <http://publications.europa.eu/resource/authority/resource-type/CORRIGENDUM>}"""
+            patterns.append(
+                """ FILTER not exists{?work cdm:work_has_resource-type <http://publications.europa.eu/resource/authority/resource-type/CORRIGENDUM>}"""
+            )
         if include_celex:
-            query += """OPTIONAL{?work cdm:resource_legal_id_celex ?celex.}"""
+            patterns.append("""OPTIONAL{?work cdm:resource_legal_id_celex ?celex.}""")
         if include_date:
-            query += """OPTIONAL{?work cdm:work_date_document ?date.}"""
+            patterns.append("""OPTIONAL{?work cdm:work_date_document ?date.}""")
         if include_date_force:
-            query += """OPTIONAL{?work cdm:resource_legal_date_entry-into-force ?dateforce.}"""
+            patterns.append(
+                """OPTIONAL{?work cdm:resource_legal_date_entry-into-force ?dateforce.}"""
+            )
         if include_date_endvalid:
-            query += """OPTIONAL{?work cdm:resource_legal_date_end-of-validity ?dateendvalid.}"""
+            patterns.append(
+                """OPTIONAL{?work cdm:resource_legal_date_end-of-validity ?dateendvalid.}"""
+            )
         if include_date_transposed:
-            query += (
+            patterns.append(
                 """OPTIONAL{?work cdm:directive_date_transposition ?datetranspos.}"""
             )
             # query += """OPTIONAL{?work cdm:resource_legal_date_transposition ?datetransposed.}"""
         if include_date_lodged:
-            query += """OPTIONAL{?work cdm:resource_legal_date_request_opinion ?datelodged.}"""
+            patterns.append(
+                """OPTIONAL{?work cdm:resource_legal_date_request_opinion ?datelodged.}"""
+            )
         if include_lbs and resource_type != "caselaw":
-            query += """ OPTIONAL{?work cdm:resource_legal_based_on_resource_legal ?lbs.
+            patterns.append(
+                """ OPTIONAL{?work cdm:resource_legal_based_on_resource_legal ?lbs.
     ?lbs cdm:resource_legal_id_celex ?lbcelex.
     OPTIONAL{?bn owl:annotatedSource ?work.
     ?bn owl:annotatedProperty <http://publications.europa.eu/ontology/cdm#resource_legal_based_on_resource_legal>.
     ?bn owl:annotatedTarget ?lbs.
     ?bn annot:comment_on_legal_basis ?lbsuffix}}"""
+            )
         if include_force:
-            query += """ OPTIONAL{?work cdm:resource_legal_in-force ?force.}"""
+            patterns.append(""" OPTIONAL{?work cdm:resource_legal_in-force ?force.}""")
         if include_eurovoc:
-            query += """ OPTIONAL{?work cdm:work_is_about_concept_eurovoc ?eurovoc. graph ?gs
-    { ?eurovoc skos:prefLabel ?subjectLabel filter (lang(?subjectLabel)="en") }.}"""  # TODO - option to not filter by EN  here
+            # only concepts with a label in the first language
+            patterns.append(
+                """ OPTIONAL{?work cdm:work_is_about_concept_eurovoc ?eurovoc. graph ?gs
+    { ?eurovoc skos:prefLabel ?subjectLabel filter (lang(?subjectLabel)=\""""
+                + languages[0]
+                + """\") }.}"""
+            )
         # Additionally/optionally - eurovocLabel. FILTER (LANGMATCHES(LANG(?eurovocLabel), "en")) .
         # FILTER(LANG(?datasetTitle)= "" || LANG(?datasetTitle) = "en").}
         if include_author:
-            query += """ OPTIONAL{?work cdm:work_created_by_agent ?authorx.
-                   ?authorx skos:prefLabel ?author. FILTER(lang(?author)='en')}."""  # TODO - option to not filter by EN/follow language setting
+            patterns.append(
+                """ OPTIONAL{?work cdm:work_created_by_agent ?authorx."""
+                + self._label_lookup("?authorx", "author", languages)
+                + """}."""
+            )
         if include_citations:
-            query += """ OPTIONAL{?work cdm:work_cites_work ?citation.
+            patterns.append(
+                """ OPTIONAL{?work cdm:work_cites_work ?citation.
                 ?citation cdm:resource_legal_id_celex ?citationcelex.}"""
+            )
         if include_court_procedure:
-            query += """ OPTIONAL{?work cdm:case-law_has_type_procedure_concept_type_procedure ?proc.
-        ?proc skos:prefLabel ?courtprocedure. FILTER(lang(?courtprocedure)='en')}."""  # TODO - Option not to filter on EN or on other language
+            patterns.append(
+                """ OPTIONAL{?work cdm:case-law_has_type_procedure_concept_type_procedure ?proc."""
+                + self._label_lookup("?proc", "courtprocedure", languages)
+                + """}."""
+            )
         if include_advocate_general:
-            query += """ OPTIONAL{?work cdm:case-law_delivered_by_advocate-general ?agx.
+            patterns.append(
+                """ OPTIONAL{?work cdm:case-law_delivered_by_advocate-general ?agx.
                 ?agx cdm:agent_name ?ag.}"""
+            )
         if include_judge_rapporteur:
-            query += """ OPTIONAL{?work cdm:case-law_delivered_by_judge ?jrx.
+            patterns.append(
+                """ OPTIONAL{?work cdm:case-law_delivered_by_judge ?jrx.
                 ?jrx cdm:agent_name ?jr.}"""
+            )
         if include_court_formation:
-            query += """ OPTIONAL{?work cdm:case-law_delivered_by_court-formation ?cfx.
-                ?cfx skos:prefLabel ?cf. FILTER(lang(?cf)='en')}."""  # TODO - Option not to filter on EN or on other language
+            patterns.append(
+                """ OPTIONAL{?work cdm:case-law_delivered_by_court-formation ?cfx."""
+                + self._label_lookup("?cfx", "cf", languages)
+                + """}."""
+            )
         if include_court_scholarship:
-            query += """ OPTIONAL{?work cdm:case-law_article_journal_related ?scholarship.}"""
+            patterns.append(
+                """ OPTIONAL{?work cdm:case-law_article_journal_related ?scholarship.}"""
+            )
         if include_proposal:
-            query += """ OPTIONAL{?work cdm:resource_legal_adopts_resource_legal ?adoptedx.
+            patterns.append(
+                """ OPTIONAL{?work cdm:resource_legal_adopts_resource_legal ?adoptedx.
                 ?adoptedx cdm:resource_legal_id_celex ?proposal.}"""
+            )
         if include_ecli:
-            query += """ OPTIONAL{?work cdm:case-law_ecli ?ecli.}"""
+            patterns.append(""" OPTIONAL{?work cdm:case-law_ecli ?ecli.}""")
         if include_directory:
-            query += """ OPTIONAL{?work cdm:resource_legal_is_about_concept_directory-code ?directory.}"""
+            patterns.append(
+                """ OPTIONAL{?work cdm:resource_legal_is_about_concept_directory-code ?directory.}"""
+            )
         if include_sector:
-            query += """ OPTIONAL{?work cdm:resource_legal_id_sector ?sector.}"""
+            patterns.append(
+                """ OPTIONAL{?work cdm:resource_legal_id_sector ?sector.}"""
+            )
+        if include_title:
+            for title_lang in title_languages:
+                suffix = "" if len(title_languages) == 1 else "_" + title_lang.lower()
+                patterns.append(
+                    """ OPTIONAL{?expression"""
+                    + suffix
+                    + """ cdm:expression_belongs_to_work ?work.
+                ?expression"""
+                    + suffix
+                    + """ cdm:expression_uses_language <"""
+                    + self._language_uri(title_lang)
+                    + """>.
+                ?expression"""
+                    + suffix
+                    + """ cdm:expression_title ?title"""
+                    + suffix
+                    + """.}"""
+                )
         # add filter to only include latest version (inspired by eurlex R package)
-        query += """ FILTER not exists{?work cdm:do_not_index "true"^^<http://www.w3.org/2001/XMLSchema#boolean>}."""
-        if order:
-            query += """} order by ?date"""
-            # TODO - add option to order by different fields
-        else:
-            # This adds the closing curly braces to the query
-            query += """}"""
-        if limit and limit is not None and isinstance(limit, int):
-            query += " limit " + str(limit)
+        patterns.append(
+            """ FILTER not exists{?work cdm:do_not_index "true"^^<http://www.w3.org/2001/XMLSchema#boolean>}."""
+        )
+        query = Query(
+            variables,
+            patterns,
+            order_by=self._order_by(order, variables),
+            limit=limit if limit and isinstance(limit, int) else None,
+        )
         # somehow this was added in R: FILTER not exists{?work cdm:do_not_index \"true\"^^<http://www.w3.org/2001/XMLSchema#boolean>}. }
-        if __name__ == "__main__":
-            spinner.stop()
         # TODO add formatting option from server format=application%2Fsparql-results%2Bjson (from https://publications.europa.eu/webapi/rdf/sparql)
-        # some postprocessing to get rid of newlines
-        return query.replace("\n", "")  # .replace("\t", " ")
+        if as_query:
+            return query
+        return query.to_sparql()
+
+    def query(self, resource_type: _RESOURCE_TYPES = "caselaw", **options):
+        """
+        Starts building a query for a resource type, naming the fields to select instead of passing a flag per field.
+        Parameters
+        ----------
+        resource_type: str
+            See `make_query`
+            Default: "caselaw"
+        Further keyword arguments are passed to `make_query`.
+        Returns
+        -------
+            A `eurlex.query.QueryBuilder`, whose `build` returns the `eurlex.query.Query`
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> eur.query("regulation").select("celex", "date").between("2020-01-01", "2021-01-01").limit(10).build()  # doctest: +ELLIPSIS
+        Query(...)
+        """
+        return QueryBuilder(self, resource_type, **options)
+
+    @staticmethod
+    def _order_by(order, variables):
+        """Returns the ORDER BY conditions of the `order` argument of `make_query`."""
+        if order is True:
+            return ["?date"]
+        if not order:
+            return []
+        conditions = [
+            order_condition(c) for c in ([order] if isinstance(order, str) else order)
+        ]
+        for condition in conditions:
+            for variable in re.findall(r"\?\w+", condition):
+                assert (
+                    variable in variables
+                ), f"cannot order by {variable}, which is not selected"
+        return conditions
+
+    @staticmethod
+    def _label_variables(variable, languages):
+        """Returns the variables to select for a label, with one column per language if there are several."""
+        if len(languages) == 1:
+            return ["?" + variable]
+        return ["?{}_{}".format(variable, l) for l in languages]
+
+    @staticmethod
+    def _label_lookup(subject, variable, languages):
+        """Returns the patterns that bind the preferred label of `subject` in each language.
+        A concept has at most one preferred label per language, so each language is looked up in its own OPTIONAL
+        instead of filtering a row per label, and the number of rows stays the same.
+        """
+        if len(languages) == 1:
+            return """
+                {subject} skos:prefLabel ?{variable}. FILTER(lang(?{variable})='{language}')""".format(
+                subject=subject, variable=variable, language=languages[0]
+            )
+        return "".join(
+            """
+                OPTIONAL{{{subject} skos:prefLabel ?{variable}_{language}. FILTER(lang(?{variable}_{language})='{language}')}}""".format(
+                subject=subject, variable=variable, language=l
+            )
+            for l in languages
+        )
 
     """Query the Cellar endpoint with a specific SPARQL query and return a pandas dataframe"""
 
+    @traced("query_eurlex")
     def query_eurlex(
-        self, query, endpoint="http://publications.europa.eu/webapi/rdf/sparql"
+        self,
+        query,
+        endpoint=None,
+        max_rows: int = None,
+        paginate: bool = False,
+        page_size: int = 10000,
     ):
         """
         Query eurlex for documents with a SPARQL query
         Parameters:
         -----------
-        query: str
-            SPARQL query compatible with the EU Cellar endpoint
-        endpoint: str
-            The endpoint to query. Default is the EU Cellar endpoint
-            Default: http://publications.europa.eu/webapi/rdf/sparql
+        query: str or Query
+            SPARQL query compatible with the EU Cellar endpoint, or a `eurlex.query.Query`
+        endpoint: str or EndpointPool
+            The endpoint to query, or a pool of endpoints (see `eurlex.endpoints.EndpointPool`). Defaults to the endpoint of the instance, which is the EU Cellar endpoint unless specified otherwise.
+            Default: None
+        max_rows: int
+            If set, the rows of the query are counted first (see `explain`). A query with more rows is refused with a ValueError, unless `paginate` is set.
+            Default: None
+        paginate: bool
+            Run a query with more than `max_rows` rows as pages of `page_size` rows instead of refusing it. Unordered
+            queries are paged by keyset on ?work (see `query_eurlex_keyset`), ordered ones with OFFSET.
+            Default: False
+        page_size: int
+            The number of rows per page when paginating
+            Default: 10000
         Returns:
         --------
             df: pandas.DataFrame of the results
@@ -504,19 +791,661 @@ class Eurlex:
         >>> eur = Eurlex()
         >>> eur.query_eurlex("PREFIX dcat: <http://www.w3.org/ns/dcat#> PREFIX odp:  <http://data.europa.eu/euodp/ontologies/ec-odp#> PREFIX dct: <http://purl.org/dc/terms/> PREFIX xsd: <http://www.w3.org/2001/XMLSchema#> PREFIX foaf: <http://xmlns.com/foaf/0.1/> SELECT * WHERE { ?d a dcat:Dataset } LIMIT 10")
         """
-        if __name__ == "__main__":
-            spinner = Halo(text="Querying EU SPARQL endpoint ...", spinner="line")
-            spinner.start()
         # TODO rename columns - also check for date with regex such as [0-9]{4}\-[0-9]+?\-[0-9]+$
+        if max_rows is not None:
+            plan = self.explain(query, endpoint=endpoint)
+            if plan["rows"] is not None and plan["rows"] > max_rows:
+                if not paginate:
+                    raise ValueError(
+                        "The query returns {} rows, more than max_rows={}: {}".format(
+                            plan["rows"], max_rows, "; ".join(plan["warnings"])
+                        )
+                    )
+                return self._query_pages(str(query), plan["rows"], page_size, endpoint)
         data_frame = pd.DataFrame()
         # sparql.setReturnFormat(JSON)
         # convert?
         try:
-            data_frame = sparql_dataframe.get(endpoint, query)
+            data_frame = self._run_query(str(query), endpoint)
         except Exception as e:
-            print("There was an error when performing the query: ", e)
-        if __name__ == "__main__":
-            spinner.stop()
+            logger.error("There was an error when performing the query: %s", e)
+        return data_frame
+
+    # Estimated cost (see _estimate_cost) and number of rows above which explain warns
+    _COST_WARNING = 50
+    _ROWS_WARNING = 100000
+
+    _SELECT = re.compile(r"(?i)\bselect\b")
+    _LIMIT = re.compile(r"(?i)\s*\b(limit|offset)\s+(\d+)")
+    _ORDER = re.compile(r"(?i)\s*\border\s+by\b[^}]*$")
+    _PROPERTY_PATH = re.compile(r"[\w-]+:[\w-]+[+*]|>[+*]")
+
+    def _split_modifiers(self, query):
+        """Splits a query into the query without solution modifiers, its ORDER BY clause, its LIMIT and its OFFSET,
+        which are None if the query has none."""
+        body = query.rstrip()
+        modifiers = {}
+        while True:
+            match = list(self._LIMIT.finditer(body))
+            if not match or body[match[-1].end() :].strip():
+                break
+            modifiers.setdefault(match[-1].group(1).lower(), int(match[-1].group(2)))
+            body = body[: match[-1].start()].rstrip()
+        order = self._ORDER.search(body)
+        if order:
+            body, order = body[: order.start()], order.group(0).strip()
+        else:
+            order = ""
+        return body, order, modifiers.get("limit"), modifiers.get("offset")
+
+    def count_query(self, query):
+        """Rewrites a SELECT query into one that counts its rows, without ORDER BY, LIMIT and OFFSET."""
+        if isinstance(query, Query):
+            return query.count().to_sparql()
+        body, _, _, _ = self._split_modifiers(query)
+        select = self._SELECT.search(body)
+        assert select, "Only SELECT queries can be counted"
+        return (
+            body[: select.start()]
+            + "select (count(*) as ?count) where { "
+            + body[select.start() :]
+            + " }"
+        )
+
+    def _estimate_cost(self, query):
+        """Estimates the relative cost of a query from its joins: each OPTIONAL can multiply the rows per work, each
+        UNION evaluates its patterns again and each property path such as skos:narrower+ walks a whole hierarchy.
+        """
+        optionals = len(re.findall(r"(?i)\boptional\s*\{", query))
+        unions = len(re.findall(r"(?i)\bunion\b", query))
+        property_paths = len(self._PROPERTY_PATH.findall(query))
+        cost = (1 + optionals) * (1 + unions) * (1 + 4 * property_paths)
+        return {
+            "optionals": optionals,
+            "unions": unions,
+            "property_paths": property_paths,
+            "cost": cost,
+        }
+
+    def explain(self, query, endpoint=None, count: bool = True):
+        """Estimates the cost of a query without running it, and counts the rows it returns with a cheap COUNT query.
+        Parameters
+        ----------
+        query: str or Query
+            The SPARQL query, f.e. from `make_query`
+        endpoint: str or EndpointPool
+            The endpoint to count on, see `query_eurlex`
+            Default: None
+        count: bool
+            Whether to count the rows. Without counting, only the query itself is analysed.
+            Default: True
+        Returns
+        -------
+            A dict with the number of `rows` the query returns, capped by its LIMIT and OFFSET, and the `total_rows`
+            without them (both None if not counted or the count failed), the number of `optionals`, `unions` and
+            `property_paths`, the estimated `cost`, whether the query has a `limit`, and `warnings`.
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> eur.explain(eur.make_query(resource_type="any", include_citations=True, include_eurovoc=True))
+        """
+        _, _, limit, offset = self._split_modifiers(str(query))
+        plan = self._estimate_cost(str(query))
+        plan["limit"] = limit is not None
+        plan["rows"] = None
+        plan["total_rows"] = None
+        if count:
+            try:
+                counted = self._run_query(self.count_query(query), endpoint)
+                plan["total_rows"] = int(counted.iloc[0, 0])
+                # the count ignores the LIMIT and OFFSET, which cap the rows the query returns
+                plan["rows"] = max(0, plan["total_rows"] - (offset or 0))
+                if limit is not None:
+                    plan["rows"] = min(plan["rows"], limit)
+            except Exception as e:
+                logger.warning("The rows of the query could not be counted: %s", e)
+        warnings = []
+        if plan["cost"] >= self._COST_WARNING:
+            warnings.append(
+                "estimated cost {} from {} OPTIONAL joins, {} UNIONs and {} property paths".format(
+                    plan["cost"],
+                    plan["optionals"],
+                    plan["unions"],
+                    plan["property_paths"],
+                )
+            )
+        if plan["rows"] is not None and plan["rows"] >= self._ROWS_WARNING:
+            warnings.append("{} rows".format(plan["rows"]))
+        if warnings:
+            logger.warning("Expensive query: %s", "; ".join(warnings))
+        if limit is None:
+            warnings.append("no limit")
+        plan["warnings"] = warnings
+        return plan
+
+    def _query_pages(self, query, rows, page_size, endpoint):
+        """Runs a query that returns `rows` rows as pages of `page_size` rows, by keyset on ?work unless it is ordered
+        or has an OFFSET. The LIMIT and OFFSET of the query are kept."""
+        body, order, _, offset = self._split_modifiers(query)
+        if not order and offset is None:
+            frames = list(
+                self.query_eurlex_keyset(query, page_size=page_size, endpoint=endpoint)
+            )
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        order = order or "order by ?work"
+        start = offset or 0
+        end = start + rows
+        frames = []
+        for page_offset in range(start, end, page_size):
+            frames.append(
+                self._run_query(
+                    "{} {} limit {} offset {}".format(
+                        body, order, min(page_size, end - page_offset), page_offset
+                    ),
+                    endpoint,
+                )
+            )
+        frames = [f for f in frames if not f.empty]
+        return (
+            pd.concat(frames, ignore_index=True)
+            .drop_duplicates(ignore_index=True)
+            .head(rows)
+            if frames
+            else pd.DataFrame()
+        )
+
+    # The keys of keyset pagination, with the ORDER BY clause and the filter that seeks past the last key of a page
+    _KEYSETS = {
+        ("work",): (
+            "order by str(?work)",
+            """ FILTER(str(?work) > {work})""",
+        ),
+        ("date", "work"): (
+            "order by ?date str(?work)",
+            """ FILTER(?date > {date} || (?date = {date} && str(?work) > {work}))""",
+        ),
+    }
+
+    def query_eurlex_keyset(
+        self, query, keys="work", page_size: int = 10000, endpoint=None
+    ):
+        """
+        Runs a query as pages that continue after the last key of the previous page instead of skipping rows with
+        OFFSET, so every page costs about the same as the first, and rows are neither skipped nor repeated when
+        the results change during a long harvest.
+        Parameters
+        ----------
+        query: str or Query
+            The SPARQL query, f.e. from `make_query`. Its ORDER BY is replaced by the keys. If it has a LIMIT, paging
+            stops after that many rows. It cannot have an OFFSET.
+        keys: str or tuple
+            The keys to page by, "work" or ("date", "work"). With dates, works without a date are left out and
+            ?date has to be selected.
+            Default: "work"
+        page_size: int
+            The number of rows per page. All rows of a work are returned in the same page, so a page is shorter
+            when the rows of its last work did not fit, and larger when a single work has more rows.
+            Default: 10000
+        endpoint: str or EndpointPool
+            The endpoint to query, see `query_eurlex`
+            Default: None
+        Returns
+        -------
+            A generator of the data frames of the pages, in key order. Errors are raised.
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> query = eur.make_query(resource_type="regulation", include_date=True)
+        >>> for page in eur.query_eurlex_keyset(query, keys=("date", "work")):
+        ...     print(len(page))
+        """
+        keys = (keys,) if isinstance(keys, str) else tuple(keys)
+        assert (
+            keys in self._KEYSETS
+        ), f"{keys} are invalid - valid keys are {list(self._KEYSETS)}"
+        order, seek = self._KEYSETS[keys]
+        body, _, limit, offset = self._split_modifiers(str(query))
+        assert body.endswith("}"), "Only queries ending in a group pattern can be paged"
+        assert offset is None, "Queries with an OFFSET cannot be paged by keyset"
+        if "date" in keys:
+            body = body[:-1] + " FILTER(bound(?date))}"
+        last = None
+        size = page_size
+        while True:
+            condition = seek.format(**last) if last else ""
+            page = self._run_query(
+                "{}{}}} {} limit {}".format(body[:-1], condition, order, size),
+                endpoint,
+            )
+            if len(page) < size:
+                if limit is not None:
+                    page = page.head(limit)
+                if not page.empty:
+                    yield page
+                return
+            # the last work may have more rows than fit in the page, so it is left for the next page
+            works = page["work"].astype(str)
+            complete = page[works != works.iloc[-1]]
+            if complete.empty:
+                size *= 2
+                continue
+            size = page_size
+            row = complete.iloc[-1]
+            last = {"work": self._string(row["work"])}
+            if "date" in keys:
+                last["date"] = '"{}"^^xsd:date'.format(pd.Timestamp(row["date"]).date())
+            if limit is not None:
+                complete = complete.head(limit)
+                limit -= len(complete)
+            yield complete.reset_index(drop=True)
+            if limit == 0:
+                return
+
+    def _run_query(self, query, endpoint):
+        """Runs a query on an endpoint or pool of endpoints and returns the results as a data frame, raising any error."""
+        if endpoint is None:
+            endpoint = self.endpoint
+        with self.tracer.start_as_current_span("sparql.query") as span:
+            if isinstance(endpoint, EndpointPool):
+                data_frame = endpoint.query(query)
+            else:
+                data_frame = sparql_dataframe.get(endpoint, query)
+            if span.is_recording():
+                span.set_attribute("endpoint", str(endpoint))
+                span.set_attribute("query_length", len(query))
+                span.set_attribute("rows", len(data_frame))
+            return data_frame
+
+    def query_eurlex_partitioned(
+        self,
+        date_from: str,
+        date_to: str,
+        freq: str = "YS",
+        manual_types: list = None,
+        max_workers: int = 4,
+        min_days: int = 1,
+        endpoint=None,
+        include_undated: bool = False,
+        **query_args,
+    ):
+        """
+        Runs a large query as shards by date window (and optionally resource type) in parallel and merges the results.
+        Shards that fail, f.e. because they hit the execution timeout of the endpoint, are split in half and retried until they are shorter than `min_days`.
+        The shards only contain works with a document date (cdm:work_date_document), so works without one are left out unless `include_undated` is set.
+        Parameters:
+        -----------
+        date_from: str
+            The start of the first date window (YYYY-MM-DD)
+        date_to: str
+            The end of the last date window (exclusive, YYYY-MM-DD)
+        freq: str
+            The length of the date windows as a pandas frequency string, f.e. "YS" for years or "MS" for months
+            Default: "YS"
+        manual_types: list
+            If given, every date window is further split into one shard per resource type, which is passed to `make_query` as `manual_type`
+            Default: None
+        max_workers: int
+            The maximum number of shards that are queried at the same time
+            Default: 4
+        min_days: int
+            Shards of this many days or less are not split any further when they fail
+            Default: 1
+        endpoint: str or EndpointPool
+            The endpoint or pool of endpoints to query. Defaults to the endpoint of the instance.
+            Default: None
+        include_undated: bool
+            Also query the works without a document date, in one more shard per resource type, which cannot be split
+            if it fails and is then listed with None as its dates
+            Default: False
+        query_args:
+            Further arguments passed to `make_query`, f.e. `resource_type` or `include_date`
+        Returns:
+        --------
+            df: pandas.DataFrame of the de-duplicated results. The shards that failed even after splitting them are listed in `df.attrs["failed_shards"]`.
+        Examples:
+        ---------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> eur.query_eurlex_partitioned("1990-01-01", "2024-01-01", resource_type="regulation", include_date=True)
+        """
+        assert "limit" not in query_args, "A limit cannot be applied to shards"
+        assert min_days >= 1, "min_days has to be at least 1, as shards are whole days"
+        start = pd.Timestamp(date_from)
+        end = pd.Timestamp(date_to)
+        assert start < end, "date_from has to be before date_to"
+        bounds = [start] + [
+            b for b in pd.date_range(start, end, freq=freq) if start < b < end
+        ]
+        windows = list(zip(bounds, bounds[1:] + [end]))
+        if manual_types:
+            query_args["resource_type"] = "manual"
+            shards = [(w, t) for t in manual_types for w in windows]
+        else:
+            shards = [(w, query_args.get("manual_type", "")) for w in windows]
+        frames = []
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [
+                executor.submit(
+                    self._query_shard,
+                    window,
+                    manual_type,
+                    min_days,
+                    endpoint,
+                    query_args,
+                )
+                for window, manual_type in shards
+            ]
+            if include_undated:
+                futures.extend(
+                    executor.submit(
+                        self._query_undated, manual_type, endpoint, query_args
+                    )
+                    for manual_type in dict.fromkeys(t for _, t in shards)
+                )
+            for future in futures:
+                shard_frames, shard_failures = future.result()
+                frames.extend(shard_frames)
+                failed.extend(shard_failures)
+        frames = [f for f in frames if not f.empty]
+        data_frame = (
+            pd.concat(frames, ignore_index=True).drop_duplicates(ignore_index=True)
+            if frames
+            else pd.DataFrame()
+        )
+        data_frame.attrs["failed_shards"] = failed
+        return data_frame
+
+    def _query_shard(self, window, manual_type, min_days, endpoint, query_args):
+        """Queries a single date window, bisecting it if the query fails. Returns the result frames and the shards that failed."""
+        start, end = window
+        query = self.make_query(
+            **dict(
+                query_args,
+                manual_type=manual_type,
+                date_from=start,
+                date_to=end,
+            )
+        )
+        middle = (start + (end - start) / 2).normalize()
+        try:
+            return [self._run_query(query, endpoint)], []
+        except Exception as e:
+            # windows shorter than two days cannot be split into whole days
+            if (end - start).days <= min_days or not start < middle < end:
+                logger.error(
+                    "There was an error when performing the query for %s to %s: %s",
+                    start.date(),
+                    end.date(),
+                    e,
+                )
+                return [], [(str(start.date()), str(end.date()), manual_type)]
+        frames, failed = [], []
+        for half in [(start, middle), (middle, end)]:
+            half_frames, half_failed = self._query_shard(
+                half, manual_type, min_days, endpoint, query_args
+            )
+            frames.extend(half_frames)
+            failed.extend(half_failed)
+        return frames, failed
+
+    def _query_undated(self, manual_type, endpoint, query_args):
+        """Queries the works without a document date. Returns the result frames and the shards that failed."""
+        query = self.make_query(
+            **dict(query_args, manual_type=manual_type), as_query=True
+        ).where(" FILTER NOT EXISTS {?work cdm:work_date_document ?undated.}")
+        try:
+            return [self._run_query(str(query), endpoint)], []
+        except Exception as e:
+            logger.error(
+                "There was an error when performing the query for undated works: %s",
+                e,
+            )
+            return [], [(None, None, manual_type)]
+
+    # Language codes of the language authority table by two letter code, for the official languages of the EU
+    _LANGUAGES = {
+        "bg": "BUL",
+        "cs": "CES",
+        "da": "DAN",
+        "de": "DEU",
+        "el": "ELL",
+        "en": "ENG",
+        "es": "SPA",
+        "et": "EST",
+        "fi": "FIN",
+        "fr": "FRA",
+        "ga": "GLE",
+        "hr": "HRV",
+        "hu": "HUN",
+        "it": "ITA",
+        "lt": "LIT",
+        "lv": "LAV",
+        "mt": "MLT",
+        "nl": "NLD",
+        "pl": "POL",
+        "pt": "POR",
+        "ro": "RON",
+        "sk": "SLK",
+        "sl": "SLV",
+        "sv": "SWE",
+    }
+
+    def _language_uri(self, language):
+        """Returns the URI of a language in the language authority table, given as two letter or authority code."""
+        code = self._LANGUAGES.get(language.lower(), language.upper())
+        assert re.fullmatch(
+            "[A-Z]{3}", code
+        ), f"'{language}' is invalid - use a two letter code such as 'en' or a code of the language authority table such as 'ENG'"
+        return "http://publications.europa.eu/resource/authority/language/" + code
+
+    # Maximum length of the URL encoded VALUES block of a batched query, as queries are sent as GET requests
+    _MAX_VALUES_LENGTH = 6000
+
+    @staticmethod
+    def _string(value):
+        """Returns a value as a SPARQL simple literal."""
+        return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    @staticmethod
+    def _literal(value):
+        """Returns a value as a SPARQL string literal."""
+        return Eurlex._string(value) + "^^xsd:string"
+
+    def _batches(self, terms, batch_size):
+        """Splits the terms of a VALUES block into batches of at most `batch_size` terms that fit into a GET request."""
+        batch, length = [], 0
+        for term in terms:
+            size = len(quote(term)) + 3
+            if batch and (
+                len(batch) >= batch_size or length + size > self._MAX_VALUES_LENGTH
+            ):
+                yield batch
+                batch, length = [], 0
+            batch.append(term)
+            length += size
+        if batch:
+            yield batch
+
+    def _query_values(self, template, terms, batch_size, max_workers, endpoint):
+        """Runs a query once per batch of terms, which replace {values} in `template`, and concatenates the results.
+        Batches that fail are listed in `df.attrs["failed_batches"]` of the result.
+        """
+
+        def run(batch):
+            try:
+                return self._run_query(
+                    template.replace("{values}", " ".join(batch)), endpoint
+                )
+            except Exception as e:
+                logger.error(
+                    "There was an error when performing the query for %s values: %s",
+                    len(batch),
+                    e,
+                )
+                return None
+
+        batches = list(self._batches(terms, batch_size))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            frames = list(executor.map(run, batches))
+        failed = [batch for batch, frame in zip(batches, frames) if frame is None]
+        frames = [f for f in frames if f is not None and not f.empty]
+        data_frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        data_frame.attrs["failed_batches"] = failed
+        return data_frame
+
+    def get_titles(
+        self,
+        celex_ids,
+        language: str = "en",
+        batch_size: int = 250,
+        max_workers: int = 4,
+        endpoint=None,
+    ):
+        """Retrieves the titles of many documents with a few SPARQL queries, instead of one object notice per document as `get_data` does.
+        Parameters
+        ----------
+        celex_ids: iterable of str
+            The CELEX numbers of the documents
+        language: str
+            The language of the titles, see `title_language` of `make_query`
+            Default: "en"
+        batch_size: int
+            The maximum number of CELEX numbers per query. Batches are also split so that the query stays short enough for a GET request.
+            Default: 250
+        max_workers: int
+            The number of queries run concurrently
+            Default: 4
+        endpoint: str or EndpointPool
+            The endpoint to query, see `query_eurlex`
+            Default: None
+        Returns
+        -------
+            df: pandas.DataFrame with the columns celex and title, with one row per distinct CELEX number in the order
+            they were given. The title is missing if the document or its expression in `language` was not found. The
+            batches that failed are listed in `df.attrs["failed_batches"]`.
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> eur.get_titles(["32016R0679", "32014R0001", "62012CJ0131"], language="de")
+        """
+        celex_ids = list(dict.fromkeys(str(c) for c in celex_ids if pd.notna(c)))
+        template = (
+            """PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+  PREFIX xsd:<http://www.w3.org/2001/XMLSchema#>
+  select ?celex ?title where{ VALUES ?celex { {values} }
+  ?work cdm:resource_legal_id_celex ?celex.
+  ?expression cdm:expression_belongs_to_work ?work.
+  ?expression cdm:expression_uses_language <"""
+            + self._language_uri(language)
+            + """>.
+  ?expression cdm:expression_title ?title.}"""
+        ).replace("\n", "")
+        found = self._query_values(
+            template,
+            [self._literal(c) for c in celex_ids],
+            batch_size,
+            max_workers,
+            endpoint,
+        )
+        titles = pd.DataFrame({"celex": pd.Series(celex_ids, dtype=object)})
+        if not found.empty:
+            found = found.astype({"celex": str}).drop_duplicates("celex")
+            titles = titles.merge(found[["celex", "title"]], on="celex", how="left")
+        else:
+            titles["title"] = pd.Series([None] * len(titles), dtype=object)
+        titles.attrs["failed_batches"] = found.attrs.get("failed_batches", [])
+        return titles
+
+    # Columns of the results of resolve_ids
+    _ID_COLUMNS = ["id", "work", "celex", "ecli", "date", "type"]
+
+    def resolve_ids(
+        self,
+        ids,
+        batch_size: int = 250,
+        max_workers: int = 4,
+        endpoint=None,
+    ):
+        """Maps CELEX numbers and ECLIs to their Cellar work, CELEX number, ECLI, date and resource type with a few SPARQL queries.
+        Identifiers are resolved in batches of VALUES queries that are run concurrently, and resolved identifiers are
+        remembered in `resolved_ids`, so they are not queried again.
+        Parameters
+        ----------
+        ids: iterable of str
+            CELEX numbers, and ECLIs starting with "ECLI:" in any case, which are upper-cased as in Cellar
+        batch_size: int
+            The maximum number of identifiers per query. Batches are also split so that the query stays short enough for a GET request.
+            Default: 250
+        max_workers: int
+            The number of queries run concurrently
+            Default: 4
+        endpoint: str or EndpointPool
+            The endpoint to query, see `query_eurlex`
+            Default: None
+        Returns
+        -------
+            df: pandas.DataFrame with the columns id, work, celex, ecli, date and type, with one row per distinct
+            identifier in the order they were given. All but the id are missing for identifiers that were not found.
+            The batches that failed are listed in `df.attrs["failed_batches"]`.
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> eur.resolve_ids(["32016R0679", "ECLI:EU:C:1963:1", "62012CJ0131"])
+        """
+        ids = list(
+            dict.fromkeys(
+                str(i).upper() if str(i).upper().startswith("ECLI:") else str(i)
+                for i in ids
+                if pd.notna(i)
+            )
+        )
+        with self._lock:
+            missing = [i for i in ids if i not in self.resolved_ids]
+        failed = []
+        for kind, predicate in [
+            ("celex", "cdm:resource_legal_id_celex"),
+            ("ecli", "cdm:case-law_ecli"),
+        ]:
+            terms = [
+                self._literal(i)
+                for i in missing
+                if i.startswith("ECLI:") == (kind == "ecli")
+            ]
+            if not terms:
+                continue
+            template = (
+                """PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+  PREFIX xsd:<http://www.w3.org/2001/XMLSchema#>
+  select ?id ?work ?celex ?ecli ?date ?type where{ VALUES ?id { {values} }
+  ?work """
+                + predicate
+                + """ ?id.
+  OPTIONAL{?work cdm:resource_legal_id_celex ?celex.}
+  OPTIONAL{?work cdm:case-law_ecli ?ecli.}
+  OPTIONAL{?work cdm:work_date_document ?date.}
+  OPTIONAL{?work cdm:work_has_resource-type ?type.}}"""
+            ).replace("\n", "")
+            found = self._query_values(
+                template, terms, batch_size, max_workers, endpoint
+            )
+            failed.extend(found.attrs.get("failed_batches", []))
+            if found.empty:
+                continue
+            found = found.astype({"id": str}).drop_duplicates("id")
+            with self._lock:
+                for row in found.to_dict("records"):
+                    self.resolved_ids[row["id"]] = {
+                        column: row.get(column) for column in self._ID_COLUMNS
+                    }
+        with self._lock:
+            rows = [self.resolved_ids.get(i, {"id": i}) for i in ids]
+        data_frame = pd.DataFrame(rows, columns=self._ID_COLUMNS)
+        data_frame.attrs["failed_batches"] = failed
         return data_frame
 
     notice_type: Literal = ["tree", "branch", "object"]
@@ -524,6 +1453,7 @@ class Eurlex:
     "Downloads an XML notice of a given type, based on a Cellar resource"
 
     # TODO consolidate the repetitive parts of get_data and download_xml
+    @traced("download_xml", "notice")
     def download_xml(
         self,
         url: str,
@@ -531,6 +1461,7 @@ class Eurlex:
         filename: str = None,
         languages: list = ["en", "fr", "de"],
         mode: str = "wb",
+        compression: compression_types = None,
     ):
         """Downloads the XML notice for a given notice type, when supplied with a URL or CELEX number.
         Parameters
@@ -549,10 +1480,13 @@ class Eurlex:
         mode: str
             The mode to open the file in.
         Default: "wb"
+        compression: str
+            Store the notice compressed on disk, either as "gzip" or as "zstd" (requires the zstandard package). The suffix .gz or .zst is appended to the filename. Use `eurlex.storage.read_file` to read it back.
+        Default: None
 
         Returns
         -------
-        None
+        str: The uncompressed notice
 
         Examples
         --------
@@ -564,56 +1498,67 @@ class Eurlex:
         >>> eur.download_xml("32014R0001", notice="branch")
         """
         assert url, "URL has to be specified"
-        filename = os.path.basename(url)
+        if not filename:
+            filename = os.path.basename(url)
+        filename = compressed_filename(filename, compression)
         assert notice, "Notice type has to be specified"
         assert (
             notice in self.notice_type
         ), "Notice type must be set as one of {}".format(self.notice_type)
-        language_header = ""
-        for lang in range(0, len(languages)):
-            if lang == 0:
-                language_header += languages[0] + ", "
-            elif lang == 1:
-                language_header += languages[1] + ";q=0.8, "
-            elif lang == 2:
-                language_header += languages[2] + ";q=0.7"
-            else:
-                print("Only three languages at a time are supported")
-        print("The language header is: {}".format(language_header))
+        language_header = self._language_header(languages)
+        logger.debug("The language header is: %s", language_header)
         if (url[:4] == "http" and re.fullmatch(".*cellar.*", url)) or (
             url[:4] == "http" and re.fullmatch(".*celex.*", url)
         ):
-            print(
-                "Assuming URL to be a valid, http based EU Cellar resource: {}".format(
-                    url
-                )
+            logger.debug(
+                "Assuming URL to be a valid, http based EU Cellar resource: %s", url
             )
         else:
             # Additional testing?
             # if (stringr::str_detect(url,"celex.*[\\(|\\)|\\/]")){
             # assume it is a CELEX number
-            url = "http://publications.europa.eu/resource/celex/" + url
-            print("The CELEX url is: {}".format(url))
+            celex = url
+            url = self.resource_url + "celex/" + url
+            logger.debug(
+                "The CELEX url is: %s", url, extra={"celex": celex, "url": url}
+            )
         accept_header = "application/xml; notice=" + notice
         if notice == "object":
-            head = requests.head(
+            head = self._request(
+                "head",
                 # redirects to cellar url so redirects are necessary
                 url,
-                headers={"Accept": accept_header},
+                headers={
+                    "Accept": accept_header,
+                    "Accept-Encoding": self._ACCEPT_ENCODING,
+                },
                 allow_redirects=True,
             )
         else:
-            head = requests.head(
+            head = self._request(
+                "head",
                 url,
-                headers={"Accept-Language": language_header, "Accept": accept_header},
+                headers={
+                    "Accept-Language": language_header,
+                    "Accept": accept_header,
+                    "Accept-Encoding": self._ACCEPT_ENCODING,
+                },
                 allow_redirects=True,
             )
         assert head.status_code == 200, "The http request was unsuccessful {}".format(
             head.status_code
         )
-        file_content = requests.get(head.url).content
+        response = self._request(
+            "get", head.url, headers={"Accept-Encoding": self._ACCEPT_ENCODING}
+        )
+        file_content = response.content
+        stored_content = compress(file_content, compression)
+        with self._lock:
+            self._record_transfer(response)
+            self.compression_stats["raw_bytes"] += len(file_content)
+            self.compression_stats["stored_bytes"] += len(stored_content)
         with open(filename, mode) as writer:
-            writer.write(file_content)
+            writer.write(stored_content)
         return str(
             file_content
         )  # TODO alternatively, offer to return instead of saving to file (or make separate function)
@@ -622,6 +1567,7 @@ class Eurlex:
 
     "Download data/documents from EU Cellar based on a given resource URL"
 
+    @traced("get_data", "data_type", "notice")
     def get_data(
         self,
         url,
@@ -630,6 +1576,10 @@ class Eurlex:
         languages: list = ["en", "fr", "de"],
         include_breaks: bool = False,
         extract_caselaw_metadata: bool = False,
+        max_workers: int = 4,
+        first_acceptable: bool = False,
+        format_preference: list = None,
+        probe: bool = False,
     ):
         """This function takes a URL or Celex number and returns data, such as the title, text, the id, or notices.
         Parameters
@@ -649,6 +1599,20 @@ class Eurlex:
         extract_caselaw_metadata
             For the title, tries to break it down into case name, parties and case number.
             Default: False
+        max_workers
+            The number of manifestations fetched concurrently when Cellar answers a text request with 300 Multiple Choices.
+            Default: 4
+        first_acceptable
+            If Cellar answers with 300 Multiple Choices, stop requesting manifestations once one in a format of `format_preference` arrives, and only return those in the cheapest format retrieved so far instead of all of them.
+            Default: False
+        format_preference
+            The media types to request for text, from most preferred to least preferred. Overrides the `format_preference` of the instance for this call.
+            Default: None
+        probe
+            For text, first checks with HEAD requests which of the preferred formats is available and only downloads the cheapest one.
+            Default: False
+        If the instance has a `memo` (see `eurlex.memo.Memo`), results that were retrieved are kept in it, and
+        concurrent calls with the same arguments wait for one download.
         Returns
         -------
             out: The relevant response as str
@@ -660,6 +1624,76 @@ class Eurlex:
         >>> eur.get_data("32016R0679")
         >>> eur.get_data("32014R0001")
         """
+        if self.memo is None:
+            return self._get_data(
+                url,
+                data_type,
+                notice,
+                languages,
+                include_breaks,
+                extract_caselaw_metadata,
+                max_workers,
+                first_acceptable,
+                format_preference,
+                probe,
+            )
+        # the number of workers does not change the result, the instance settings do, as the memo may be shared
+        key = (
+            self.resource_url,
+            url,
+            data_type,
+            notice,
+            tuple(languages),
+            include_breaks,
+            extract_caselaw_metadata,
+            first_acceptable,
+            tuple(
+                format_preference
+                if format_preference is not None
+                else self.format_preference
+            ),
+            probe,
+        )
+        return self.memo.get_or_compute(
+            key,
+            lambda: self._get_data(
+                url,
+                data_type,
+                notice,
+                languages,
+                include_breaks,
+                extract_caselaw_metadata,
+                max_workers,
+                first_acceptable,
+                format_preference,
+                probe,
+            ),
+            cache_if=self._retrieved,
+        )
+
+    @staticmethod
+    def _retrieved(out):
+        """Whether a result of get_data was retrieved, as failures are returned as 1, status codes or "NaN" texts."""
+        if isinstance(out, int):
+            return False
+        if isinstance(out, dict):
+            out = out["title"]
+        return not (isinstance(out, str) and (out.startswith("NaN") or out.isdigit()))
+
+    def _get_data(
+        self,
+        url,
+        data_type: data_types,
+        notice: notice_type = None,
+        languages: list = ["en", "fr", "de"],
+        include_breaks: bool = False,
+        extract_caselaw_metadata: bool = False,
+        max_workers: int = 4,
+        first_acceptable: bool = False,
+        format_preference: list = None,
+        probe: bool = False,
+    ):
+        """Retrieves the data of `get_data` without the memo."""
 
         assert url, "The URL or CELEX number is necessary to retrieve data"
         assert (
@@ -676,83 +1710,61 @@ class Eurlex:
             assert (
                 extract_caselaw_metadata is False
             ), "Case law metadata can only be extracted from titles (of caselaw)"
+        if format_preference is None:
+            format_preference = self.format_preference
         # TODO
         # Ok, it is a bit weird to filter language not in CELLAR but in http header
-        language_header = ""
-        for lang in range(0, len(languages)):
-            if lang == 0:
-                language_header += languages[0] + ", "
-            elif lang == 1:
-                language_header += languages[1] + ";q=0.8, "
-            elif lang == 2:
-                language_header += languages[2] + ";q=0.7"
-            else:
-                print("Only three languages at a time are supported")
+        language_header = self._language_header(languages)
 
         if url[:4] == "http" and re.fullmatch(".*cellar.*", url):
-            if __name__ == "__main__":
-                print("Assuming URL to be a valid, http based EU Cellar resource")
+            logger.debug("Assuming URL to be a valid, http based EU Cellar resource")
         else:
             if not url[:4] == "http":
                 # TODO - Add additional testing?
                 # if (stringr::str_detect(url,"celex.*[\\(|\\)|\\/]")){
                 # assume it is a CELEX number
-                url = "http://publications.europa.eu/resource/celex/" + url
-                if __name__ == "__main__":
-                    print("The CELEX url is: {}".format(url))
+                celex = url
+                url = self.resource_url + "celex/" + url
+                logger.debug(
+                    "The CELEX url is: %s", url, extra={"celex": celex, "url": url}
+                )
 
         if data_type == "title":
             out = ""  # should be dict but then should be changed in whole function
             try:
-                if __name__ == "__main__":
-                    print("Getting title data...")
-                response = requests.get(
+                logger.debug("Getting title data for %s", url)
+                response = self._request(
+                    "get",
                     url,
                     headers={
                         "Accept-Language": language_header,
                         "Accept": "application/xml; notice=object",
+                        "Accept-Encoding": self._ACCEPT_ENCODING,
                     },
                 )
             except Exception as e:
-                print("There was an error during data retrieval: {}", e)
-                out = {
-                    "title": str(response.status_code),
-                    "parties": str(response.status_code),
-                    "case_number": str(response.status_code),
-                }
+                logger.error(
+                    "There was an error during data retrieval: %s",
+                    e,
+                    extra={"url": url},
+                )
+                return {"title": "NaN", "parties": "NaN", "case_number": "NaN"}
             if response.status_code == 200:
-                html = BeautifulSoup(response.text, "xml")
-                out = str(html.find("EXPRESSION_TITLE").get_text())
+                with self.tracer.start_as_current_span("parse.notice"):
+                    html = BeautifulSoup(response.text, "xml")
+                    out = str(html.find("EXPRESSION_TITLE").get_text())
 
                 if extract_caselaw_metadata:
-                    if __name__ == "__main__":
-                        print("Extracting metadata...")
-                    if re.match(
-                        "(?s).*#.*#.*$",
-                        out,  # added (?s) singleline flag to also match newlines which are sometimes a part of the text
-                    ):  # "#" in out: TODO - could improve by trying to match sub-parts based on keywords or structure to their relevant parts, even when there are only 2
-                        if __name__ == "__main__":
-                            print("Extracting metadata after matching #")
-                        title = out.split("#")[0].strip()
-                        parties = out.split("#")[1].strip().strip(".")
-                        case_number = out.split("#")[2].strip().strip(".")
-
-                        out = {
-                            "title": title,
-                            "parties": parties,
-                            "case_number": case_number,
-                        }
-                    else:
-                        if __name__ == "__main__":
-                            print("No caselaw metadata extracted")
-                        out = {"title": out, "parties": "NaN", "case_number": "NaN"}
+                    out = self._split_caselaw_title(out)
                 else:
                     out = {"title": out, "parties": "NaN", "case_number": "NaN"}
-                if __name__ == "__main__":
-                    print(out)
+                logger.debug("Title data: %s", out)
             else:
-                if __name__ == "__main__":
-                    print("No content retrieved: {}", response.status_code)
+                logger.info(
+                    "No content retrieved: %s",
+                    response.status_code,
+                    extra={"url": url, "status": response.status_code},
+                )
                 out = {
                     "title": str(response.status_code),
                     "parties": str(response.status_code),
@@ -762,63 +1774,49 @@ class Eurlex:
         elif data_type == "text":
             out = ""
             try:
-                if __name__ == "__main__":
-                    print("Getting text data...")
-                response = requests.get(
-                    url,
-                    headers={
-                        "Accept-Language": language_header,
-                        "Content-Language": language_header,
-                        "Accept": "text/html, text/html;type=simplified, text/plain, application/xhtml+xml, application/xhtml+xml;type=simplified, application/pdf, application/pdf;type=pdf1x, application/pdf;type=pdfa1a, application/pdf;type=pdfx, application/pdf;type=pdfa1b, application/msword",
-                    },
-                )
+                logger.debug("Getting text data for %s", url)
+                text_headers = self._text_headers(language_header, format_preference)
+                if probe:
+                    url, text_headers = self._probe_manifestation(
+                        url, text_headers, format_preference
+                    )
+                response = self._request("get", url, headers=text_headers)
             except Exception as e:
-                print("There was an error during gathering data: {}", e)
+                logger.error(
+                    "There was an error during gathering data: %s",
+                    e,
+                    extra={"url": url},
+                )
+                return 1
 
             if response.status_code == 200:
-                if __name__ == "__main__":
-                    print("Got a {} reponse, great!".format(response.status_code))
                 out = self.read_data(response)
 
             elif response.status_code == 300:
-                html = BeautifulSoup(response.content, "html.parser")
-                links_html = html.find_all("a", href=True)
-                links = []
-                for link in links_html:
-                    links.append(link["href"])
-                if __name__ == "__main__":
-                    print("Found multiple links: {}", links)
-                multiout = ""
-                for link in links:
-                    multiresponse = requests.get(
-                        url,
-                        headers={
-                            "Accept-Language": language_header,
-                            "Content-Language": language_header,
-                            "Accept": "text/html, text/html;type=simplified, text/plain, application/xhtml+xml, application/xhtml+xml;type=simplified, application/pdf, application/pdf;type=pdf1x, application/pdf;type=pdfa1a, application/pdf;type=pdfx, application/pdf;type=pdfa1b, application/msword",
-                        },
-                    )
-                    if multiresponse.status_code == 200:
-                        if __name__ == "__main__":
-                            print(str(multiresponse.status_code))
-                            print(multiresponse.text)
-                        multiout += (
-                            self.read_data(multiresponse) + "---documentbreak---"
-                        )
-                    else:
-                        multiout += "NaN"
-                if __name__ == "__main__":
-                    print(multiout)
-                out = multiout  # TODO stringify?
+                links = self._choice_links(response)
+                logger.debug("Found multiple links: %s", links)
+                out = self._read_manifestations(
+                    links,
+                    headers=text_headers,
+                    max_workers=max_workers,
+                    first_acceptable=first_acceptable,
+                    format_preference=format_preference,
+                )
             elif response.status_code == 406:
                 out += "NaN" + str(
                     response.status_code
                 )  # TODO ok this is a pretty ... thing to do
-                if __name__ == "__main__":
-                    print("missingdoc")
+                logger.info(
+                    "No document in an acceptable format: %s",
+                    url,
+                    extra={"url": url, "status": response.status_code},
+                )
             else:
-                if __name__ == "__main__":
-                    print("No content retrieved {}", response)
+                logger.info(
+                    "No content retrieved: %s",
+                    response.status_code,
+                    extra={"url": url, "status": response.status_code},
+                )
             if not include_breaks:
                 out = out.replace("---documentbreak---", "").replace(
                     "---pagebreak---", ""
@@ -826,22 +1824,24 @@ class Eurlex:
 
         elif data_type == "ids":
             out = ""
-            response = requests.get(
+            response = self._request(
+                "get",
                 url,
                 headers={
                     "Accept-Language": language_header,
                     "Accept": "application/xml; notice=identifiers",
+                    "Accept-Encoding": self._ACCEPT_ENCODING,
                 },
             )
             if response.status_code == 200:
-                xml = BeautifulSoup(response.content, "xml")
-                out = xml.find_all("VALUE")
+                with self.tracer.start_as_current_span("parse.notice"):
+                    xml = BeautifulSoup(response.content, "xml")
+                    out = xml.find_all("VALUE")
                 temp = []
                 for v in out:
                     temp.append(v.get_text())
                 out = temp
-                if __name__ == "__main__":
-                    print(out)
+                logger.debug("Identifiers: %s", out)
             else:
                 out += str(response.status_code)
         elif data_type == "notice":
@@ -850,24 +1850,34 @@ class Eurlex:
             if (
                 notice == "object"
             ):  # if notice is of type object, there is no language header
-                response = requests.get(url, headers={"Accept": accept_header})
+                response = self._request(
+                    "get",
+                    url,
+                    headers={
+                        "Accept": accept_header,
+                        "Accept-Encoding": self._ACCEPT_ENCODING,
+                    },
+                )
             else:
-                response = requests.get(
+                response = self._request(
+                    "get",
                     url,
                     headers={
                         "Accept-Language": language_header,
                         "Accept": accept_header,
+                        "Accept-Encoding": self._ACCEPT_ENCODING,
                     },
                 )
             if response.status_code == 200:
-                if __name__ == "__main__":
-                    print("Retrived notice successfully.")
-                    print(response.text)
+                logger.debug("Retrieved notice successfully.")
                 out += response.text
             else:
                 out = str(response.status_code)
-                if __name__ == "__main__":
-                    print(f"Something might have gone wrong: {response.status_code}")
+                logger.info(
+                    "Something might have gone wrong: %s",
+                    response.status_code,
+                    extra={"url": url, "status": response.status_code},
+                )
         else:
             return "You should not be here."
         if out:
@@ -875,7 +1885,412 @@ class Eurlex:
         else:
             return 1
 
+    # Caselaw titles consist of the title, the parties and the case number separated by "#". The (?s) singleline flag
+    # also matches newlines, which are sometimes a part of the text. TODO - could improve by trying to match sub-parts
+    # based on keywords or structure to their relevant parts, even when there are only 2
+    _CASELAW_TITLE = re.compile(r"(?s)^([^#]*)#([^#]*)#([^#]*)")
+
+    def _split_caselaw_title(self, title):
+        """Splits a single caselaw title into title, parties and case number, see `split_caselaw_titles`."""
+        match = self._CASELAW_TITLE.match(title)
+        if match is None:
+            logger.debug("No caselaw metadata extracted")
+            return {"title": title, "parties": "NaN", "case_number": "NaN"}
+        return {
+            "title": match.group(1).strip(),
+            "parties": match.group(2).strip().strip("."),
+            "case_number": match.group(3).strip().strip("."),
+        }
+
+    def split_caselaw_titles(self, titles):
+        """Splits caselaw titles into title, parties and case number in bulk, like `get_data` with `extract_caselaw_metadata=True` does for a single title.
+        Parameters
+        ----------
+        titles: pandas.Series or list
+            Caselaw titles, f.e. from object notices or the title column of query results
+        Returns
+        -------
+            A data frame with the columns title, parties and case_number and the index of `titles`. Titles with fewer
+            than three parts separated by "#" are kept as they are, with "NaN" as parties and case number, and missing
+            titles stay missing.
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> eur.split_caselaw_titles(["Judgment of the Court of 5 February 1963.#NV Algemene Transport- en Expeditie Onderneming van Gend & Loos v Netherlands Inland Revenue Administration.#Case 26-62."])
+        """
+        titles = pd.Series(titles, dtype=object)
+        parts = titles.str.extract(self._CASELAW_TITLE)
+        matched = parts[0].notna()
+        unmatched = titles.notna() & ~matched
+        return pd.DataFrame(
+            {
+                "title": parts[0].str.strip().where(matched, titles),
+                "parties": parts[1].str.strip().str.strip(".").mask(unmatched, "NaN"),
+                "case_number": parts[2]
+                .str.strip()
+                .str.strip(".")
+                .mask(unmatched, "NaN"),
+            },
+            index=titles.index,
+        )
+
+    def get_manifestations(
+        self,
+        url,
+        languages: list = ["en", "fr", "de"],
+        max_workers: int = 4,
+        first_acceptable: bool = False,
+        format_preference: list = None,
+        probe: bool = False,
+    ):
+        """Downloads the manifestations of the text of a document without parsing them, f.e. to parse them in another process (see `eurlex.pipeline`).
+        The parameters are those of `get_data` for text.
+        Returns
+        -------
+            A list of responses in the order `get_data` would read them, with None for each manifestation that could not
+            be retrieved. The list is empty if no manifestation in an acceptable format exists.
+        """
+        if format_preference is None:
+            format_preference = self.format_preference
+        if not url[:4] == "http":
+            url = self.resource_url + "celex/" + url
+        headers = self._text_headers(
+            self._language_header(languages), format_preference
+        )
+        if probe:
+            url, headers = self._probe_manifestation(url, headers, format_preference)
+        response = self._request("get", url, headers=headers)
+        if response.status_code == 200:
+            return [response]
+        if response.status_code == 300:
+            return self._fetch_manifestations(
+                self._choice_links(response),
+                headers,
+                max_workers,
+                first_acceptable,
+                format_preference,
+            )
+        logger.info(
+            "No content retrieved: %s",
+            response.status_code,
+            extra={"url": url, "status": response.status_code},
+        )
+        return []
+
+    def get_data_multilingual(
+        self,
+        url,
+        data_type: data_types = "text",
+        languages: list = ["en", "fr", "de"],
+        max_workers: int = None,
+        **kwargs,
+    ):
+        """Fetches the expressions of a work in several languages concurrently, f.e. to build a parallel corpus.
+        Parameters
+        ----------
+        url
+            The URL or CELEX number to download/access
+        data_type
+            The data type to download, see `get_data`
+            Default: "text"
+        languages
+            The languages to fetch. Each one is requested on its own, so the result does not depend on which language Cellar prefers.
+            Default: ["en", "fr", "de"]
+        max_workers
+            The number of languages fetched concurrently.
+            Default: None, i.e. all of them
+        Further keyword arguments are passed to `get_data`. To reuse connections across the languages, create the instance with a `requests.Session`.
+        Returns
+        -------
+            A dict with the result of `get_data` per language, in the order of `languages`, which is empty without languages
+        Examples
+        --------
+        >>> import requests
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex(session=requests.Session())
+        >>> texts = eur.get_data_multilingual("32016R0679", languages=["en", "fr", "de", "it", "es", "pl"])
+        >>> texts["fr"][:100]
+        """
+        languages = list(dict.fromkeys(languages))
+        if not languages:
+            return {}
+        with ThreadPoolExecutor(max_workers=max_workers or len(languages)) as executor:
+            results = executor.map(
+                lambda language: self.get_data(
+                    url, data_type, languages=[language], **kwargs
+                ),
+                languages,
+            )
+            return dict(zip(languages, results))
+
+    def _request(self, method, url, **kwargs):
+        """Sends a GET or HEAD request and records it as a span with its status, content type, size and timings.
+        `time_to_headers` is the time until the response headers were parsed, which includes resolving the host,
+        connecting and the TLS handshake when no pooled connection is reused, besides the latency of the server.
+        `download` is the remaining time to read the body."""
+        with self.tracer.start_as_current_span("http." + method) as span:
+            start = time.perf_counter()
+            response = getattr(
+                self.session if self.session is not None else requests, method
+            )(url, **kwargs)
+            if span.is_recording():
+                total = time.perf_counter() - start
+                time_to_headers = response.elapsed.total_seconds()
+                span.set_attribute("url", url)
+                span.set_attribute("status", response.status_code)
+                span.set_attribute("content_type", response.headers.get("Content-Type"))
+                span.set_attribute("bytes", len(response.content or b""))
+                span.set_attribute("time_to_headers", time_to_headers)
+                span.set_attribute("download", max(total - time_to_headers, 0.0))
+            if logger.isEnabledFor(logging.DEBUG):
+                elapsed = time.perf_counter() - start
+                logger.debug(
+                    "%s %s %s %.3fs",
+                    method.upper(),
+                    url,
+                    response.status_code,
+                    elapsed,
+                    extra={
+                        "url": url,
+                        "status": response.status_code,
+                        "elapsed": elapsed,
+                    },
+                )
+            return response
+
+    def _record_transfer(self, response):
+        """Adds the transferred and decoded size of a response to `compression_stats`."""
+        decoded = len(response.content)
+        if (
+            "Content-Encoding" in response.headers
+            and "Content-Length" in response.headers
+        ):
+            transferred = int(response.headers["Content-Length"])
+        else:
+            transferred = decoded
+        self.compression_stats["transferred_bytes"] += transferred
+        self.compression_stats["decoded_bytes"] += decoded
+
+    def compression_ratios(self):
+        """Returns the compression ratios achieved on the wire and on disk so far.
+        Returns
+        -------
+            dict: The ratio of decoded to transferred bytes as "transfer" and of raw to stored bytes as "storage", or None where nothing was recorded
+        """
+        with self._lock:
+            stats = dict(self.compression_stats)
+        return {
+            "transfer": (
+                stats["decoded_bytes"] / stats["transferred_bytes"]
+                if stats.get("transferred_bytes")
+                else None
+            ),
+            "storage": (
+                stats["raw_bytes"] / stats["stored_bytes"]
+                if stats.get("stored_bytes")
+                else None
+            ),
+        }
+
+    def _format_cost(self, content_type, format_preference=None):
+        """Returns the position of a content type in `format_preference`; unknown formats are the most expensive."""
+        if format_preference is None:
+            format_preference = self.format_preference
+        media_type = (content_type or "").split(";")[0].strip().lower()
+        if media_type in format_preference:
+            return format_preference.index(media_type)
+        return len(format_preference)
+
+    @staticmethod
+    def _language_header(languages):
+        """Builds an Accept-Language header that weights any number of languages by their position with q-values."""
+        accept = []
+        for position, language in enumerate(languages):
+            quality = max(0.9 - 0.1 * position, 0.1)
+            if position == 0:
+                accept.append(language)
+            else:
+                accept.append(f"{language};q={quality:.1f}")
+        return ", ".join(accept)
+
+    def _text_headers(self, language_header, format_preference=None):
+        """Returns the headers of a text request."""
+        return {
+            "Accept-Language": language_header,
+            "Content-Language": language_header,
+            "Accept": self._accept_header(format_preference),
+            "Accept-Encoding": self._ACCEPT_ENCODING,
+        }
+
+    @staticmethod
+    def _choice_links(response):
+        """Returns the distinct manifestation links of a 300 Multiple Choices response."""
+        html = BeautifulSoup(response.content, "html.parser")
+        links = []
+        for link in html.find_all("a", href=True):
+            if link["href"] not in links:
+                links.append(link["href"])
+        return links
+
+    def _accept_header(self, format_preference=None):
+        """Builds an Accept header that weights the media types by their position in `format_preference` with q-values."""
+        if format_preference is None:
+            format_preference = self.format_preference
+        accept = []
+        for position, media_type in enumerate(format_preference):
+            quality = max(1.0 - 0.1 * position, 0.1)
+            for variant in self._FORMAT_VARIANTS.get(media_type, [media_type]):
+                if position == 0:
+                    accept.append(variant)
+                else:
+                    accept.append(f"{variant};q={quality:.1f}")
+        return ", ".join(accept)
+
+    def _probe_manifestation(self, url, headers, format_preference=None):
+        """Checks with HEAD requests which of the preferred formats is available for a resource.
+        Parameters
+        ----------
+            url: The URL of the resource
+            headers: The headers that would be sent with the text request
+            format_preference: The media types to check, from most preferred to least preferred
+        Returns
+        -------
+            url, headers: The URL of the cheapest available manifestation, or of the list of its parts, and headers that only accept its format, or the unchanged arguments if no format was available
+        """
+        if format_preference is None:
+            format_preference = self.format_preference
+        for media_type in format_preference:
+            probe_headers = dict(
+                headers,
+                Accept=", ".join(self._FORMAT_VARIANTS.get(media_type, [media_type])),
+            )
+            try:
+                head = self._request(
+                    "head", url, headers=probe_headers, allow_redirects=True
+                )
+            except Exception as e:
+                logger.warning("There was an error while probing manifestations: %s", e)
+                continue
+            # 300 Multiple Choices lists the parts of a document in this format, which the text request resolves
+            if head.status_code in (200, 300):
+                return head.url, probe_headers
+        return url, headers
+
+    # Resolves the links of a 300 Multiple Choices response concurrently
+    def _read_manifestations(
+        self,
+        links,
+        headers,
+        max_workers=4,
+        first_acceptable=False,
+        format_preference=None,
+    ):
+        """Fetches the manifestation links of a 300 Multiple Choices response concurrently and returns their text.
+        Responses with identical content are only read once, and the manifestations are read in the order of `format_preference`.
+        Parameters
+        ----------
+            links: The distinct manifestation links listed in the 300 response
+            headers: The headers to send with each request
+            max_workers: The maximum number of concurrent requests
+            first_acceptable: Whether to stop requesting links once a manifestation in a format of `format_preference` arrives, and only read the parts in the cheapest format that was retrieved
+            format_preference: The media types from most preferred to least preferred, defaults to the `format_preference` of the instance
+        Returns
+        -------
+            out: The text of the manifestations, separated by ---documentbreak---, or NaN for each manifestation that could not be retrieved
+        """
+        return "".join(
+            (
+                "NaN"
+                if multiresponse is None
+                else self.read_data(multiresponse) + "---documentbreak---"
+            )
+            for multiresponse in self._fetch_manifestations(
+                links, headers, max_workers, first_acceptable, format_preference
+            )
+        )
+
+    def _fetch_manifestations(
+        self,
+        links,
+        headers,
+        max_workers=4,
+        first_acceptable=False,
+        format_preference=None,
+    ):
+        """Fetches the manifestation links of a 300 Multiple Choices response concurrently, see `_read_manifestations`.
+        With `first_acceptable`, the links that were not requested yet are cancelled as soon as a manifestation in
+        a format of `format_preference` arrives, and the requests already running are finished.
+        Returns
+        -------
+            The distinct responses in the order they are to be read, ordered by `format_preference` and then by the
+            order of the links, with None for each manifestation that could not be retrieved. A failed manifestation
+            is taken to be in the format of the link before it, so it keeps its position among the parts of a
+            document. With `first_acceptable`, only the parts in the cheapest format that was retrieved.
+        """
+        if format_preference is None:
+            format_preference = self.format_preference
+        responses = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        try:
+            futures = {
+                executor.submit(self._request, "get", link, headers=headers): position
+                for position, link in enumerate(links)
+            }
+            for future in as_completed(futures):
+                responses[futures[future]] = self._manifestation(future)
+                if first_acceptable and self._manifestation_cost(
+                    responses[futures[future]], format_preference
+                ) < len(format_preference):
+                    break
+            for future, position in futures.items():
+                # cancel() fails for the requests that are running or done, which are kept
+                if position not in responses and not future.cancel():
+                    responses[position] = self._manifestation(future)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        seen = set()
+        ordered = []
+        costs = []
+        for position in sorted(responses):
+            multiresponse = responses[position]
+            cost = self._manifestation_cost(multiresponse, format_preference)
+            if cost is None:
+                ordered.append(None)
+                costs.append(costs[-1] if costs else None)
+                continue
+            digest = hashlib.sha256(multiresponse.content).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            ordered.append(multiresponse)
+            # failed manifestations before the first retrieved one are taken to be in its format
+            costs = [cost if c is None else c for c in costs] + [cost]
+        costs = [len(format_preference) if c is None else c for c in costs]
+        if first_acceptable and costs and min(costs) < len(format_preference):
+            return [r for r, cost in zip(ordered, costs) if cost == min(costs)]
+        # sorted() is stable, so parts of a document in the same format keep their order
+        return [r for _, r in sorted(zip(costs, ordered), key=lambda pair: pair[0])]
+
+    @staticmethod
+    def _manifestation(future):
+        """Returns the response of a manifestation request, or None if it failed."""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error("There was an error during gathering data: %s", e)
+            return None
+
+    def _manifestation_cost(self, multiresponse, format_preference):
+        """Returns the format cost of a manifestation response, or None if it could not be retrieved."""
+        if multiresponse is None or multiresponse.status_code != 200:
+            return None
+        return self._format_cost(
+            multiresponse.headers.get("Content-Type"), format_preference
+        )
+
     # Reads response data and processes it to get the text, based on the content type
+    @traced("read_data")
     def read_data(self, response):
         """This function takes a response object, and returns text as a string. This text is parsed from a html, or a pdf. MS Word is not supported for now.
         (the doc test currently only tests this function indirectly, as it is called from get_data(), but for testing it separately in doctest quite some things would have to be changed)
@@ -893,29 +2308,42 @@ class Eurlex:
         """
         # check content type to be html?
         content_type = response.headers.get("Content-Type")
+        with self._lock:
+            self.format_counts[(content_type or "").split(";")[0].strip().lower()] += 1
         if "text/html" in content_type or "application/xhtml" in content_type:
-            html = BeautifulSoup(response.content, "html.parser")
-            ret = html.find("body").get_text()
+            with self.tracer.start_as_current_span("parse.html") as span:
+                span.set_attribute("bytes", len(response.content))
+                html = BeautifulSoup(response.content, "html.parser")
+                ret = html.find("body").get_text()
             return ret + "---pagebreak---"  # TODO when is this really needed?
         elif "application/pdf" in content_type:
-            text = extract_text(BytesIO(response.content))
+            with self.tracer.start_as_current_span("parse.pdf") as span:
+                span.set_attribute("bytes", len(response.content))
+                text = extract_text(BytesIO(response.content))
             return text + "---pagebreak---"
         elif "application/msword" in content_type:
             # would probably use python-docx to implement this
             ret = "The Word format is not suppported at present"
-            if __name__ == "__main__":
-                print(ret)
+            logger.warning(ret)
             return ret
         # len('Error: unsupported content type: application/xhtml+xml;charset=UTF-8')
         else:
             ret = f"Error: unsupported content type: {content_type}"
-            if __name__ == "__main__":
-                print(ret)
+            logger.warning(ret)
             return ret
 
     "Parse curia lists"
 
-    def parse_curia(self, case_lists: list = "all", limit=None):
+    # The pages of the case lists of the Court of Justice, the General Court and the Civil Service Tribunal
+    _CURIA_LISTS = {
+        "ecj": ["c1_juris.htm", "c2_juris.htm"],
+        "gc": ["t2_juris.htm"],
+        "cst": ["f1_juris.htm"],
+    }
+
+    def parse_curia(
+        self, case_lists: list = "all", limit: int = None, max_workers: int = 4
+    ):
         # def curia_cases(self, case_lists="all", parse=True):
         """
         Harvests data from lists of EU court cases from curia.europa.eu.
@@ -924,102 +2352,228 @@ class Eurlex:
         Parameters:
         -----------
         case_lists
-            Data to be scraped from four separate lists of cases maintained by Curia, defaults to "all"
-            which contains cases from Court of Justice, General Court and Civil Service Tribunal.
-            parse. If True, references to cases and appeals are parsed out from `case_info` into separate columns
+            Data to be scraped from the lists of cases maintained by Curia: "ecj" for the Court of Justice, "gc" for
+            the General Court and "cst" for the Civil Service Tribunal, or a list of them. Defaults to "all", which
+            contains all three.
+        limit
+            The maximum number of cases per list page. Defaults to None, i.e. all cases.
+        max_workers
+            The number of pages fetched concurrently
+            Default: 4
 
         @return
         A data frame containing case identifiers and information as character columns. Where the case id
-        contains a hyperlink to Eur-Lex, the CELEX identifier is retrieved as well.
+        contains a hyperlink to Eur-Lex, the CELEX identifier is retrieved as well. See `iter_curia` to process
+        the cases one by one instead of holding all case texts in memory.
         """
-        print("Selected case lists are {}".format(str(case_lists)))
-        url_ecj_old = "https://curia.europa.eu/en/content/juris/c1_juris.htm"
-        url_ecj_new = "https://curia.europa.eu/en/content/juris/c2_juris.htm"
-        url_gc_all = "https://curia.europa.eu/en/content/juris/t2_juris.htm"
-        url_cst_all = "https://curia.europa.eu/en/content/juris/f1_juris.htm"
-        # Define lists of cases to be scraped
-        valid_lists = ["ecj", "gc", "cst"]
-        # TODO make into Literal properly - valid_lists = Literal["ecj", "gc", "cst"]
-        scrape_urls = []
-        # for l in case_lists:
-        if "ecj" in case_lists or case_lists == "all":
-            scrape_urls.append(url_ecj_old)
-            scrape_urls.append(url_ecj_new)
-        elif "gc" in case_lists or case_lists == "all":
-            scrape_urls.append(url_gc_all)
-        elif "cst" in case_lists or case_lists == "all":
-            scrape_urls.append(url_cst_all)
+        return pd.DataFrame(
+            list(self.iter_curia(case_lists, limit, max_workers=max_workers))
+        )
+
+    def _curia_urls(self, case_lists):
+        """Returns the names and URLs of the list pages of the selected case lists."""
+        if case_lists == "all":
+            names = list(self._CURIA_LISTS)
         else:
-            print("You should not be here")
-        return self.curia_scraper(scrape_urls, limit)
+            names = [case_lists] if isinstance(case_lists, str) else list(case_lists)
+        unknown = [name for name in names if name not in self._CURIA_LISTS]
+        if unknown:
+            logger.warning("Unknown case lists: %s", unknown)
+        return [
+            (name, self.curia_url + "en/content/juris/" + page)
+            for name in dict.fromkeys(names)
+            if name in self._CURIA_LISTS
+            for page in self._CURIA_LISTS[name]
+        ]
 
-    def curia_scraper(self, urls, limit):
+    def iter_curia(
+        self,
+        case_lists: list = "all",
+        limit: int = None,
+        texts: bool = True,
+        max_workers: int = 4,
+    ):
+        """
+        Harvests Curia case lists like `parse_curia`, but yields the cases one by one as their texts arrive.
+        The list pages are fetched concurrently and the cases of each list are yielded as soon as it and the lists
+        before it have arrived. As a case can appear in several lists, with or without its ECLI, a case is skipped
+        if its ECLI or its case number was already seen.
+        Parameters
+        ----------
+        case_lists: str or list
+            The case lists, see `parse_curia`
+            Default: "all"
+        limit: int
+            The maximum number of cases per list page
+            Default: None, i.e. all cases
+        texts: bool
+            Whether to fetch the text of each case
+            Default: True
+        max_workers: int
+            The number of pages fetched concurrently. At most twice as many case texts are held while waiting to
+            be yielded.
+            Default: 4
+        Returns
+        -------
+            A generator of dicts with the `case_list`, `case_number`, `case_info`, `link`, `ecli`, `celex` and
+            `case_text` of each case, where available, in the order of the lists
+        Examples
+        --------
+        >>> from eurlex import Eurlex
+        >>> eur = Eurlex()
+        >>> for case in eur.iter_curia(["gc", "cst"]):
+        ...     print(case["case_number"], len(case.get("case_text", "")))
+        """
+        urls = self._curia_urls(case_lists)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            pages = executor.map(lambda url: self._curia_list(url[1], limit), urls)
+            records = self._distinct_curia_records(
+                (name, page) for (name, _), page in zip(urls, pages)
+            )
+            if not texts:
+                yield from records
+                return
+            pending = deque()
+            for record in records:
+                pending.append((record, executor.submit(self._curia_document, record)))
+                if len(pending) >= 2 * max(1, max_workers):
+                    yield self._with_text(*pending.popleft())
+            while pending:
+                yield self._with_text(*pending.popleft())
+
+    @staticmethod
+    def _distinct_curia_records(pages):
+        """Yields the records of (case list, page) pairs, skipping those whose ECLI or case number was seen before."""
+        seen_eclis, seen_numbers = set(), set()
+        for name, page in pages:
+            for record in page.values():
+                ecli, number = record.get("ecli"), record.get("case_number")
+                if ecli in seen_eclis or number in seen_numbers:
+                    continue
+                if ecli is not None:
+                    seen_eclis.add(ecli)
+                if number is not None:
+                    seen_numbers.add(number)
+                yield dict(record, case_list=name)
+
+    @staticmethod
+    def _with_text(record, future):
+        case_text = future.result()
+        if case_text is not None:
+            record["case_text"] = case_text
+        return record
+
+    # Identifiers in the cells of Curia case lists
+    _CURIA_ECLI = re.compile(r"(ECLI:EU:\w:[0-9]{4}:[0-9]+)")
+    _CURIA_CELEX = re.compile(r"^http.+?CELEX.+numdoc=(\w+?)$")
+
+    @staticmethod
+    def _html_tree(text):
+        """Parses a page with the C parser of lxml, which is several times faster than html.parser."""
+        # a new parser per call, as lxml parsers may not be shared between threads
+        return lxml.html.document_fromstring(
+            text.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8")
+        )
+
+    def _parse_curia_list(self, text, limit):
+        """Parses the rows of the case table of a Curia list page into records, without their texts."""
+        table = self._html_tree(text).find(".//table")
+        if table is None:
+            return {}
+        records = {}
+        for index, row in enumerate(table.iter("tr")):
+            if index == 0:
+                # the header
+                continue
+            if limit is not None and index > limit:
+                break
+            record = {}
+            anchors = row.findall(".//a")
+            if anchors and anchors[0].get("name") is not None:
+                record["case_number"] = anchors[0].get("name")
+            info = row.find(".//i")
+            if info is not None:
+                record["case_info"] = info.text_content()
+            if len(anchors) > 1 and anchors[1].get("href") is not None:
+                # the href is javascript:openDocument(<link>', 'curia');return;
+                record["link"] = anchors[1].get("href")[24:-19]
+            ecli = self._CURIA_ECLI.search(record.get("case_info", ""))
+            if ecli:
+                record["ecli"] = ecli.group(1)
+            celex = self._CURIA_CELEX.search(record.get("link", ""))
+            if celex:
+                record["celex"] = celex.group(1)
+            records[index] = record
+        return records
+
+    def _curia_text(self, text):
+        """Returns the text of the TexteOnly div of a Curia document page, or None if it has none."""
+        div = self._html_tree(text).get_element_by_id("TexteOnly", None)
+        return None if div is None else div.text_content()
+
+    def _curia_list(self, url, limit=None):
+        """Fetches and parses a Curia list page. Returns no records if it could not be fetched."""
+        try:
+            response = self._request("get", url)
+        except Exception as e:
+            logger.error(
+                "There was an error retrieving the case list %s: %s",
+                url,
+                e,
+                extra={"url": url},
+            )
+            return {}
+        with self.tracer.start_as_current_span("parse.curia_list"):
+            return self._parse_curia_list(response.text, limit)
+
+    def _curia_document(self, record):
+        """Fetches the text of a case, or returns None if it has no link or could not be fetched."""
+        if "link" not in record:
+            return None
+        try:
+            curia_docs = self._request("get", record["link"])
+        except Exception:
+            logger.warning(
+                "There was an error retrieving the document: %s",
+                record.get("case_number"),
+                extra={"url": record["link"]},
+            )
+            return None
+        with self.tracer.start_as_current_span("parse.curia_document"):
+            return self._curia_text(curia_docs.text)
+
+    @traced("curia_scraper")
+    def curia_scraper(self, urls, limit=None):
         multiple_lists = {}
         for u in urls:
-            # response = requests.get(u)
-            response = requests.get(u)
-            soup = BeautifulSoup(response.text, "html.parser")
-            table = soup.find("table").findAll(
-                "tr",
-            )
-            records = {}
-            for index in range(0, len(table)):
-                if 1 <= index <= limit:
-                    records[index] = {}
-                    for td in table[index]:
-                        try:
-                            records[index]["case_number"] = td.find("a")["name"]
-                        except:
-                            pass
-                        try:
-                            records[index]["case_info"] = td.find("i").text
-                        except:
-                            pass
-                        try:
-                            # print(td.find("a").next_element.a["href"])
-                            records[index]["link"] = td.find("a").next_element.a[
-                                "href"
-                            ][24:-19]
-                        except:
-                            pass
-                        try:
-                            ecli = re.search(
-                                r"^.+?(ECLI\:EU\:\w\:[0-9]{4}:[0-9]).*?$",
-                                records[index]["case_info"],
-                            )
-                            records[index]["ecli"] = ecli.group(1)
-                        except:
-                            pass
-                        try:
-                            celex = re.search(
-                                r"^http.+?CELEX.+numdoc\=(\w+?)$",
-                                records[index]["link"],
-                            )
-                            records[index]["celex"] = celex.group(1)
-                        except:
-                            pass
-                        try:
-                            curia_docs = requests.get(records[index]["link"])
-                        except:
-                            if __name__ == "__main__":
-                                print(
-                                    f"There was an error retrieving the document: {index}"
-                                )
-                        try:
-                            curia_html = BeautifulSoup(curia_docs.text, "html.parser")
-                            records[index]["case_text"] = curia_html.find(
-                                "div", attrs={"id": "TexteOnly"}, recursive=True
-                            ).text
-                        except:
-                            pass
+            records = self._curia_list(u, limit)
+            for record in records.values():
+                case_text = self._curia_document(record)
+                if case_text is not None:
+                    record["case_text"] = case_text
             multiple_lists[u] = records
         return multiple_lists
 
 
+# Leading command line flags that set the log level, before the fire command
+_VERBOSITY_FLAGS = {"-q": -1, "--quiet": -1, "-v": 1, "--verbose": 1, "-vv": 2}
+_LOG_LEVELS = {-1: logging.ERROR, 0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+
+
 # The main function. It uses the fire framework to expose the functions of the module on the command line
 def main(argv=None):
-    print("This is a CLI interface for pyeurlex")
-    Fire(Eurlex)
+    """Runs the command line interface. Diagnostics are logged to stderr at the level set by leading flags:
+    -q/--quiet only logs errors, -v/--verbose adds progress information and -vv (or -v -v) every request.
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    verbosity = 0
+    while argv and argv[0] in _VERBOSITY_FLAGS:
+        verbosity += _VERBOSITY_FLAGS[argv.pop(0)]
+    logging.basicConfig(
+        level=_LOG_LEVELS[max(-1, min(2, verbosity))],
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    Fire(Eurlex, command=argv)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,259 @@
+"""
+* Citation graph built from the results of `Eurlex.query_eurlex` for queries made with `include_citations=True`.
+"""
+
+import os
+from typing import Iterable, Literal, Union, get_args
+
+import numpy as np
+import pandas as pd
+
+
+class CitationGraph:
+    """A directed citation graph in compressed sparse row (CSR) form.
+
+    Every CELEX number is interned to an integer index. The edges of node `i` (the documents cited by `i`) are
+    `indices[indptr[i]:indptr[i + 1]]`. The arrays can be saved to a directory and memory-mapped when loaded again.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.graph import CitationGraph
+    >>> eur = Eurlex()
+    >>> q = eur.make_query(resource_type="regulation", include_citations=True, limit=1000)
+    >>> graph = CitationGraph.from_frames(eur.query_eurlex(q))
+    >>> graph.pagerank().head()
+    """
+
+    # Directions in which citations can be followed
+    _DIRECTIONS = Literal["out", "in", "both"]
+
+    def __init__(self, ids, indptr, indices):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self._positions = None
+        self._transposed = None
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        source: str = "celex",
+        target: str = "citationcelex",
+    ):
+        """Builds a citation graph from one or more data frames, f.e. the pages of a paginated query.
+        Parameters
+        ----------
+        frames: pandas.DataFrame or iterable of pandas.DataFrame
+            Query results with a column for the citing and one for the cited document
+        source: str
+            The column of the citing document. If it does not exist, the `work` column is used instead.
+            Default: "celex"
+        target: str
+            The column of the cited document
+            Default: "citationcelex"
+        Returns
+        -------
+            CitationGraph
+        """
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        positions = {}
+        sources = []
+        targets = []
+        for frame in frames:
+            source_column = source if source in frame.columns else "work"
+            edges = frame[[source_column, target]].dropna()
+            if edges.empty:
+                continue
+            edges = edges.astype(str)
+            for column in (source_column, target):
+                for celex in pd.unique(edges[column]):
+                    if celex not in positions:
+                        positions[celex] = len(positions)
+            sources.append(edges[source_column].map(positions).to_numpy(np.int64))
+            targets.append(edges[target].map(positions).to_numpy(np.int64))
+        ids = np.array(list(positions), dtype=str)
+        if not sources:
+            return cls(
+                ids, np.zeros(len(ids) + 1, dtype=np.int64), np.array([], np.int64)
+            )
+        return cls(
+            ids, *_to_csr(np.concatenate(sources), np.concatenate(targets), len(ids))
+        )
+
+    @property
+    def num_nodes(self):
+        """The number of documents in the graph."""
+        return len(self.ids)
+
+    @property
+    def num_edges(self):
+        """The number of distinct citations in the graph."""
+        return len(self.indices)
+
+    def __len__(self):
+        return self.num_nodes
+
+    def __contains__(self, celex):
+        return celex in self._position_map()
+
+    def _position_map(self):
+        if self._positions is None:
+            self._positions = {celex: i for i, celex in enumerate(self.ids.tolist())}
+        return self._positions
+
+    def _transpose(self):
+        """Returns the CSR arrays of the reversed graph, which are computed on first use."""
+        if self._transposed is None:
+            sources = np.repeat(
+                np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr)
+            )
+            self._transposed = _to_csr(
+                np.asarray(self.indices), sources, self.num_nodes
+            )
+        return self._transposed
+
+    def position(self, celex: str):
+        """Returns the integer index of a CELEX number."""
+        return self._position_map()[celex]
+
+    def out_degree(self, celex: str = None):
+        """Returns the number of documents cited by a document, or an array with the out-degree of all documents."""
+        degrees = np.diff(self.indptr)
+        return degrees if celex is None else int(degrees[self.position(celex)])
+
+    def in_degree(self, celex: str = None):
+        """Returns the number of documents citing a document, or an array with the in-degree of all documents."""
+        degrees = np.bincount(self.indices, minlength=self.num_nodes)
+        return degrees if celex is None else int(degrees[self.position(celex)])
+
+    def cites(self, celex: str):
+        """Returns the CELEX numbers of the documents cited by a document."""
+        i = self.position(celex)
+        return self.ids[self.indices[self.indptr[i] : self.indptr[i + 1]]].tolist()
+
+    def cited_by(self, celex: str):
+        """Returns the CELEX numbers of the documents citing a document."""
+        indptr, indices = self._transpose()
+        i = self.position(celex)
+        return self.ids[indices[indptr[i] : indptr[i + 1]]].tolist()
+
+    def neighbourhood(self, celex: str, k: int = 1, direction: _DIRECTIONS = "out"):
+        """Returns the documents that can be reached from a document in at most k citation steps.
+        Parameters
+        ----------
+        celex: str
+            The CELEX number to start from
+        k: int
+            The maximum number of steps
+            Default: 1
+        direction: str
+            Follow citations ("out"), citing documents ("in") or both
+            Default: "out"
+        Returns
+        -------
+            list: The CELEX numbers of the documents in the neighbourhood, without the document itself
+        """
+        assert direction in get_args(
+            self._DIRECTIONS
+        ), f"'{direction}' is invalid - valid options are {get_args(self._DIRECTIONS)}"
+        adjacency = []
+        if direction in ["out", "both"]:
+            adjacency.append((self.indptr, self.indices))
+        if direction in ["in", "both"]:
+            adjacency.append(self._transpose())
+        start = self.position(celex)
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        visited[start] = True
+        frontier = np.array([start], dtype=np.int64)
+        for _ in range(k):
+            reached = [
+                indices[indptr[i] : indptr[i + 1]]
+                for indptr, indices in adjacency
+                for i in frontier
+            ]
+            if not reached:
+                break
+            frontier = np.unique(np.concatenate(reached))
+            frontier = frontier[~visited[frontier]]
+            if len(frontier) == 0:
+                break
+            visited[frontier] = True
+        visited[start] = False
+        return self.ids[visited].tolist()
+
+    def pagerank(self, damping: float = 0.85, tol: float = 1.0e-6, max_iter: int = 100):
+        """Ranks the documents with PageRank, so that documents cited by highly ranked documents rank high.
+        Parameters
+        ----------
+        damping: float
+            The probability of following a citation instead of jumping to a random document
+            Default: 0.85
+        tol: float
+            The iteration stops once the ranks change by less than this in total
+            Default: 1.0e-6
+        max_iter: int
+            The maximum number of iterations
+            Default: 100
+        Returns
+        -------
+            pandas.Series: The ranks, indexed by CELEX number and sorted from highest to lowest
+        """
+        n = self.num_nodes
+        if n == 0:
+            return pd.Series(dtype=float)
+        out_degree = np.diff(self.indptr)
+        dangling = out_degree == 0
+        sources = np.repeat(np.arange(n, dtype=np.int64), out_degree)
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            share = np.divide(rank, out_degree, out=np.zeros(n), where=~dangling)
+            new_rank = np.bincount(self.indices, weights=share[sources], minlength=n)
+            new_rank = (
+                damping * (new_rank + rank[dangling].sum() / n) + (1.0 - damping) / n
+            )
+            converged = np.abs(new_rank - rank).sum() < tol
+            rank = new_rank
+            if converged:
+                break
+        return pd.Series(rank, index=self.ids).sort_values(ascending=False)
+
+    def save(self, path: str):
+        """Saves the graph as .npy arrays in a directory, so it can be memory-mapped by `load`."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        np.save(os.path.join(path, "indptr.npy"), self.indptr)
+        np.save(os.path.join(path, "indices.npy"), self.indices)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """Loads a graph saved with `save`.
+        Parameters
+        ----------
+        path: str
+            The directory the graph was saved to
+        mmap: bool
+            Whether to memory-map the arrays read-only instead of reading them into memory
+            Default: True
+        Returns
+        -------
+            CitationGraph
+        """
+        mmap_mode = "r" if mmap else None
+        return cls(
+            *(
+                np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+                for name in ["ids", "indptr", "indices"]
+            )
+        )
+
+
+def _to_csr(sources, targets, n):
+    """Sorts and de-duplicates edges and returns them as CSR arrays (indptr, indices)."""
+    keys = np.unique(sources * n + targets)
+    sources, targets = np.divmod(keys, n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets.astype(np.int64)
@@ -0,0 +1,198 @@
+"""
+* Locally cached copies of the directory-code and EuroVoc concept hierarchies, to filter on directories and resolve EuroVoc labels without round trips to the SPARQL endpoint.
+"""
+
+import json
+import os
+import time
+
+import pandas as pd
+
+from eurlex.storage import compress, read_file
+
+# Concept schemes that are cached by default
+DIRECTORY_SCHEMES = [
+    "http://publications.europa.eu/resource/authority/fd_555",
+    "http://publications.europa.eu/resource/authority/dir-eu-legal-act",
+]
+EUROVOC_SCHEME = "http://eurovoc.europa.eu/100141"
+
+_HIERARCHY_QUERY = """PREFIX skos:<http://www.w3.org/2004/02/skos/core#>
+  select distinct ?concept ?narrower ?label where{ ?concept skos:inScheme <{scheme}>.
+  OPTIONAL{?concept skos:narrower ?narrower.}
+  OPTIONAL{?concept skos:prefLabel ?label. FILTER(lang(?label)='{language}')}}"""
+
+
+class ConceptHierarchy:
+    """Concept hierarchies of SKOS concept schemes with precomputed descendant sets and labels.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.hierarchy import ConceptHierarchy
+    >>> eur = Eurlex()
+    >>> eur.hierarchy = ConceptHierarchy.load_or_fetch("hierarchy.json.gz", eur)
+    >>> eur.make_query(resource_type="directive", directory="04.10.30.00")  # the directory filter is a flat VALUES list
+    >>> eur.hierarchy.resolve_labels(eur.query_eurlex(q)["eurovoc"])
+    """
+
+    def __init__(self, narrower: dict = None, labels: dict = None, fetched=None):
+        self.narrower = {c: list(n) for c, n in (narrower or {}).items()}
+        self.labels = dict(labels or {})
+        self.fetched = time.time() if fetched is None else fetched
+        self._descendants = {}
+        for concept in self.narrower:
+            self._collect_descendants(concept)
+
+    def _collect_descendants(self, concept):
+        """Computes the descendants of a concept iteratively, reusing those computed before."""
+        if concept in self._descendants:
+            return self._descendants[concept]
+        # depth first post-order, so children are done before their parents
+        stack = [(concept, False)]
+        in_progress = set()
+        while stack:
+            current, children_done = stack.pop()
+            if current in self._descendants:
+                continue
+            children = self.narrower.get(current, [])
+            if children_done:
+                descendants = set(children)
+                for child in children:
+                    descendants |= self._descendants.get(child, set())
+                self._descendants[current] = frozenset(descendants)
+                in_progress.discard(current)
+                continue
+            # guard against cycles in the source data
+            in_progress.add(current)
+            stack.append((current, True))
+            for child in children:
+                if child not in self._descendants and child not in in_progress:
+                    stack.append((child, False))
+        return self._descendants[concept]
+
+    @classmethod
+    def fetch(
+        cls, eur, schemes: list = None, language: str = "en", page_size: int = 10000
+    ):
+        """Downloads concept hierarchies from the SPARQL endpoint.
+        The rows of each scheme are counted first and fetched in pages of `page_size` rows, as the endpoint caps the
+        number of rows a query returns. A RuntimeError is raised if they cannot be counted or not all of them were
+        retrieved, so an incomplete hierarchy is not cached.
+        Parameters
+        ----------
+        eur: Eurlex
+            The instance used to query the endpoint
+        schemes: list
+            The URIs of the concept schemes to download.
+            Default: the directory-code schemes and EuroVoc
+        language: str
+            The language of the labels
+            Default: "en"
+        page_size: int
+            The number of rows per query, which has to be at most the result limit of the endpoint
+            Default: 10000
+        Returns
+        -------
+            ConceptHierarchy
+        """
+        if schemes is None:
+            schemes = DIRECTORY_SCHEMES + [EUROVOC_SCHEME]
+        narrower = {}
+        labels = {}
+        for scheme in schemes:
+            frame = cls._fetch_scheme(
+                eur,
+                scheme,
+                _HIERARCHY_QUERY.replace("{scheme}", scheme)
+                .replace("{language}", language)
+                .replace("\n", ""),
+                page_size,
+            )
+            if frame.empty:
+                continue
+            for concept, group in frame.groupby("concept"):
+                narrower.setdefault(concept, [])
+                narrower[concept].extend(
+                    c for c in group["narrower"].dropna().unique().tolist()
+                )
+                label = group["label"].dropna() if "label" in group else []
+                if len(label):
+                    labels[concept] = label.iloc[0]
+        return cls(narrower, labels)
+
+    @staticmethod
+    def _fetch_scheme(eur, scheme, query, page_size):
+        """Runs the query of a scheme as pages with LIMIT and OFFSET, checking that all counted rows arrived."""
+        rows = eur.explain(query)["rows"]
+        if rows is None:
+            raise RuntimeError("The concepts of {} could not be counted".format(scheme))
+        frames = [
+            eur.query_eurlex(
+                "{} order by ?concept ?narrower ?label limit {} offset {}".format(
+                    query, page_size, offset
+                )
+            )
+            for offset in range(0, rows, page_size)
+        ]
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if len(frame) < rows:
+            raise RuntimeError(
+                "Only {} of the {} rows of {} were retrieved".format(
+                    len(frame), rows, scheme
+                )
+            )
+        return frame
+
+    @classmethod
+    def load(cls, filename: str):
+        """Loads hierarchies saved with `save`."""
+        data = json.loads(read_file(filename))
+        return cls(data["narrower"], data["labels"], data["fetched"])
+
+    def save(self, filename: str):
+        """Saves the hierarchies as JSON, gzip compressed if the file name ends with .gz."""
+        content = json.dumps(
+            {"narrower": self.narrower, "labels": self.labels, "fetched": self.fetched}
+        ).encode("utf-8")
+        with open(filename, "wb") as writer:
+            writer.write(
+                compress(content, "gzip" if filename.endswith(".gz") else None)
+            )
+
+    @classmethod
+    def load_or_fetch(
+        cls, filename: str, eur, max_age: float = 7 * 24 * 3600, **kwargs
+    ):
+        """Loads cached hierarchies, and downloads and caches them again if the cache is missing or older than `max_age` seconds.
+        If the download fails, the cache is left as it is.
+        Further keyword arguments are passed to `fetch`.
+        """
+        if os.path.isfile(filename):
+            hierarchy = cls.load(filename)
+            if time.time() - hierarchy.fetched <= max_age:
+                return hierarchy
+        hierarchy = cls.fetch(eur, **kwargs)
+        hierarchy.save(filename)
+        return hierarchy
+
+    def descendants(self, concept: str):
+        """Returns all narrower concepts of a concept, at any depth."""
+        return self._descendants.get(concept, frozenset())
+
+    def expand_directory(self, directory: str):
+        """Returns the concept URIs of a directory code in both directory schemes, together with all of their descendants."""
+        concepts = set()
+        for scheme in DIRECTORY_SCHEMES:
+            concept = scheme + "/" + directory
+            concepts.add(concept)
+            concepts |= self.descendants(concept)
+        return sorted(concepts)
+
+    def label(self, concept: str):
+        """Returns the label of a concept, or None if it is unknown."""
+        return self.labels.get(concept)
+
+    def resolve_labels(self, concepts: pd.Series):
+        """Maps a column of concept URIs, such as the `eurovoc` column of query results, to their labels."""
+        return concepts.map(self.labels)
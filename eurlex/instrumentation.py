@@ -0,0 +1,142 @@
+"""
+* Tracing hooks for the phases of queries, downloads and parsing.
+
+`Eurlex` accepts any tracer with the interface of an OpenTelemetry tracer, i.e. a `start_as_current_span(name)`
+context manager yielding a span with `set_attribute(key, value)` and `is_recording()`. An OpenTelemetry tracer can be
+passed directly; `SummaryTracer` is a built-in tracer that aggregates the spans into a summary report.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+class Span:
+    """A span that keeps its attributes in a dict."""
+
+    def __init__(self, name, recording=True):
+        self.name = name
+        self.attributes = {}
+        self._recording = recording
+
+    def set_attribute(self, key, value):
+        """Sets an attribute of the span."""
+        if self._recording:
+            self.attributes[key] = value
+
+    def is_recording(self):
+        """Whether attributes are recorded, so callers can skip computing them."""
+        return self._recording
+
+
+class NullTracer:
+    """A tracer that records nothing, used when no tracer is configured."""
+
+    _span = Span("null", recording=False)
+
+    @contextmanager
+    def start_as_current_span(self, name, **kwargs):  # pylint: disable=unused-argument
+        """Yields a span that ignores all attributes."""
+        yield self._span
+
+
+def traced(name, *argument_names):
+    """Decorates a method of `Eurlex` so each call is recorded as a span of its tracer.
+    Parameters
+    ----------
+    name: str
+        The name of the span
+    argument_names: str
+        Names of arguments of the method that are recorded as attributes of the span
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.start_as_current_span(name) as span:
+                if argument_names and span.is_recording():
+                    arguments = signature.bind_partial(self, *args, **kwargs).arguments
+                    for argument in argument_names:
+                        if argument in arguments:
+                            span.set_attribute(argument, str(arguments[argument]))
+                return function(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class SummaryTracer:
+    """A tracer that keeps the duration and attributes of every span and summarizes them per span name.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.instrumentation import SummaryTracer
+    >>> tracer = SummaryTracer()
+    >>> eur = Eurlex(tracer=tracer)
+    >>> eur.get_data("32016R0679", data_type="text")
+    >>> print(tracer.report())
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def start_as_current_span(
+        self, name, attributes=None, **kwargs
+    ):  # pylint: disable=unused-argument
+        """Times the enclosed block and records it with the attributes set on the span."""
+        span = Span(name)
+        for key, value in (attributes or {}).items():
+            span.set_attribute(key, value)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.spans.append(dict(span.attributes, name=name, duration=duration))
+
+    def clear(self):
+        """Forgets all recorded spans."""
+        with self._lock:
+            self.spans = []
+
+    def to_frame(self):
+        """Returns all recorded spans as a data frame with one row per span."""
+        with self._lock:
+            return pd.DataFrame(list(self.spans))
+
+    def summary(self):
+        """Returns the count, total, mean, median and 95th percentile duration and the total bytes of the spans per name."""
+        frame = self.to_frame()
+        if frame.empty:
+            return pd.DataFrame()
+        if "bytes" not in frame.columns:
+            frame["bytes"] = 0
+        grouped = frame.groupby("name")
+        return pd.DataFrame(
+            {
+                "count": grouped["duration"].count(),
+                "total": grouped["duration"].sum(),
+                "mean": grouped["duration"].mean(),
+                "p50": grouped["duration"].median(),
+                "p95": grouped["duration"].quantile(0.95),
+                "bytes": grouped["bytes"].sum(),
+            }
+        ).sort_values("total", ascending=False)
+
+    def report(self):
+        """Returns the summary as a printable table."""
+        summary = self.summary()
+        if summary.empty:
+            return "No spans recorded."
+        return summary.to_string(float_format=lambda x: "{:.4f}".format(x))
@@ -0,0 +1,132 @@
+"""
+* Index of legal bases and proposals built from the results of `Eurlex.query_eurlex` for queries made with `include_lbs=True` and/or `include_proposal=True`.
+"""
+
+import json
+from collections import defaultdict
+
+import pandas as pd
+
+from eurlex.storage import compress, read_file
+
+
+class LinkIndex:
+    """Maps acts to their legal bases and proposals and back, with constant time lookups.
+
+    The index is filled from query results with `update`, which can be called again with the results of new
+    harvests, and can be saved to and loaded from a JSON file (gzip compressed if the file name ends with .gz).
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.links import LinkIndex
+    >>> eur = Eurlex()
+    >>> q = eur.make_query(resource_type="regulation", include_lbs=True, include_proposal=True)
+    >>> index = LinkIndex()
+    >>> index.update(eur.query_eurlex(q))
+    >>> index.acts_based_on("12012E114")
+    >>> index.save("links.json.gz")
+    """
+
+    def __init__(self):
+        # act -> {(legal basis, suffix)}; the suffix is "" if there is none
+        self._legal_bases = defaultdict(set)
+        # act -> {proposal}
+        self._proposals = defaultdict(set)
+        self._acts_by_basis = defaultdict(set)
+        self._acts_by_basis_suffix = defaultdict(set)
+        self._acts_by_proposal = defaultdict(set)
+
+    def __len__(self):
+        return len(set(self._legal_bases) | set(self._proposals))
+
+    def _add_legal_basis(self, celex, lbcelex, suffix):
+        self._legal_bases[celex].add((lbcelex, suffix))
+        self._acts_by_basis[lbcelex].add(celex)
+        self._acts_by_basis_suffix[(lbcelex, suffix)].add(celex)
+
+    def _add_proposal(self, celex, proposal):
+        self._proposals[celex].add(proposal)
+        self._acts_by_proposal[proposal].add(celex)
+
+    def update(self, frame: pd.DataFrame, source: str = "celex"):
+        """Adds the legal bases (columns `lbcelex` and `lbsuffix`) and proposals (column `proposal`) found in query results.
+        Parameters
+        ----------
+        frame: pandas.DataFrame
+            Query results, f.e. from a new harvest. Missing columns are skipped.
+        source: str
+            The column of the act. If it does not exist, the `work` column is used instead.
+            Default: "celex"
+        Returns
+        -------
+            int: The number of links that were added
+        """
+        source = source if source in frame.columns else "work"
+        added = 0
+        if "lbcelex" in frame.columns:
+            columns = [source, "lbcelex"] + (
+                ["lbsuffix"] if "lbsuffix" in frame.columns else []
+            )
+            bases = frame[columns].dropna(subset=[source, "lbcelex"])
+            for row in bases.drop_duplicates().itertuples(index=False):
+                celex, lbcelex = str(row[0]), str(row[1])
+                suffix = "" if len(row) < 3 or pd.isna(row[2]) else str(row[2])
+                if (lbcelex, suffix) not in self._legal_bases.get(celex, ()):
+                    self._add_legal_basis(celex, lbcelex, suffix)
+                    added += 1
+        if "proposal" in frame.columns:
+            proposals = frame[[source, "proposal"]].dropna().drop_duplicates()
+            for celex, proposal in proposals.itertuples(index=False):
+                celex, proposal = str(celex), str(proposal)
+                if proposal not in self._proposals.get(celex, ()):
+                    self._add_proposal(celex, proposal)
+                    added += 1
+        return added
+
+    def legal_bases(self, celex: str):
+        """Returns the legal bases of an act as a sorted list of (CELEX, suffix) tuples."""
+        return sorted(self._legal_bases.get(celex, ()))
+
+    def acts_based_on(self, lbcelex: str, suffix: str = None):
+        """Returns the acts based on a legal basis, optionally only those with a specific suffix (f.e. an article or paragraph)."""
+        if suffix is None:
+            return sorted(self._acts_by_basis.get(lbcelex, ()))
+        return sorted(self._acts_by_basis_suffix.get((lbcelex, suffix), ()))
+
+    def proposals(self, celex: str):
+        """Returns the proposals that were adopted by an act."""
+        return sorted(self._proposals.get(celex, ()))
+
+    def adopted_acts(self, proposal: str):
+        """Returns the acts that adopted a proposal."""
+        return sorted(self._acts_by_proposal.get(proposal, ()))
+
+    def save(self, filename: str):
+        """Saves the index as JSON, gzip compressed if the file name ends with .gz."""
+        data = {
+            "legal_bases": {
+                celex: sorted(bases) for celex, bases in self._legal_bases.items()
+            },
+            "proposals": {
+                celex: sorted(proposals) for celex, proposals in self._proposals.items()
+            },
+        }
+        content = json.dumps(data).encode("utf-8")
+        with open(filename, "wb") as writer:
+            writer.write(
+                compress(content, "gzip" if filename.endswith(".gz") else None)
+            )
+
+    @classmethod
+    def load(cls, filename: str):
+        """Loads an index saved with `save`."""
+        data = json.loads(read_file(filename))
+        index = cls()
+        for celex, bases in data["legal_bases"].items():
+            for lbcelex, suffix in bases:
+                index._add_legal_basis(celex, lbcelex, suffix)
+        for celex, proposals in data["proposals"].items():
+            for proposal in proposals:
+                index._add_proposal(celex, proposal)
+        return index
@@ -0,0 +1,207 @@
+"""
+* Thread-safe in-memory memo of results, bounded by size, with expiry and coalescing of concurrent identical requests.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def size_of(value):
+    """Estimates the memory used by a value in bytes, including the items of lists, tuples, sets and dicts."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(size_of(k) + size_of(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(size_of(item) for item in value)
+    return size
+
+
+class _Flight:
+    """A computation in progress, which requests for the same key wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Memo:
+    """Least recently used memo of computed values.
+
+    Concurrent requests for a key that is being computed wait for that computation instead of starting their own
+    (single-flight), and share its result or exception. Entries expire `ttl` seconds after they were stored, and the
+    least recently used entries are evicted once the entries take more than `max_bytes` or there are more than
+    `max_entries`. Values are returned as stored, so they should not be modified.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.memo import Memo
+    >>> eur = Eurlex(memo=Memo(max_bytes=512 * 2**20, ttl=3600))
+    >>> text = eur.get_data("32016R0679", data_type="text")
+    >>> eur.memo.stats
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 2**20,
+        max_entries: int = None,
+        ttl: float = None,
+        cache_if=None,
+        clock=time.monotonic,
+    ):
+        """
+        Parameters
+        ----------
+        max_bytes: int
+            The maximum estimated size of all entries (see `size_of`). Larger values are returned but not stored.
+            Default: 256 MiB
+        max_entries: int
+            The maximum number of entries
+            Default: None, i.e. no limit
+        ttl: float
+            The number of seconds after which an entry expires
+            Default: None, i.e. entries do not expire
+        cache_if: callable
+            Called with each computed value, which is only stored if it returns True, f.e. to not store failures
+            Default: None, i.e. all values are stored
+        clock: callable
+            Returns the current time in seconds
+            Default: time.monotonic
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_if = cache_if
+        self.clock = clock
+        # key: (value, size, expiry), from least to most recently used
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def _lookup(self, key):
+        """Returns the entry of a key, dropping it if it has expired. Called with the lock held."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] <= self.clock():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def _store(self, key, value):
+        """Stores a value and evicts the least recently used entries beyond the limits. Called with the lock held."""
+        size = size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expiry = self.clock() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, size, expiry)
+        self.bytes += size
+        while self.bytes > self.max_bytes or (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        ):
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def get(self, key, default=None):
+        """Returns the stored value of a key, or `default` if it is not stored or has expired."""
+        with self._lock:
+            entry = self._lookup(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key, value):
+        """Stores a value."""
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute, cache_if=None):
+        """Returns the stored value of a key, or computes and stores it.
+        Parameters
+        ----------
+        key: hashable
+            The key of the value
+        compute: callable
+            Called without arguments to compute the value if it is not stored. While it runs, other threads that ask
+            for the same key wait for its result.
+        cache_if: callable
+            Called with the computed value, which is only stored if it returns True, in addition to the `cache_if`
+            of the memo. This lets callers that share a memo decide what to store without changing it.
+            Default: None
+        Returns
+        -------
+            The value. If `compute` raised an exception, it is raised in every thread that waited for it.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            try:
+                with self._lock:
+                    if (
+                        flight.error is None
+                        and (cache_if is None or cache_if(flight.value))
+                        and (self.cache_if is None or self.cache_if(flight.value))
+                    ):
+                        self._store(key, flight.value)
+            finally:
+                # waiters are released even if cache_if or storing the value raised
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        return flight.value
+
+    def invalidate(self, key):
+        """Removes a key."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
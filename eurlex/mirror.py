@@ -0,0 +1,338 @@
+"""
+* A lightweight local stand-in for Cellar, its SPARQL endpoint and Curia, which replays recorded responses for offline development and load testing.
+
+The recorded responses are read from a directory with the following layout:
+
+    sparql/<sha1 of the query>.csv   SPARQL results for a query (see `record_query`), sparql/default.csv for any other query
+    resource/<id>/<notice>.xml       tree, branch, object and identifiers notices of a CELEX number or Cellar id,
+                                     served with a redirect to /notices/<id>/<notice> like Cellar does
+    resource/<id>/text.<extension>   manifestations of the text, f.e. text.html, text.xhtml or text.pdf
+    resource/<id>/choices            one manifestation per line, answered with 300 Multiple Choices and links to /items/
+    items/<name>                     manifestations linked from a 300 response
+    curia/<path>                     Curia pages, f.e. curia/en/content/juris/c2_juris.htm
+
+A text request for a resource that has neither a text manifestation in an accepted format nor choices is answered with 406.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+from fire import Fire
+
+_CONTENT_TYPES = {
+    ".html": "text/html; charset=UTF-8",
+    ".htm": "text/html; charset=UTF-8",
+    ".xhtml": "application/xhtml+xml; charset=UTF-8",
+    ".txt": "text/plain; charset=UTF-8",
+    ".pdf": "application/pdf",
+    ".doc": "application/msword",
+    ".xml": "application/xml; charset=UTF-8",
+    ".csv": "text/csv; charset=UTF-8",
+}
+
+
+def query_key(query: str):
+    """Returns the file name under which the results of a query are recorded."""
+    return hashlib.sha1(query.encode("utf-8")).hexdigest() + ".csv"
+
+
+def record_query(root: str, query: str, frame: pd.DataFrame):
+    """Records the results of a query, f.e. from `Eurlex.query_eurlex`, so the mirror replays them."""
+    os.makedirs(os.path.join(root, "sparql"), exist_ok=True)
+    frame.to_csv(os.path.join(root, "sparql", query_key(query)), index=False)
+
+
+def _content_type(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return _CONTENT_TYPES.get(
+        extension, mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    )
+
+
+def _accepted(accept):
+    """Parses an Accept header into media types ordered by their q-value."""
+    ranked = []
+    for position, item in enumerate(accept.split(",")):
+        parts = [p.strip() for p in item.split(";")]
+        quality = 1.0
+        for part in parts[1:]:
+            if part.startswith("q="):
+                quality = float(part[2:])
+        if parts[0]:
+            ranked.append((-quality, position, parts[0].lower()))
+    return [media_type for _, _, media_type in sorted(ranked)]
+
+
+class MirrorServer:
+    """Serves recorded Cellar, SPARQL and Curia responses on a local port, with configurable latency and error injection.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.mirror import MirrorServer
+    >>> with MirrorServer("fixtures", latency=0.05, error_rate=0.01) as mirror:
+    ...     eur = Eurlex(endpoint=mirror.sparql_url, resource_url=mirror.resource_url, curia_url=mirror.curia_url)
+    ...     eur.get_data("32016R0679", data_type="text")
+    """
+
+    def __init__(
+        self,
+        root: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = None,
+    ):
+        """
+        Parameters
+        ----------
+        root: str
+            The directory with the recorded responses
+        host: str
+            The interface to listen on
+            Default: "127.0.0.1"
+        port: int
+            The port to listen on, 0 picks a free port
+            Default: 0
+        latency: float
+            Seconds to wait before answering each request
+            Default: 0.0
+        jitter: float
+            Up to this many seconds are randomly added to the latency
+            Default: 0.0
+        error_rate: float
+            The share of requests that are answered with `error_status` instead
+            Default: 0.0
+        error_status: int
+            The status code of injected errors
+            Default: 503
+        seed: int
+            Seed of the random numbers used for jitter and errors, for reproducible runs
+            Default: None
+        """
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """The base URL of the mirror."""
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    @property
+    def sparql_url(self):
+        """The URL of the SPARQL endpoint, to be used as `endpoint` of Eurlex."""
+        return self.url + "sparql"
+
+    @property
+    def resource_url(self):
+        """The base URL of Cellar resources, to be used as `resource_url` of Eurlex."""
+        return self.url + "resource/"
+
+    @property
+    def curia_url(self):
+        """The base URL of Curia, to be used as `curia_url` of Eurlex."""
+        return self.url + "curia/"
+
+    def start(self):
+        """Starts serving in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        """Serves in the current thread until interrupted."""
+        print("Serving {} on {}".format(self.root, self.url))
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def inject(self):
+        """Waits for the configured latency and decides whether to inject an error."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def _path(self, *parts):
+        """Returns the path of a recorded file, or None if it does not exist."""
+        path = os.path.join(self.root, *parts)
+        if os.path.commonpath(
+            [os.path.abspath(self.root), os.path.abspath(path)]
+        ) != os.path.abspath(self.root) or not os.path.isfile(path):
+            return None
+        return path
+
+    def route(self, path, query, headers):
+        """Returns the status, headers and body of the response to a request."""
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        if parts[:1] == ["sparql"]:
+            sparql = (query.get("query") or [""])[0]
+            recorded = self._path("sparql", query_key(sparql)) or self._path(
+                "sparql", "default.csv"
+            )
+            return self._file(recorded)
+        if parts[:1] == ["notices"] and len(parts) == 3:
+            return self._file(self._path("resource", parts[1], parts[2] + ".xml"))
+        if parts[:1] == ["items"] and len(parts) == 2:
+            return self._file(self._path("items", parts[1]))
+        if parts[:1] == ["curia"]:
+            return self._file(self._path("curia", *parts[1:]))
+        if parts[:1] == ["resource"] and len(parts) == 3:
+            return self._resource(parts[2], headers)
+        return 404, {}, b""
+
+    def _resource(self, resource, headers):
+        accept = headers.get("Accept", "*/*")
+        if "notice=" in accept:
+            notice = accept.split("notice=")[1].split(",")[0].split(";")[0].strip()
+            if not self._path("resource", resource, notice + ".xml"):
+                return 404, {}, b""
+            location = "{}notices/{}/{}".format(self.url, resource, notice)
+            return 303, {"Location": location}, b""
+        directory = os.path.join(self.root, "resource", resource)
+        if not os.path.isdir(directory):
+            return 404, {}, b""
+        manifestations = {
+            _content_type(f).split(";")[0]: f
+            for f in sorted(os.listdir(directory))
+            if f.startswith("text.")
+        }
+        for media_type in _accepted(accept):
+            media_type = media_type.split(";")[0]
+            if media_type == "*/*" and manifestations:
+                media_type = next(iter(manifestations))
+            if media_type in manifestations:
+                return self._file(
+                    self._path("resource", resource, manifestations[media_type])
+                )
+        choices = self._path("resource", resource, "choices")
+        if choices:
+            with open(choices, encoding="utf-8") as reader:
+                links = [line.strip() for line in reader if line.strip()]
+            body = "<html><body>{}</body></html>".format(
+                "".join(
+                    '<a href="{url}items/{link}">{link}</a>'.format(
+                        url=self.url, link=link
+                    )
+                    for link in links
+                )
+            ).encode("utf-8")
+            return 300, {"Content-Type": "text/html; charset=UTF-8"}, body
+        return 406, {}, b""
+
+    @staticmethod
+    def _file(path):
+        if path is None:
+            return 404, {}, b""
+        with open(path, "rb") as reader:
+            return 200, {"Content-Type": _content_type(path)}, reader.read()
+
+    def _handler(self):
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answers requests from the recorded responses of the mirror."""
+
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, method):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if method == "POST":
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = self.rfile.read(length).decode("utf-8")
+                    if "application/sparql-query" in self.headers.get(
+                        "Content-Type", ""
+                    ):
+                        query["query"] = [body]
+                    else:
+                        query.update(parse_qs(body))
+                if mirror.inject():
+                    status, headers, body = mirror.error_status, {}, b""
+                else:
+                    status, headers, body = mirror.route(url.path, query, self.headers)
+                if len(body) > 1024 and "gzip" in self.headers.get(
+                    "Accept-Encoding", ""
+                ):
+                    body = gzip.compress(body)
+                    headers["Content-Encoding"] = "gzip"
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if method != "HEAD":
+                    self.wfile.write(body)
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Answers GET requests."""
+                self._respond("GET")
+
+            def do_HEAD(self):  # pylint: disable=invalid-name
+                """Answers HEAD requests."""
+                self._respond("HEAD")
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Answers POST requests, as used for long SPARQL queries."""
+                self._respond("POST")
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Does not log every request."""
+
+        return Handler
+
+
+def serve(
+    root: str,
+    port: int = 8000,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = None,
+):
+    """Serves a directory of recorded responses until interrupted."""
+    MirrorServer(
+        root, port=port, latency=latency, error_rate=error_rate, seed=seed
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    Fire(serve)
@@ -0,0 +1,283 @@
+"""
+* Pipeline that downloads documents in threads and extracts and post-processes their text in a pool of processes.
+
+The CPU-bound steps, i.e. parsing HTML, extracting text from PDFs, normalizing whitespace, splitting pages and
+stripping running headers and footers, run in worker processes. The downloads run in threads and hand the raw
+manifestations to the processes through a bounded queue, so network and CPU work overlap.
+"""
+
+import logging
+import queue
+import re
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from io import BytesIO
+
+from bs4 import BeautifulSoup
+from pdfminer.high_level import extract_text
+
+logger = logging.getLogger(__name__)
+
+PAGE_BREAK = "---pagebreak---"
+DOCUMENT_BREAK = "---documentbreak---"
+
+_BREAKS = re.compile("|".join([re.escape(PAGE_BREAK), re.escape(DOCUMENT_BREAK), "\f"]))
+_SPACES = re.compile(r"[ \t\r\xa0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_DIGITS = re.compile(r"\d+")
+
+# Marks the end of the downloads in the queue
+_DONE = object()
+
+
+def normalize_whitespace(text: str):
+    """Collapses runs of spaces and tabs, strips every line and collapses more than one blank line."""
+    text = "\n".join(line.strip() for line in _SPACES.sub(" ", text).split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def split_pages(text: str):
+    """Splits a text on the page and document breaks inserted by `Eurlex.read_data` and the form feeds of PDFs, dropping empty pages."""
+    return [page for page in _BREAKS.split(text) if page.strip()]
+
+
+def strip_headers_footers(pages: list, min_share: float = 0.5, max_lines: int = 2):
+    """Removes running headers and footers, i.e. lines at the top or bottom of a page that recur on many pages.
+    Parameters
+    ----------
+    pages: list of str
+        The pages of a document
+    min_share: float
+        The share of pages a line has to recur on to be removed. Digits are ignored, so page numbers match.
+        Default: 0.5
+    max_lines: int
+        How many lines at the top and at the bottom of each page are considered
+        Default: 2
+    Returns
+    -------
+        The pages without headers and footers
+    """
+    if len(pages) < 2:
+        return list(pages)
+    lines = [[line for line in page.split("\n") if line.strip()] for page in pages]
+    counts = {}
+    for page in lines:
+        candidates = {
+            _DIGITS.sub("#", line.strip())
+            for line in page[:max_lines] + page[-max_lines:]
+        }
+        for candidate in candidates:
+            counts[candidate] = counts.get(candidate, 0) + 1
+    recurring = {
+        line
+        for line, count in counts.items()
+        if count >= max(2, min_share * len(pages))
+    }
+    stripped = []
+    for page in lines:
+        start, end = 0, len(page)
+        while (
+            start < min(max_lines, end)
+            and _DIGITS.sub("#", page[start].strip()) in recurring
+        ):
+            start += 1
+        while end > max(start, len(page) - max_lines) and (
+            _DIGITS.sub("#", page[end - 1].strip()) in recurring
+        ):
+            end -= 1
+        stripped.append("\n".join(page[start:end]))
+    return stripped
+
+
+def extract(content_type: str, content: bytes):
+    """Extracts the text of a manifestation like `Eurlex.read_data`, keeping the form feeds between the pages of PDFs."""
+    content_type = content_type or ""
+    if "text/html" in content_type or "application/xhtml" in content_type:
+        body = BeautifulSoup(content, "html.parser").find("body")
+        return body.get_text() if body is not None else ""
+    if "application/pdf" in content_type:
+        return extract_text(BytesIO(content))
+    if "text/plain" in content_type:
+        return content.decode("utf-8", errors="replace")
+    logger.warning("Error: unsupported content type: %s", content_type)
+    return ""
+
+
+def process(parts: list, normalize: bool = True, strip_headers: bool = True):
+    """Extracts and post-processes the manifestations of a document. Runs in the worker processes.
+    Parameters
+    ----------
+    parts: list of tuples
+        The content type and content of each manifestation
+    normalize: bool
+        Whether to normalize whitespace
+        Default: True
+    strip_headers: bool
+        Whether to strip running headers and footers
+        Default: True
+    Returns
+    -------
+        The pages of the document
+    """
+    pages = []
+    for content_type, content in parts:
+        document = split_pages(extract(content_type, content))
+        if strip_headers:
+            document = strip_headers_footers(document)
+        pages.extend(document)
+    if normalize:
+        pages = [normalize_whitespace(page) for page in pages]
+    return [page for page in pages if page]
+
+
+def _put(downloaded, item, stop):
+    """Puts an item on the queue, waiting while it is full unless the pipeline was stopped."""
+    while not stop.is_set():
+        try:
+            downloaded.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+class TextPipeline:
+    """Downloads the texts of documents in threads and processes them in a pool of processes.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> from eurlex.pipeline import TextPipeline
+    >>> eur = Eurlex()
+    >>> pipeline = TextPipeline(eur, io_workers=8)
+    >>> for celex, pages in pipeline.run(["32016R0679", "32014R0001"]):
+    ...     print(celex, len(pages))
+    """
+
+    def __init__(
+        self,
+        eur,
+        io_workers: int = 8,
+        processes: int = None,
+        queue_size: int = 32,
+        normalize: bool = True,
+        strip_headers: bool = True,
+    ):
+        """
+        Parameters
+        ----------
+        eur: Eurlex
+            The instance used to download the documents
+        io_workers: int
+            The number of concurrent downloads
+            Default: 8
+        processes: int
+            The number of worker processes
+            Default: None, i.e. one per CPU
+        queue_size: int
+            How many downloaded documents may wait for a worker process. Downloads pause while the queue is full.
+            Default: 32
+        normalize: bool
+            Whether to normalize whitespace
+            Default: True
+        strip_headers: bool
+            Whether to strip running headers and footers
+            Default: True
+        """
+        self.eur = eur
+        self.io_workers = io_workers
+        self.processes = processes
+        self.queue_size = queue_size
+        self._process = partial(
+            process, normalize=normalize, strip_headers=strip_headers
+        )
+
+    def _download(self, celex, downloaded, stop, kwargs):
+        """Downloads the manifestations of a document and puts them on the queue."""
+        if stop.is_set():
+            return
+        try:
+            parts = [
+                (response.headers.get("Content-Type"), response.content)
+                for response in self.eur.get_manifestations(celex, **kwargs)
+                if response is not None
+            ]
+        except Exception as e:
+            logger.error(
+                "There was an error downloading %s: %s",
+                celex,
+                e,
+                extra={"celex": celex},
+            )
+            parts = None
+        _put(downloaded, (celex, parts), stop)
+
+    def _download_all(self, celex_ids, downloaded, stop, kwargs):
+        with ThreadPoolExecutor(max_workers=self.io_workers) as executor:
+            for celex in celex_ids:
+                executor.submit(self._download, celex, downloaded, stop, kwargs)
+        _put(downloaded, _DONE, stop)
+
+    def run(self, celex_ids, **kwargs):
+        """Downloads and processes documents, yielding them as they are done.
+        Parameters
+        ----------
+        celex_ids: iterable of str
+            The CELEX numbers or URLs of the documents
+        Further keyword arguments are passed to `Eurlex.get_manifestations`.
+        Returns
+        -------
+            A generator of the CELEX number and the list of pages of each document, in the order they are done.
+            The pages are None if the document could not be downloaded or processed.
+        """
+        downloaded = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        downloader = threading.Thread(
+            target=self._download_all,
+            args=(list(celex_ids), downloaded, stop, kwargs),
+            daemon=True,
+        )
+        downloader.start()
+        pending = {}
+        done = False
+        executor = ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            while not done or pending:
+                # hand over downloads while fewer than queue_size documents are processed
+                while not done and len(pending) < self.queue_size:
+                    try:
+                        item = downloaded.get(timeout=0.05 if pending else None)
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    celex, parts = item
+                    if parts is None:
+                        yield celex, None
+                        continue
+                    pending[executor.submit(self._process, parts)] = celex
+                if not pending:
+                    continue
+                finished, _ = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    celex = pending.pop(future)
+                    try:
+                        yield celex, future.result()
+                    except Exception as e:
+                        logger.error(
+                            "There was an error processing %s: %s",
+                            celex,
+                            e,
+                            extra={"celex": celex},
+                        )
+                        yield celex, None
+        finally:
+            # also runs when the generator is closed early, so downloads and processing stop
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
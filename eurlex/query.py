@@ -0,0 +1,354 @@
+"""
+* SPARQL SELECT queries as immutable objects that can be composed, compared, paginated, sharded and counted.
+
+`Eurlex.make_query` builds a `Query` and serializes it, and `Eurlex.query` returns a `QueryBuilder` that selects
+fields by name instead of by one flag per field.
+"""
+
+import hashlib
+import re
+
+import pandas as pd
+
+PREFIXES = """PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+  PREFIX annot: <http://publications.europa.eu/ontology/annotation#>
+  PREFIX skos:<http://www.w3.org/2004/02/skos/core#>
+  PREFIX dc:<http://purl.org/dc/elements/1.1/>
+  PREFIX xsd:<http://www.w3.org/2001/XMLSchema#>
+  PREFIX rdf:<http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+  PREFIX owl:<http://www.w3.org/2002/07/owl#>"""
+
+# The fields a QueryBuilder selects, each switched on by the make_query argument "include_" + field
+FIELDS = (
+    "celex",
+    "date",
+    "date_force",
+    "date_endvalid",
+    "date_transposed",
+    "date_lodged",
+    "lbs",
+    "force",
+    "eurovoc",
+    "author",
+    "citations",
+    "court_procedure",
+    "ecli",
+    "advocate_general",
+    "judge_rapporteur",
+    "court_formation",
+    "court_scholarship",
+    "proposal",
+    "directory",
+    "sector",
+    "title",
+)
+
+_VARIABLE = re.compile(r"^\??(\w+)$")
+
+
+def order_condition(condition: str):
+    """Returns the ORDER BY condition for a field: "date" or "?date" orders ascending and "-date" descending. Other
+    conditions, such as "desc(?date)" or "str(?work)", are returned as they are."""
+    match = _VARIABLE.match(condition.lstrip("-"))
+    if not match:
+        return condition
+    if condition.startswith("-"):
+        return "desc(?{})".format(match.group(1))
+    return "?" + match.group(1)
+
+
+class Query:
+    """A SELECT query split into its variables, graph patterns and solution modifiers.
+
+    Queries are immutable: the methods return new queries. Two queries with the same parts are equal and have the
+    same hash, so they can be used as keys of a cache, and `str(query)` is the SPARQL sent to the endpoint.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> eur = Eurlex()
+    >>> query = eur.make_query(resource_type="regulation", include_date=True, as_query=True)
+    >>> query.count()  # doctest: +ELLIPSIS
+    Query(...)
+    >>> [str(page) for page in query.pages(1000, rows=2500)]  # doctest: +ELLIPSIS
+    [...]
+    """
+
+    def __init__(
+        self,
+        variables,
+        patterns,
+        prefixes: str = PREFIXES,
+        distinct: bool = True,
+        order_by=(),
+        limit: int = None,
+        offset: int = None,
+    ):
+        """
+        Parameters
+        ----------
+        variables: iterable of str
+            The projected variables, f.e. "?work", or expressions such as "(count(*) as ?count)"
+        patterns: iterable of str
+            The graph patterns of the WHERE clause, f.e. triples, FILTERs and OPTIONALs, which are concatenated in order
+        prefixes: str
+            The PREFIX declarations
+            Default: the prefixes of the Cellar ontologies
+        distinct: bool
+            Whether to select distinct rows
+            Default: True
+        order_by: iterable of str
+            The ORDER BY conditions, f.e. "?date" or "desc(?date)"
+            Default: ()
+        limit: int
+            The maximum number of rows
+            Default: None
+        offset: int
+            The number of rows to skip
+            Default: None
+        """
+        self.variables = tuple(variables)
+        self.patterns = tuple(patterns)
+        self.prefixes = prefixes
+        self.distinct = distinct
+        self.order_by = tuple(order_by)
+        self.limit = limit
+        self.offset = offset
+
+    def _key(self):
+        return (
+            self.prefixes,
+            self.distinct,
+            self.variables,
+            self.patterns,
+            self.order_by,
+            self.limit,
+            self.offset,
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Query) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return "Query(variables={!r}, patterns={}, order_by={!r}, limit={!r}, offset={!r})".format(
+            self.variables, len(self.patterns), self.order_by, self.limit, self.offset
+        )
+
+    def __str__(self):
+        return self.to_sparql()
+
+    def to_sparql(self):
+        """Serializes the query to SPARQL on a single line."""
+        query = (
+            self.prefixes
+            + "\n  select "
+            + ("distinct " if self.distinct else "")
+            + " ".join(self.variables)
+            + " where{"
+            + "".join(self.patterns)
+            + "}"
+        )
+        if self.order_by:
+            query += " order by " + " ".join(self.order_by)
+        if self.limit is not None:
+            query += " limit " + str(self.limit)
+        if self.offset:
+            query += " offset " + str(self.offset)
+        return query.replace("\n", "")
+
+    @property
+    def fingerprint(self):
+        """A SHA-1 digest of the SPARQL, which stays the same between processes unlike `hash`."""
+        return hashlib.sha1(self.to_sparql().encode("utf-8")).hexdigest()
+
+    def replace(self, **changes):
+        """Returns a copy of the query with some of its parts replaced, f.e. `query.replace(limit=10)`."""
+        parts = {
+            "variables": self.variables,
+            "patterns": self.patterns,
+            "prefixes": self.prefixes,
+            "distinct": self.distinct,
+            "order_by": self.order_by,
+            "limit": self.limit,
+            "offset": self.offset,
+        }
+        parts.update(changes)
+        return Query(**parts)
+
+    def select(self, *variables):
+        """Returns a copy that also selects the given variables."""
+        return self.replace(
+            variables=self.variables
+            + tuple(v for v in variables if v not in self.variables)
+        )
+
+    def where(self, *patterns):
+        """Returns a copy with the given patterns appended to the WHERE clause."""
+        return self.replace(patterns=self.patterns + patterns)
+
+    def order(self, *conditions):
+        """Returns a copy ordered by the given conditions, see `order_condition`."""
+        return self.replace(order_by=tuple(order_condition(c) for c in conditions))
+
+    def diff(self, other):
+        """Compares the query with another one.
+        Returns
+        -------
+            A dict with the variables and patterns that are only in this query (`removed`) or only in `other`
+            (`added`), and the solution modifiers that differ as pairs of this and the other value. It is empty if
+            the queries are equal.
+        """
+        differences = {}
+        for part in ["variables", "patterns"]:
+            mine, theirs = getattr(self, part), getattr(other, part)
+            removed = [p for p in mine if p not in theirs]
+            added = [p for p in theirs if p not in mine]
+            if removed or added:
+                differences[part] = {"removed": removed, "added": added}
+        for part in ["prefixes", "distinct", "order_by", "limit", "offset"]:
+            if getattr(self, part) != getattr(other, part):
+                differences[part] = (getattr(self, part), getattr(other, part))
+        return differences
+
+    def count(self):
+        """Returns a query that counts the rows of this query, without its ORDER BY, LIMIT and OFFSET."""
+        inner = self.replace(prefixes="", order_by=(), limit=None, offset=None)
+        return Query(
+            ["(count(*) as ?count)"],
+            ["{ " + inner.to_sparql().strip() + " }"],
+            prefixes=self.prefixes,
+            distinct=False,
+        )
+
+    def page(self, number: int, page_size: int):
+        """Returns the page `number` (counted from 0) of `page_size` rows. Unordered queries are ordered by ?work, so
+        the pages do not overlap."""
+        return self.replace(
+            order_by=self.order_by or ("?work",),
+            limit=page_size,
+            offset=number * page_size,
+        )
+
+    def pages(self, page_size: int, rows: int):
+        """Yields the pages of `page_size` rows that cover `rows` rows, f.e. as counted with `count`."""
+        for number in range(-(-rows // page_size)):
+            yield self.page(number, page_size)
+
+    def between(self, date_from=None, date_to=None):
+        """Returns a copy restricted to works dated on or after `date_from` and before `date_to`."""
+        patterns = [" ?work cdm:work_date_document ?date."]
+        if date_from is not None:
+            patterns.append(
+                ' FILTER(?date >= "'
+                + str(pd.Timestamp(date_from).date())
+                + '"^^xsd:date)'
+            )
+        if date_to is not None:
+            patterns.append(
+                ' FILTER(?date < "' + str(pd.Timestamp(date_to).date()) + '"^^xsd:date)'
+            )
+        return self.where(*patterns)
+
+    def shards(self, date_from, date_to, freq: str = "YS"):
+        """Yields the query restricted to consecutive date windows between `date_from` and `date_to`, f.e. one per
+        year with the default pandas frequency "YS", like `Eurlex.query_eurlex_partitioned`.
+        """
+        start, end = pd.Timestamp(date_from), pd.Timestamp(date_to)
+        bounds = [start] + [
+            b for b in pd.date_range(start, end, freq=freq) if start < b < end
+        ]
+        for window_start, window_end in zip(bounds, bounds[1:] + [end]):
+            yield self.between(window_start, window_end)
+
+
+class QueryBuilder:
+    """Builds the queries of `Eurlex.make_query` by naming the fields to select instead of setting a flag per field.
+
+    Every method returns a new builder, so a builder can be reused as the base of several queries.
+
+    Examples
+    --------
+    >>> from eurlex import Eurlex
+    >>> eur = Eurlex()
+    >>> base = eur.query("regulation").select("celex", "date", "eurovoc")
+    >>> query = base.between("2020-01-01", "2021-01-01").order_by("date").limit(100).build()
+    >>> str(base.build()) == eur.make_query(resource_type="regulation", include_date=True, include_eurovoc=True)
+    True
+    """
+
+    def __init__(self, eur, resource_type: str, **options):
+        """
+        Parameters
+        ----------
+        eur: Eurlex
+            The instance whose `make_query` builds the query
+        resource_type: str
+            See `Eurlex.make_query`
+        Further keyword arguments are passed to `Eurlex.make_query`.
+        """
+        self.eur = eur
+        self.options = dict(options, resource_type=resource_type)
+        # solution modifiers that are applied to the built query
+        self.modifiers = {}
+
+    def _copy(self, **options):
+        builder = QueryBuilder(self.eur, **dict(self.options, **options))
+        builder.modifiers = dict(self.modifiers)
+        return builder
+
+    def select(self, *fields):
+        """Selects the given fields (see `FIELDS`) besides ?work and ?type, and no others."""
+        unknown = [f for f in fields if f not in FIELDS]
+        assert not unknown, f"{unknown} are invalid - valid fields are {FIELDS}"
+        return self._copy(**{"include_" + f: f in fields for f in FIELDS})
+
+    def manual_type(self, manual_type: str):
+        """Filters on a type of the resource type authority table, for the resource type "manual"."""
+        return self._copy(manual_type=manual_type)
+
+    def directory(self, directory: str):
+        """Filters on a directory code and its subdivisions."""
+        return self._copy(directory=directory)
+
+    def sector(self, sector: int):
+        """Filters on a sector."""
+        return self._copy(sector=sector)
+
+    def language(self, language, title_language=None):
+        """Sets the language(s) of the labels and titles, see `Eurlex.make_query`."""
+        return self._copy(language=language, title_language=title_language)
+
+    def corrigenda(self, include: bool = True):
+        """Whether to include corrigenda."""
+        return self._copy(include_corrigenda=include)
+
+    def between(self, date_from=None, date_to=None):
+        """Only includes documents dated on or after `date_from` and before `date_to`."""
+        return self._copy(date_from=date_from, date_to=date_to)
+
+    def order_by(self, *conditions):
+        """Orders the results, f.e. by "date" or "-date" for descending dates, see `order_condition`."""
+        builder = self._copy()
+        builder.modifiers["order_by"] = conditions
+        return builder
+
+    def limit(self, limit: int):
+        """Limits the number of results."""
+        builder = self._copy()
+        builder.modifiers["limit"] = limit
+        return builder
+
+    def build(self):
+        """Returns the `Query`."""
+        query = self.eur.make_query(**self.options, as_query=True)
+        if "order_by" in self.modifiers:
+            query = query.order(*self.modifiers["order_by"])
+        if "limit" in self.modifiers:
+            query = query.replace(limit=self.modifiers["limit"])
+        return query
+
+    def __str__(self):
+        return str(self.build())
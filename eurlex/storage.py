@@ -0,0 +1,88 @@
+"""
+* Helpers to store notices and texts compressed on disk and to read them back transparently.
+"""
+
+import gzip
+from typing import Literal
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+compression_types = Literal[None, "gzip", "zstd"]  # pylint: disable=invalid-name
+
+# File name suffixes for the supported compression formats
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compress(data: bytes, compression: compression_types = None, level: int = None):
+    """Compresses data with the given compression format.
+    Parameters
+    ----------
+    data: bytes
+        The data to compress
+    compression: str
+        One of None, "gzip" or "zstd". None returns the data unchanged.
+    level: int
+        The compression level, defaults to the default of the format
+    Returns
+    -------
+        bytes: The compressed data
+    """
+    if compression is None:
+        return data
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=9 if level is None else level)
+    if compression == "zstd":
+        assert (
+            zstandard is not None
+        ), "zstd compression requires the zstandard package to be installed"
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(
+            data
+        )
+    raise ValueError("Compression must be one of None, {}".format(", ".join(SUFFIXES)))
+
+
+def decompress(data: bytes):
+    """Decompresses gzip or zstd data, detected by its magic number. Other data is returned unchanged.
+    Parameters
+    ----------
+    data: bytes
+        The possibly compressed data
+    Returns
+    -------
+        bytes: The decompressed data
+    """
+    if data[:2] == _GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == _ZSTD_MAGIC:
+        assert (
+            zstandard is not None
+        ), "zstd decompression requires the zstandard package to be installed"
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def compressed_filename(filename: str, compression: compression_types = None):
+    """Appends the suffix of the compression format to a file name, if it does not have it already."""
+    if compression is None or filename.endswith(SUFFIXES[compression]):
+        return filename
+    return filename + SUFFIXES[compression]
+
+
+def read_file(filename: str):
+    """Reads a file written by `Eurlex.download_xml` or any other file, decompressing it if necessary.
+    Parameters
+    ----------
+    filename: str
+        The path of the file
+    Returns
+    -------
+        bytes: The decompressed content of the file
+    """
+    with open(filename, "rb") as reader:
+        return decompress(reader.read())
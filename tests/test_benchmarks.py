@@ -0,0 +1,226 @@
+"""Benchmarks for query building, parsing and bulk fetch throughput.
+
+These are deselected by default and run with `pytest -m benchmark` (or `tox -e benchmark`). Every run appends its
+timings to .benchmarks/results.jsonl (or EURLEX_BENCHMARK_RESULTS) and compares them with the previous run of the same benchmark. Benchmarks that
+got slower by more than EURLEX_BENCHMARK_TOLERANCE (default 0.25, i.e. 25%) are reported, and fail the run if
+EURLEX_BENCHMARK_STRICT is set.
+"""
+
+import json
+import os
+import shutil
+import statistics
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import get_args
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+import requests
+
+from eurlex import __version__
+from eurlex.eurlex import Eurlex
+from eurlex.mirror import MirrorServer
+
+pytestmark = pytest.mark.benchmark
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+RESULTS = os.environ.get(
+    "EURLEX_BENCHMARK_RESULTS", os.path.join(".benchmarks", "results.jsonl")
+)
+TOLERANCE = float(os.environ.get("EURLEX_BENCHMARK_TOLERANCE", "0.25"))
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as reader:
+        return reader.read()
+
+
+def _response(content, content_type, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers["Content-Type"] = content_type
+    response._content = content
+    return response
+
+
+def _previous_results():
+    previous = {}
+    if os.path.isfile(RESULTS):
+        with open(RESULTS, encoding="utf-8") as reader:
+            for line in reader:
+                result = json.loads(line)
+                previous[result["name"]] = result
+    return previous
+
+
+@pytest.fixture(scope="module")
+def bench():
+    """Times a function over several rounds and records the result."""
+    previous = _previous_results()
+    results = []
+    regressions = []
+
+    def run(name, function, rounds=5, items=1):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        result = {
+            "name": name,
+            "version": __version__,
+            "timestamp": time.time(),
+            "rounds": rounds,
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "items_per_second": items / statistics.median(timings),
+        }
+        results.append(result)
+        baseline = previous.get(name)
+        if baseline and result["median"] > baseline["median"] * (1 + TOLERANCE):
+            regressions.append(
+                "{}: {:.4f}s, was {:.4f}s in {}".format(
+                    name, result["median"], baseline["median"], baseline["version"]
+                )
+            )
+        return result
+
+    yield run
+    os.makedirs(os.path.dirname(RESULTS) or ".", exist_ok=True)
+    with open(RESULTS, "a", encoding="utf-8") as writer:
+        for result in results:
+            writer.write(json.dumps(result) + "\n")
+    if regressions:
+        message = "Benchmark regressions:\n" + "\n".join(regressions)
+        if os.environ.get("EURLEX_BENCHMARK_STRICT"):
+            pytest.fail(message)
+        warnings.warn(message)
+
+
+@pytest.fixture
+def eur():
+    return Eurlex()
+
+
+@pytest.mark.parametrize("resource_type", get_args(Eurlex._RESOURCE_TYPES))
+def test_bench_make_query(bench, eur, resource_type):
+    def build():
+        for _ in range(100):
+            eur.make_query(
+                resource_type=resource_type,
+                manual_type="JUDG" if resource_type == "manual" else "",
+                include_date=True,
+                include_eurovoc=True,
+                include_author=True,
+                include_citations=True,
+                include_directory=True,
+            )
+
+    bench("make_query[{}]".format(resource_type), build, items=100)
+
+
+def test_bench_read_data_html(bench, eur):
+    response = _response(_fixture("document.html"), "text/html; charset=UTF-8")
+    bench("read_data[html]", lambda: eur.read_data(response))
+
+
+def test_bench_read_data_pdf(bench, eur):
+    response = _response(_fixture("document.pdf"), "application/pdf")
+    bench("read_data[pdf]", lambda: eur.read_data(response))
+
+
+def test_bench_notice_title(bench, eur):
+    response = _response(_fixture("notice_object.xml"), "application/xml")
+    with patch("eurlex.eurlex.requests.get", return_value=response):
+        bench(
+            "get_data[title]",
+            lambda: eur.get_data("61962CJ0026", "title", extract_caselaw_metadata=True),
+        )
+
+
+def test_bench_notice_ids(bench, eur):
+    response = _response(_fixture("notice_identifiers.xml"), "application/xml")
+    with patch("eurlex.eurlex.requests.get", return_value=response):
+        bench("get_data[ids]", lambda: eur.get_data("61962CJ0026", "ids"))
+
+
+def test_bench_split_caselaw_titles(bench, eur):
+    titles = pd.Series(
+        [
+            "Judgment of the Court of {} June 2020.#Party {} v Commission.#Case C-{}/19.".format(
+                i % 28 + 1, i, i
+            )
+            for i in range(100000)
+        ]
+    )
+    bench(
+        "split_caselaw_titles",
+        lambda: eur.split_caselaw_titles(titles),
+        rounds=3,
+        items=len(titles),
+    )
+
+
+def test_bench_curia_scraper(bench, eur):
+    list_page = _response(_fixture("curia_list.htm"), "text/html")
+    document = _response(_fixture("curia_document.htm"), "text/html")
+
+    def get(url, *args, **kwargs):
+        return list_page if url.endswith("_juris.htm") else document
+
+    with patch("eurlex.eurlex.requests.get", side_effect=get):
+        bench(
+            "curia_scraper",
+            lambda: eur.curia_scraper(
+                [eur.curia_url + "en/content/juris/c2_juris.htm"], 50
+            ),
+            rounds=3,
+            items=50,
+        )
+
+
+def test_bench_curia_parse(bench, eur):
+    list_page = _fixture("curia_list.htm").decode("utf-8")
+    document = _fixture("curia_document.htm").decode("utf-8")
+    bench(
+        "curia_parse_list",
+        lambda: eur._parse_curia_list(list_page, 1000),
+        rounds=5,
+        items=200,
+    )
+    bench(
+        "curia_parse_document",
+        lambda: [eur._curia_text(document) for _ in range(50)],
+        rounds=5,
+        items=50,
+    )
+
+
+@pytest.fixture(scope="module")
+def mirror(tmp_path_factory):
+    root = tmp_path_factory.mktemp("mirror")
+    for i in range(50):
+        resource = root / "resource" / "3201{}R{:04d}".format(i % 10, i)
+        resource.mkdir(parents=True)
+        extension = "pdf" if i % 5 == 0 else "html"
+        shutil.copy(
+            os.path.join(FIXTURES, "document." + extension),
+            resource / ("text." + extension),
+        )
+    with MirrorServer(str(root), latency=0.005) as server:
+        yield server
+
+
+def test_bench_bulk_fetch(bench, mirror):
+    eur = Eurlex(resource_url=mirror.resource_url)
+    celex = ["3201{}R{:04d}".format(i % 10, i) for i in range(50)]
+
+    def fetch():
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            texts = list(executor.map(lambda c: eur.get_data(c, "text"), celex))
+        assert all(len(t) > 1000 for t in texts)
+
+    bench("bulk_fetch[text]", fetch, rounds=3, items=len(celex))
@@ -0,0 +1,138 @@
+"""Unit tests for the memory-mapped corpus store."""
+
+import multiprocessing
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from eurlex.corpus import INDEX_FILE, CorpusStore
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    with CorpusStore(str(tmp_path / "corpus")) as store:
+        yield store
+
+
+def test_add_and_get(corpus):
+    corpus.add("32016R0679", "General Data Protection Regulation")
+    corpus.update({"32014R0001": "Règlement", "32000R0000": ""})
+    assert len(corpus) == 3
+    assert "32014R0001" in corpus
+    assert corpus["32016R0679"] == "General Data Protection Regulation"
+    assert corpus["32014R0001"] == "Règlement"
+    assert corpus["32000R0000"] == ""
+    assert corpus.get("missing") is None
+    assert dict(corpus.items())["32014R0001"] == "Règlement"
+
+
+def test_get_bytes_is_a_view(corpus):
+    corpus.add("A", "first")
+    corpus.add("B", "second")
+    view = corpus.get_bytes("B")
+    assert isinstance(view, memoryview)
+    assert view.tobytes() == b"second"
+    # appending after a view was taken maps the grown file again
+    corpus.add("C", "third")
+    assert corpus["C"] == "third"
+    assert view.tobytes() == b"second"
+    view.release()
+
+
+def test_append_replaces(corpus):
+    corpus.add("A", "old")
+    corpus.add("A", "new")
+    assert len(corpus) == 1
+    assert corpus["A"] == "new"
+
+
+def test_reopen_and_refresh(tmp_path):
+    path = str(tmp_path / "corpus")
+    with CorpusStore(path) as writer:
+        writer.add("A", "text of A")
+        with CorpusStore(path) as reader:
+            assert reader["A"] == "text of A"
+            writer.add("B", "text of B")
+            assert "B" not in reader
+            reader.refresh()
+            assert reader["B"] == "text of B"
+
+
+def test_refresh_sees_entries_appended_while_reading(tmp_path):
+    path = str(tmp_path / "corpus")
+    getsize = os.path.getsize
+    with CorpusStore(path) as writer, CorpusStore(path) as reader:
+
+        pending = [("A", "text of A")]
+
+        def append_after_reading_size(filename):
+            size = getsize(filename)
+            if pending:
+                # the writer reads the size as well while adding
+                writer.add(*pending.pop())
+            return size
+
+        with patch(
+            "eurlex.corpus.os.path.getsize", side_effect=append_after_reading_size
+        ):
+            reader.refresh()
+        reader.refresh()
+        assert reader["A"] == "text of A"
+
+
+def test_incomplete_index_entry_is_ignored(tmp_path):
+    path = str(tmp_path / "corpus")
+    with CorpusStore(path) as store:
+        store.add("A", "text of A")
+    with open(os.path.join(path, INDEX_FILE), "ab") as writer:
+        writer.write(b'["B", 9, 100')
+    with CorpusStore(path) as store:
+        assert list(store) == ["A"]
+        # the next entry is not appended to the unfinished one
+        store.add("C", "text of C")
+    with CorpusStore(path) as store:
+        assert list(store) == ["A", "C"]
+        assert store["C"] == "text of C"
+
+
+def test_fetch_skips_stored_and_failed(corpus):
+    corpus.add("A", "stored")
+    eur = MagicMock()
+    eur.get_data.side_effect = lambda celex, **kwargs: {
+        "B": "text of B",
+        "C": "NaN406",
+        "D": 1,
+    }[celex]
+    assert corpus.fetch(eur, ["A", "B", "C", "D", "B"]) == 1
+    assert corpus["B"] == "text of B"
+    assert "C" not in corpus and "D" not in corpus
+    assert sorted(c.args[0] for c in eur.get_data.call_args_list) == ["B", "C", "D"]
+
+
+def _add_documents(path, prefix, count):
+    with CorpusStore(path) as store:
+        for number in range(count):
+            store.add(
+                "{}{}".format(prefix, number), "{} text {}".format(prefix, number)
+            )
+
+
+@pytest.mark.skipif(os.name != "posix", reason="stores are locked with fcntl")
+def test_concurrent_writing_processes(tmp_path):
+    path = str(tmp_path / "corpus")
+    context = multiprocessing.get_context("fork")
+    writers = [
+        context.Process(target=_add_documents, args=(path, prefix, 200))
+        for prefix in "AB"
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(30)
+    assert [writer.exitcode for writer in writers] == [0, 0]
+    with CorpusStore(path) as store:
+        assert len(store) == 400
+        assert all(
+            store[celex] == "{} text {}".format(celex[0], celex[1:]) for celex in store
+        )
@@ -0,0 +1,98 @@
+"""Unit tests for the endpoint pool, against local stand-in SPARQL servers."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from eurlex.endpoints import EndpointPool
+from eurlex.eurlex import Eurlex
+
+QUERY = "PREFIX cdm: <http://publications.europa.eu/ontology/cdm#> select ?work where { ?work ?p ?o } limit 1"
+
+
+def _serve(status=200, delay=0.0, name="local"):
+    """Starts a SPARQL stand-in that answers every query with a one-row CSV result."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = "work\r\nhttp://{}/work\r\n".format(name).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/csv; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/sparql".format(server.server_port)
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server, url = _serve(**kwargs)
+        started.append(server)
+        return url
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pool_fails_over(servers):
+    broken = servers(status=500, name="broken")
+    public = servers(name="public")
+    pool = EndpointPool([broken, public])
+    eur = Eurlex(endpoint=pool)
+    result = eur.query_eurlex(QUERY)
+    assert result["work"].tolist() == ["http://public/work"]
+    stats = pool.stats().set_index("endpoint")
+    assert stats.loc[broken, "errors"] == 1
+    assert not stats.loc[broken, "healthy"]
+    # the failing endpoint is only tried again after its cooldown
+    assert pool.ranked() == [public, broken]
+
+
+def test_pool_routes_to_lowest_latency(servers):
+    slow = servers(delay=0.2, name="slow")
+    fast = servers(name="fast")
+    pool = EndpointPool([slow, fast])
+    eur = Eurlex(endpoint=pool)
+    eur.query_eurlex(QUERY)
+    pool.record(fast, 0.01)
+    assert pool.ranked() == [fast, slow]
+    assert eur.query_eurlex(QUERY)["work"].tolist() == ["http://fast/work"]
+    stats = pool.stats().set_index("endpoint")
+    assert stats.loc[slow, "le_0.25"] == 1
+    assert stats.loc[fast, "le_0.1"] == 2
+
+
+def test_pool_fails_over_stalled_endpoint(servers):
+    stalled = servers(delay=3, name="stalled")
+    public = servers(name="public")
+    pool = EndpointPool([stalled, public], timeout=0.3)
+    eur = Eurlex(endpoint=pool)
+    start = time.monotonic()
+    assert eur.query_eurlex(QUERY)["work"].tolist() == ["http://public/work"]
+    assert time.monotonic() - start < 2
+    stats = pool.stats().set_index("endpoint")
+    assert stats.loc[stalled, "timeouts"] == 1
+    assert stats.loc[stalled, "errors"] == 1
+    assert not stats.loc[stalled, "healthy"]
+    assert pool.ranked() == [public, stalled]
+
+
+def test_pool_all_failing_returns_empty(servers):
+    pool = EndpointPool([servers(status=500)], cooldown=0)
+    assert Eurlex(endpoint=pool).query_eurlex(QUERY).empty
+    with pytest.raises(Exception):
+        pool.query(QUERY, lambda endpoint, query, timeout: 1 / 0)
@@ -1,11 +1,18 @@
 """Unit tests with mocked HTTP responses for eurlex functionality."""
 
+import logging
+import re
+import threading
+import time
 from unittest.mock import MagicMock, mock_open, patch
+from urllib.parse import quote
 
 import pandas as pd
 import pytest
 
-from eurlex.eurlex import Eurlex
+from eurlex.eurlex import Eurlex, main
+from eurlex.memo import Memo
+from eurlex.storage import read_file
 
 
 @pytest.fixture
@@ -150,6 +157,455 @@ def test_query_eurlex_error_returns_empty(mock_get, eur, caselaw_query):
     assert len(result) == 0
 
 
+def test_count_query(eur):
+    query = eur.make_query(resource_type="regulation", order=True, limit=10)
+    count = eur.count_query(query)
+    assert count.startswith("PREFIX cdm:")
+    assert "select (count(*) as ?count) where { select distinct ?work" in count
+    assert "limit" not in count and "order by" not in count
+    assert count.endswith("} }")
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_explain(mock_get, eur):
+    mock_get.return_value = pd.DataFrame({"count": [2500000]})
+    query = eur.make_query(
+        resource_type="any",
+        include_citations=True,
+        include_eurovoc=True,
+        include_author=True,
+        include_lbs=True,
+        include_date=True,
+        directory="04",
+    )
+    plan = eur.explain(query)
+    assert "count(*)" in mock_get.call_args.args[1]
+    assert plan["rows"] == 2500000
+    assert plan["optionals"] == 7 and plan["unions"] == 1
+    assert plan["property_paths"] == 1
+    assert not plan["limit"]
+    assert len(plan["warnings"]) == 3
+    plan = eur.explain(eur.make_query(limit=5), count=False)
+    assert plan["rows"] is None and plan["warnings"] == []
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_explain_caps_rows_by_limit(mock_get, eur):
+    mock_get.return_value = pd.DataFrame({"count": [2000000]})
+    plan = eur.explain(eur.make_query(resource_type="caselaw", limit=10))
+    assert plan["rows"] == 10 and plan["total_rows"] == 2000000
+    plan = eur.explain(eur.make_query(resource_type="caselaw") + " offset 1999995")
+    assert plan["rows"] == 5
+    # a limited query under max_rows is not refused
+    mock_get.side_effect = lambda endpoint, query: (
+        pd.DataFrame({"count": [2000000]})
+        if "count(*)" in query
+        else pd.DataFrame({"work": range(10)})
+    )
+    result = eur.query_eurlex(
+        eur.make_query(resource_type="caselaw", limit=10), max_rows=1000
+    )
+    assert len(result) == 10
+
+
+def _keyset_endpoint(rows):
+    """Answers count queries and keyset pages over the rows like the endpoint."""
+    rows = pd.DataFrame(rows)
+
+    def run(endpoint, query):
+        if "count(*)" in query:
+            return pd.DataFrame({"count": [len(rows)]})
+        selected = rows
+        if "?date" in query.split("where")[0] or "bound(?date)" in query:
+            selected = selected[selected["date"].notna()]
+        seek = re.search(r'FILTER\(str\(\?work\) > "([^"]*)"\)', query)
+        if seek:
+            selected = selected[selected["work"] > seek.group(1)]
+        seek = re.search(
+            r'FILTER\(\?date > "([^"]*)"\^\^xsd:date \|\| \(\?date = "[^"]*"\^\^xsd:date && str\(\?work\) > "([^"]*)"\)\)',
+            query,
+        )
+        if seek:
+            date, work = seek.groups()
+            selected = selected[
+                (selected["date"] > date)
+                | ((selected["date"] == date) & (selected["work"] > work))
+            ]
+        limit = re.search(r"limit (\d+)$", query)
+        if limit:
+            order = (
+                ["date", "work"] if "order by ?date str(?work)" in query else ["work"]
+            )
+            assert (
+                "order by "
+                + " ".join("?date" if o == "date" else "str(?work)" for o in order)
+                in query
+            )
+            selected = selected.sort_values(order, kind="stable")
+            selected = selected.iloc[: int(limit.group(1))]
+        return selected.reset_index(drop=True)
+
+    return run
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_max_rows(mock_get, eur):
+    mock_get.side_effect = _keyset_endpoint(
+        {"work": ["w{:02d}".format(i) for i in range(25)]}
+    )
+    query = eur.make_query(resource_type="regulation")
+    with pytest.raises(ValueError, match="25 rows"):
+        eur.query_eurlex(query, max_rows=20)
+    result = eur.query_eurlex(query, max_rows=20, paginate=True, page_size=10)
+    assert list(result["work"]) == ["w{:02d}".format(i) for i in range(25)]
+    # queries under the limit run as they are
+    assert len(eur.query_eurlex(query, max_rows=30)) == 25
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_paginate_keeps_limit_and_offset(mock_get, eur):
+    works = ["w{:02d}".format(i) for i in range(25)]
+
+    def run(endpoint, query):
+        if "count(*)" in query:
+            return pd.DataFrame({"count": [len(works)]})
+        assert "order by ?date" in query
+        limit = int(re.search(r"limit (\d+)", query).group(1))
+        offset = int(re.search(r"offset (\d+)", query).group(1))
+        return pd.DataFrame({"work": works[offset : offset + limit]})
+
+    mock_get.side_effect = run
+    query = eur.query("regulation").select("date").order_by("date").limit(12).build()
+    result = eur.query_eurlex(query, max_rows=5, paginate=True, page_size=5)
+    assert list(result["work"]) == works[:12]
+    pages = [c.args[1] for c in mock_get.call_args_list if "count(*)" not in c.args[1]]
+    assert [re.search(r"limit \d+ offset \d+$", p).group(0) for p in pages] == [
+        "limit 5 offset 0",
+        "limit 5 offset 5",
+        "limit 2 offset 10",
+    ]
+    result = eur.query_eurlex(
+        str(query) + " offset 20", max_rows=1, paginate=True, page_size=3
+    )
+    assert list(result["work"]) == works[20:]
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_keyset_keeps_works_together(mock_get, eur):
+    # w03 has more rows than fit in a page, w01 and w05 are split across pages
+    works = ["w00", "w01", "w01", "w02"] + ["w03"] * 5 + ["w04", "w05", "w05", "w06"]
+    mock_get.side_effect = _keyset_endpoint(
+        {"work": works, "eurovoc": range(len(works))}
+    )
+    query = eur.make_query(resource_type="regulation", include_eurovoc=True)
+    pages = list(eur.query_eurlex_keyset(query, page_size=3))
+    result = pd.concat(pages, ignore_index=True)
+    assert list(result["work"]) == works
+    assert sorted(result["eurovoc"]) == list(range(len(works)))
+    assert [len(p) for p in pages] == [1, 2, 1, 5, 1, 2, 1]
+    # deep pages seek past the last work instead of skipping rows
+    queries = [c.args[1] for c in mock_get.call_args_list]
+    assert all("offset" not in q for q in queries)
+    assert 'FILTER(str(?work) > "w05")' in queries[-1]
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_keyset_stops_at_limit(mock_get, eur):
+    works = ["w{:02d}".format(i) for i in range(25)]
+    mock_get.side_effect = _keyset_endpoint({"work": works})
+    query = eur.query("regulation").limit(7).build()
+    pages = list(eur.query_eurlex_keyset(query, page_size=3))
+    assert list(pd.concat(pages)["work"]) == works[:7]
+    assert mock_get.call_count == 4
+    # paginating a limited query keeps the limit
+    result = eur.query_eurlex(query, max_rows=5, paginate=True, page_size=3)
+    assert list(result["work"]) == works[:7]
+    with pytest.raises(AssertionError, match="OFFSET"):
+        next(eur.query_eurlex_keyset(str(query) + " offset 5"))
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_keyset_by_date(mock_get, eur):
+    mock_get.side_effect = _keyset_endpoint(
+        {
+            "work": ["a", "b", "c", "d", "e"],
+            "date": ["2021-01-01", "2020-01-01", "2020-01-01", None, "2019-05-05"],
+        }
+    )
+    query = eur.make_query(resource_type="regulation", include_date=True)
+    pages = list(eur.query_eurlex_keyset(query, keys=("date", "work"), page_size=2))
+    result = pd.concat(pages, ignore_index=True)
+    # works without a date are left out
+    assert list(result["work"]) == ["e", "b", "c", "a"]
+    with pytest.raises(AssertionError):
+        next(eur.query_eurlex_keyset(query, keys="date"))
+
+
+def test_make_query_order(eur):
+    query = eur.make_query(
+        resource_type="regulation", include_date=True, order=["-date", "celex"]
+    )
+    assert query.endswith("} order by desc(?date) ?celex")
+    assert eur.make_query(resource_type="regulation", order="?work").endswith(
+        "order by ?work"
+    )
+    assert eur.make_query(resource_type="regulation", order=True).endswith(
+        "order by ?date"
+    )
+    with pytest.raises(AssertionError, match="not selected"):
+        eur.make_query(resource_type="regulation", order="eurovoc")
+
+
+def _window(query):
+    return re.findall(r'"(\d{4}-\d{2}-\d{2})"', query)
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_partitioned_merges_shards(mock_get, eur):
+    def shard(endpoint, query):
+        start, end = _window(query)
+        return pd.DataFrame({"work": ["shared", start], "type": ["REG", "REG"]})
+
+    mock_get.side_effect = shard
+    result = eur.query_eurlex_partitioned(
+        "2020-01-01", "2023-01-01", resource_type="regulation", include_date=True
+    )
+    assert mock_get.call_count == 3
+    assert sorted(result["work"]) == sorted(
+        ["shared", "2020-01-01", "2021-01-01", "2022-01-01"]
+    )
+    assert result.attrs["failed_shards"] == []
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_partitioned_includes_undated(mock_get, eur):
+    def shard(endpoint, query):
+        if "FILTER NOT EXISTS {?work cdm:work_date_document" in query:
+            assert not _window(query)
+            if "resource-type/DIR>" in query:
+                raise Exception("timeout")
+            return pd.DataFrame({"work": ["undated"]})
+        return pd.DataFrame({"work": [_window(query)[0]]})
+
+    mock_get.side_effect = shard
+    result = eur.query_eurlex_partitioned(
+        "2020-01-01", "2022-01-01", manual_types=["REG", "DIR"]
+    )
+    assert "undated" not in set(result["work"])
+    result = eur.query_eurlex_partitioned(
+        "2020-01-01",
+        "2022-01-01",
+        manual_types=["REG", "DIR"],
+        include_undated=True,
+    )
+    # four date shards and one undated shard per resource type
+    assert mock_get.call_count == 4 + 6
+    assert sorted(result["work"]) == ["2020-01-01", "2021-01-01", "undated"]
+    assert result.attrs["failed_shards"] == [(None, None, "DIR")]
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_partitioned_bisects_timeouts(mock_get, eur):
+    def shard(endpoint, query):
+        start, end = _window(query)
+        if pd.Timestamp(end) - pd.Timestamp(start) > pd.Timedelta(days=100):
+            raise Exception("Virtuoso 42000 Error SR171: Transaction timed out")
+        return pd.DataFrame({"work": [start]})
+
+    mock_get.side_effect = shard
+    result = eur.query_eurlex_partitioned(
+        "2020-01-01", "2021-01-01", resource_type="regulation"
+    )
+    # one year is split into quarters
+    assert len(result) == 4
+    assert result.attrs["failed_shards"] == []
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_partitioned_reports_failed_shards(mock_get, eur):
+    mock_get.side_effect = Exception("timeout")
+    result = eur.query_eurlex_partitioned(
+        "2020-01-01",
+        "2020-01-03",
+        manual_types=["REG", "DIR"],
+        min_days=1,
+    )
+    assert result.empty
+    assert ("2020-01-01", "2020-01-02", "REG") in result.attrs["failed_shards"]
+    assert len(result.attrs["failed_shards"]) == 4
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_query_eurlex_partitioned_stops_at_single_days(mock_get, eur):
+    mock_get.side_effect = Exception("timeout")
+    with pytest.raises(AssertionError, match="min_days"):
+        eur.query_eurlex_partitioned("2020-01-01", "2020-01-02", min_days=0)
+    result = eur.query_eurlex_partitioned("2020-01-01", "2020-01-02")
+    assert mock_get.call_count == 1
+    assert result.attrs["failed_shards"] == [("2020-01-01", "2020-01-02", "")]
+    # a window that cannot be split into whole days is not split again
+    frames, failed = eur._query_shard(
+        (pd.Timestamp("2020-01-01"), pd.Timestamp("2020-01-02 12:00")),
+        "",
+        0,
+        None,
+        {"resource_type": "regulation"},
+    )
+    assert frames == [] and len(failed) == 1
+    assert mock_get.call_count == 2
+
+
+def _values(query):
+    return re.findall(r'"([^"]+)"\^\^xsd:string', query)
+
+
+def test_make_query_include_title(eur):
+    query = eur.make_query(resource_type="regulation", include_title=True)
+    assert "?title" in query.split("where")[0]
+    assert "language/ENG>" in query
+    assert "language/DEU>" in eur.make_query(
+        resource_type="regulation", include_title=True, title_language="de"
+    )
+    with pytest.raises(AssertionError):
+        eur.make_query(include_title=True, title_language="english")
+
+
+def test_make_query_language(eur):
+    query = eur.make_query(
+        resource_type="caselaw",
+        include_author=True,
+        include_court_procedure=True,
+        include_court_formation=True,
+        include_title=True,
+        language="de",
+    )
+    assert "='en'" not in query
+    assert "FILTER(lang(?author)='de')" in query
+    assert "FILTER(lang(?cf)='de')" in query
+    assert "language/DEU>" in query
+
+
+def test_make_query_languages_pivoted(eur):
+    query = eur.make_query(
+        resource_type="caselaw",
+        include_author=True,
+        include_title=True,
+        language=["en", "fr"],
+        title_language=["en", "fr", "DEU"],
+    )
+    select = query.split("where")[0]
+    assert select.endswith("?author_en ?author_fr ?title_en ?title_fr ?title_deu ")
+    # one OPTIONAL per language on the same author, so rows do not multiply
+    assert query.count("?work cdm:work_created_by_agent ?authorx.") == 1
+    assert (
+        "OPTIONAL{?authorx skos:prefLabel ?author_fr. FILTER(lang(?author_fr)='fr')}"
+        in query
+    )
+    assert (
+        "?expression_deu cdm:expression_uses_language <http://publications.europa.eu/resource/authority/language/DEU>"
+        in query
+    )
+    with pytest.raises(AssertionError):
+        eur.make_query(include_author=True, language=["en", "French"])
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_get_titles_batches(mock_get, eur):
+    def batch(endpoint, query):
+        assert "language/FRA>" in query
+        celex = [c for c in _values(query) if c != "missing"]
+        return pd.DataFrame({"celex": celex, "title": ["Titre " + c for c in celex]})
+
+    mock_get.side_effect = batch
+    titles = eur.get_titles(
+        ["A", "B", "C", "missing", "D", "A", None], language="fr", batch_size=2
+    )
+    assert mock_get.call_count == 3
+    assert list(titles["celex"]) == ["A", "B", "C", "missing", "D"]
+    assert titles.loc[2, "title"] == "Titre C"
+    assert pd.isna(titles.loc[3, "title"])
+    assert titles.attrs["failed_batches"] == []
+
+
+def test_batches_stay_under_url_limit(eur):
+    terms = [eur._literal("3{:04d}R{:04d}".format(i, i)) for i in range(1000)]
+    batches = list(eur._batches(terms, 1000))
+    assert sum(len(b) for b in batches) == 1000
+    assert len(batches) > 1
+    assert all(len(quote(" ".join(b))) <= eur._MAX_VALUES_LENGTH for b in batches)
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_get_titles_reports_failed_batches(mock_get, eur):
+    def batch(endpoint, query):
+        if "B" in _values(query):
+            raise Exception("timeout")
+        return pd.DataFrame({"celex": _values(query), "title": "title"})
+
+    mock_get.side_effect = batch
+    titles = eur.get_titles(["A", "B", "C"], batch_size=1)
+    assert titles["title"].notna().tolist() == [True, False, True]
+    assert len(titles.attrs["failed_batches"]) == 1
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_resolve_ids_batches_and_memo(mock_get, eur):
+    def batch(endpoint, query):
+        ids = [i for i in _values(query) if i != "missing"]
+        by_ecli = "cdm:case-law_ecli ?id" in query
+        return pd.DataFrame(
+            {
+                "id": ids,
+                "work": [
+                    "http://publications.europa.eu/resource/cellar/" + i for i in ids
+                ],
+                "celex": ["62012CJ0131" if by_ecli else i for i in ids],
+                "ecli": [i if by_ecli else None for i in ids],
+                "date": "2014-05-13",
+                "type": "JUDG",
+            }
+        )
+
+    mock_get.side_effect = batch
+    ids = ["62012CJ0131", "ECLI:EU:C:2014:317", "32016R0679", "missing", "62012CJ0131"]
+    result = eur.resolve_ids(ids, batch_size=2)
+    # two batches of CELEX numbers and one of ECLIs
+    assert mock_get.call_count == 3
+    assert list(result.columns) == ["id", "work", "celex", "ecli", "date", "type"]
+    assert list(result["id"]) == [
+        "62012CJ0131",
+        "ECLI:EU:C:2014:317",
+        "32016R0679",
+        "missing",
+    ]
+    assert result.loc[1, "celex"] == "62012CJ0131"
+    assert result.loc[3, ["work", "celex"]].isna().all()
+    # resolved identifiers are remembered, only the missing one is queried again
+    result = eur.resolve_ids(["32016R0679", "missing"])
+    assert mock_get.call_count == 4
+    assert result.loc[0, "celex"] == "32016R0679"
+
+
+@patch("eurlex.eurlex.sparql_dataframe.get")
+def test_resolve_ids_ecli_is_case_insensitive(mock_get, eur):
+    mock_get.return_value = pd.DataFrame(
+        {
+            "id": ["ECLI:EU:C:2020:1"],
+            "work": ["http://publications.europa.eu/resource/cellar/abc"],
+            "celex": ["62018CJ0001"],
+            "ecli": ["ECLI:EU:C:2020:1"],
+            "date": "2020-01-09",
+            "type": "JUDG",
+        }
+    )
+    result = eur.resolve_ids(["ecli:eu:c:2020:1", "ECLI:EU:C:2020:1"])
+    assert mock_get.call_count == 1
+    assert '"ECLI:EU:C:2020:1"^^xsd:string' in mock_get.call_args.args[1]
+    assert "ecli:eu" not in mock_get.call_args.args[1]
+    assert list(result["id"]) == ["ECLI:EU:C:2020:1"]
+    assert result.loc[0, "celex"] == "62018CJ0001"
+
+
 # --- get_data tests (mock requests) ---
 
 
@@ -224,6 +680,88 @@ def test_get_data_title_non200_returns_status(mock_get, eur):
     assert d["title"] == "404"
 
 
+@patch("eurlex.eurlex.requests.get", side_effect=ConnectionError("refused"))
+def test_get_data_request_error(mock_get, eur, caplog):
+    url = "http://publications.europa.eu/resource/cellar/abc123"
+    assert eur.get_data(url, "title") == {
+        "title": "NaN",
+        "parties": "NaN",
+        "case_number": "NaN",
+    }
+    assert eur.get_data(url, "text") == 1
+    assert "refused" in caplog.text
+
+
+@patch("eurlex.eurlex.requests.get")
+def test_get_data_memo(mock_get):
+    eur = Eurlex(memo=Memo())
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.text = TITLE_XML
+    mock_get.return_value = mock_response
+    first = eur.get_data("32016R0679", "title", max_workers=1)
+    second = eur.get_data("32016R0679", "title", max_workers=8)
+    assert first is second
+    assert mock_get.call_count == 1
+    # other arguments are other entries
+    eur.get_data("32016R0679", "title", languages=["fr"])
+    assert mock_get.call_count == 2
+    # failures are retried
+    mock_response.status_code = 404
+    assert eur.get_data("32014R0001", "title")["title"] == "404"
+    eur.get_data("32014R0001", "title")
+    assert mock_get.call_count == 4
+    assert len(eur.memo) == 2
+
+
+@patch("eurlex.eurlex.requests.get")
+def test_get_data_shared_memo(mock_get):
+    memo = Memo()
+    mock_get.side_effect = lambda url, **kwargs: _manifestation_response(
+        200, "text/html", "<html><body>{}</body></html>".format(url).encode()
+    )
+    cellar = Eurlex(memo=memo)
+    mirror = Eurlex(memo=memo, resource_url="http://mirror.example/resource/")
+    pdf = Eurlex(memo=memo, format_preference=["application/pdf", "text/html"])
+    assert memo.cache_if is None
+    texts = [eur.get_data("32016R0679", "text") for eur in (cellar, mirror, pdf)]
+    assert "mirror.example" in texts[1] and "mirror.example" not in texts[0]
+    assert mock_get.call_count == 3
+    assert cellar.get_data("32016R0679", "text") is texts[0]
+    assert mock_get.call_count == 3
+
+
+def test_split_caselaw_titles(eur):
+    titles = pd.Series(
+        [
+            "Judgment of the Court.#Van Gend & Loos v Administratie der Belastingen.#Case 26-62.",
+            "Order of the Court.\n#Parties#Case C-1/20.#extra",
+            "Opinion of Advocate General",
+            "Title#Parties only",
+            None,
+        ],
+        index=[10, 11, 12, 13, 14],
+    )
+    frame = eur.split_caselaw_titles(titles)
+    assert list(frame.index) == [10, 11, 12, 13, 14]
+    assert frame.loc[10].to_dict() == {
+        "title": "Judgment of the Court.",
+        "parties": "Van Gend & Loos v Administratie der Belastingen",
+        "case_number": "Case 26-62",
+    }
+    assert frame.loc[11, "case_number"] == "Case C-1/20"
+    assert frame.loc[12, "title"] == "Opinion of Advocate General"
+    assert frame.loc[13].to_dict() == {
+        "title": "Title#Parties only",
+        "parties": "NaN",
+        "case_number": "NaN",
+    }
+    assert frame.loc[14].isna().all()
+    # the same result as extracting the metadata of a single title
+    for index in [10, 11, 12, 13]:
+        assert frame.loc[index].to_dict() == eur._split_caselaw_title(titles[index])
+
+
 @patch("eurlex.eurlex.requests.get")
 def test_get_data_text_html(mock_get, eur):
     mock_response = MagicMock()
@@ -278,6 +816,237 @@ def test_get_data_text_300_multiple_links(mock_get, eur):
     assert isinstance(d, str)
 
 
+def _manifestation_response(status_code, content_type, content):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {"Content-Type": content_type}
+    response.content = content
+    return response
+
+
+MULTIPLE_CHOICES = _manifestation_response(
+    300,
+    "text/html",
+    b'<html><body><a href="http://example.org/doc1.pdf">doc1</a>'
+    b'<a href="http://example.org/doc1.html">doc1</a>'
+    b'<a href="http://example.org/doc2.html">doc2</a>'
+    b'<a href="http://example.org/doc2.html">doc2</a></body></html>',
+)
+
+
+def _manifestations(url, **kwargs):
+    return {
+        "http://publications.europa.eu/resource/cellar/abc123": MULTIPLE_CHOICES,
+        "http://example.org/doc1.pdf": _manifestation_response(
+            200, "application/pdf", b"%PDF-fake"
+        ),
+        "http://example.org/doc1.html": _manifestation_response(
+            200, "text/html", b"<html><body>Same text</body></html>"
+        ),
+        "http://example.org/doc2.html": _manifestation_response(
+            200, "text/html", b"<html><body>Same text</body></html>"
+        ),
+    }[url]
+
+
+@patch("eurlex.eurlex.requests.get", side_effect=_manifestations)
+def test_get_data_text_300_fetches_each_link_once(mock_get, eur):
+    with patch("eurlex.eurlex.extract_text", return_value="PDF text"):
+        d = eur.get_data(
+            "http://publications.europa.eu/resource/cellar/abc123",
+            "text",
+            include_breaks=True,
+        )
+    requested = sorted(c.args[0] for c in mock_get.call_args_list[1:])
+    assert requested == [
+        "http://example.org/doc1.html",
+        "http://example.org/doc1.pdf",
+        "http://example.org/doc2.html",
+    ]
+    # identical html content is only read once and comes before the pdf
+    assert d.count("Same text") == 1
+    assert d.index("Same text") < d.index("PDF text")
+
+
+@patch("eurlex.eurlex.requests.get", side_effect=_manifestations)
+def test_get_data_text_300_first_acceptable(mock_get):
+    eur = Eurlex(format_preference=["application/pdf"])
+    with patch("eurlex.eurlex.extract_text", return_value="PDF text"):
+        d = eur.get_data(
+            "http://publications.europa.eu/resource/cellar/abc123",
+            "text",
+            max_workers=1,
+            first_acceptable=True,
+        )
+    assert d == "PDF text"
+
+
+def _split_manifestations(url, *args, **kwargs):
+    """A 300 response listing a pdf, which answers first, and a document split into two html parts."""
+    if url.endswith(".html"):
+        time.sleep(0.05)
+    part = url.rsplit("/", 1)[-1]
+    return {
+        "http://publications.europa.eu/resource/cellar/abc123": MULTIPLE_CHOICES,
+        "doc1.pdf": _manifestation_response(200, "application/pdf", b"%PDF-fake"),
+        "doc1.html": _manifestation_response(
+            200, "text/html", b"<html><body>First part</body></html>"
+        ),
+        "doc2.html": _manifestation_response(
+            200, "text/html", b"<html><body>Second part</body></html>"
+        ),
+    }[part if part.startswith("doc") else url]
+
+
+@patch("eurlex.eurlex.requests.get", side_effect=_split_manifestations)
+def test_get_data_text_300_first_acceptable_keeps_preferred_parts(mock_get):
+    eur = Eurlex(format_preference=["text/html", "application/pdf"])
+    with patch("eurlex.eurlex.extract_text", return_value="PDF text"):
+        d = eur.get_data(
+            "http://publications.europa.eu/resource/cellar/abc123",
+            "text",
+            max_workers=3,
+            first_acceptable=True,
+        )
+    assert "PDF text" not in d
+    assert d.index("First part") < d.index("Second part")
+
+
+@patch("eurlex.eurlex.requests.get", side_effect=_split_manifestations)
+def test_get_data_text_300_first_acceptable_cancels_pending_links(mock_get):
+    eur = Eurlex(format_preference=["text/html", "application/pdf"])
+    with patch("eurlex.eurlex.extract_text", return_value="PDF text"):
+        d = eur.get_data(
+            "http://publications.europa.eu/resource/cellar/abc123",
+            "text",
+            max_workers=1,
+            first_acceptable=True,
+        )
+    requested = [c.args[0] for c in mock_get.call_args_list[1:]]
+    # the pdf is acceptable, so the second html part is never requested
+    assert "http://example.org/doc2.html" not in requested
+    assert len(requested) <= 2
+    assert d in ("PDF text", "First part")
+
+
+def _manifestations_with_failed_part(url, *args, **kwargs):
+    return {
+        "http://publications.europa.eu/resource/cellar/abc123": _manifestation_response(
+            300,
+            "text/html",
+            b'<html><body><a href="http://example.org/doc1.pdf">doc1</a>'
+            b'<a href="http://example.org/doc1.html">doc1</a>'
+            b'<a href="http://example.org/missing.html">missing</a>'
+            b'<a href="http://example.org/doc2.html">doc2</a></body></html>',
+        ),
+        "http://example.org/doc1.pdf": _manifestation_response(
+            200, "application/pdf", b"%PDF-fake"
+        ),
+        "http://example.org/doc1.html": _manifestation_response(
+            200, "text/html", b"<html><body>First part</body></html>"
+        ),
+        "http://example.org/missing.html": _manifestation_response(
+            404, "text/html", b""
+        ),
+        "http://example.org/doc2.html": _manifestation_response(
+            200, "text/html", b"<html><body>Second part</body></html>"
+        ),
+    }[url]
+
+
+@patch("eurlex.eurlex.requests.get", side_effect=_manifestations_with_failed_part)
+def test_get_data_text_300_keeps_position_of_failed_part(mock_get):
+    eur = Eurlex(format_preference=["text/html", "application/pdf"])
+    with patch("eurlex.eurlex.extract_text", return_value="PDF text"):
+        d = eur.get_data("http://publications.europa.eu/resource/cellar/abc123", "text")
+    assert d == "First partNaNSecond partPDF text"
+
+
+def test_accept_header_follows_format_preference():
+    eur = Eurlex(format_preference=["text/html", "application/pdf"])
+    header = eur._accept_header()
+    assert header.startswith("text/html, text/html;type=simplified")
+    assert "application/pdf;q=0.9" in header
+    assert "msword" not in header
+
+
+def test_language_header_supports_more_than_three_languages():
+    header = Eurlex._language_header(["en", "fr", "de", "it", "es"])
+    assert header == "en, fr;q=0.8, de;q=0.7, it;q=0.6, es;q=0.5"
+
+
+@patch("eurlex.eurlex.requests.get")
+def test_get_data_multilingual(mock_get, eur):
+    def get(url, headers=None, **kwargs):
+        language = headers["Accept-Language"]
+        return MagicMock(
+            status_code=200,
+            headers={"Content-Type": "text/html"},
+            content="<html><body>text in {}</body></html>".format(language).encode(),
+        )
+
+    mock_get.side_effect = get
+    texts = eur.get_data_multilingual(
+        "32016R0679", languages=["en", "fr", "de", "it", "fr"]
+    )
+    assert list(texts) == ["en", "fr", "de", "it"]
+    assert texts["it"] == "text in it"
+    assert mock_get.call_count == 4
+    assert eur.get_data_multilingual("32016R0679", languages=[]) == {}
+    assert mock_get.call_count == 4
+
+
+def test_session_is_used_for_requests():
+    session = MagicMock()
+    session.get.return_value = MagicMock(
+        status_code=200,
+        headers={"Content-Type": "text/html"},
+        content=b"<html><body>text</body></html>",
+    )
+    eur = Eurlex(session=session)
+    assert eur.get_data("32016R0679", "text") == "text"
+    assert session.get.call_args.args[0].endswith("celex/32016R0679")
+
+
+@patch("eurlex.eurlex.requests.get")
+@patch("eurlex.eurlex.requests.head")
+def test_get_data_text_probe_fetches_cheapest_format(mock_head, mock_get, eur):
+    unavailable = MagicMock(status_code=406)
+    available = MagicMock(
+        status_code=200, url="http://publications.europa.eu/resource/cellar/x.html"
+    )
+    mock_head.side_effect = [unavailable, available]
+    mock_get.return_value = _manifestation_response(
+        200, "text/html; charset=UTF-8", b"<html><body>Some text</body></html>"
+    )
+    d = eur.get_data(
+        "http://publications.europa.eu/resource/cellar/abc123", "text", probe=True
+    )
+    assert "Some text" in d
+    assert mock_get.call_args.args[0].endswith("x.html")
+    assert mock_get.call_args.kwargs["headers"]["Accept"].startswith("text/html")
+    assert eur.format_counts == {"text/html": 1}
+
+
+@patch("eurlex.eurlex.requests.get", side_effect=_split_manifestations)
+@patch("eurlex.eurlex.requests.head")
+def test_get_data_text_probe_accepts_multiple_parts(mock_head, mock_get):
+    eur = Eurlex(format_preference=["text/html", "application/pdf"])
+    mock_head.return_value = MagicMock(
+        status_code=300, url="http://publications.europa.eu/resource/cellar/abc123"
+    )
+    with patch("eurlex.eurlex.extract_text", return_value="PDF text"):
+        d = eur.get_data(
+            "http://publications.europa.eu/resource/cellar/abc123", "text", probe=True
+        )
+    # the first format is taken, so only its parts are accepted
+    assert mock_head.call_count == 1
+    assert (
+        mock_get.call_args_list[0].kwargs["headers"]["Accept"].startswith("text/html")
+    )
+    assert d.index("First part") < d.index("Second part")
+
+
 @patch("eurlex.eurlex.requests.get")
 def test_get_data_ids(mock_get, eur):
     mock_response = MagicMock()
@@ -367,6 +1136,49 @@ def test_download_xml_celex_number(mock_head, mock_get, eur):
     assert result
 
 
+@patch("builtins.open", mock_open())
+@patch("eurlex.eurlex.requests.get")
+@patch("eurlex.eurlex.requests.head")
+def test_download_xml_logs_instead_of_printing(
+    mock_head, mock_get, eur, capsys, caplog
+):
+    mock_head.return_value = MagicMock(
+        status_code=200, url="http://publications.europa.eu/resource/cellar/abc"
+    )
+    mock_get.return_value = MagicMock(
+        status_code=200, content=b"<xml>some content</xml>"
+    )
+    eur.download_xml("32016R0679", notice="tree")
+    assert capsys.readouterr().out == ""
+    with caplog.at_level(logging.DEBUG, logger="eurlex.eurlex"):
+        eur.download_xml("32016R0679", notice="tree")
+    assert capsys.readouterr().out == ""
+    celex_records = [r for r in caplog.records if getattr(r, "celex", None)]
+    assert celex_records[0].celex == "32016R0679"
+    requests_logged = [r for r in caplog.records if hasattr(r, "elapsed")]
+    assert {r.status for r in requests_logged} == {200}
+
+
+@patch("eurlex.eurlex.requests.get")
+@patch("eurlex.eurlex.requests.head")
+def test_download_xml_gzip(mock_head, mock_get, eur, tmp_path):
+    mock_head.return_value = MagicMock(
+        status_code=200, url="http://publications.europa.eu/resource/cellar/abc"
+    )
+    content = b"<xml>tree notice content</xml>" * 50
+    mock_get.return_value = MagicMock(
+        content=content,
+        headers={"Content-Encoding": "gzip", "Content-Length": "100"},
+    )
+    filename = str(tmp_path / "notice.xml")
+    eur.download_xml("32016R0679", notice="tree", filename=filename, compression="gzip")
+    assert read_file(filename + ".gz") == content
+    assert "gzip" in mock_get.call_args.kwargs["headers"]["Accept-Encoding"]
+    ratios = eur.compression_ratios()
+    assert ratios["transfer"] == len(content) / 100
+    assert ratios["storage"] > 1
+
+
 @patch("eurlex.eurlex.requests.head")
 def test_download_xml_head_fails(mock_head, eur):
     mock_head_resp = MagicMock()
@@ -385,3 +1197,158 @@ def test_download_xml_invalid_notice(eur):
             "http://publications.europa.eu/resource/cellar/abc123",
             notice="invalid",
         )
+
+
+@pytest.mark.parametrize(
+    "flags, level",
+    [
+        ([], logging.WARNING),
+        (["-q"], logging.ERROR),
+        (["-v"], logging.INFO),
+        (["-vv"], logging.DEBUG),
+        (["-v", "-v"], logging.DEBUG),
+    ],
+)
+@patch("eurlex.eurlex.logging.basicConfig")
+@patch("eurlex.eurlex.Fire")
+def test_main_verbosity(mock_fire, mock_config, flags, level):
+    main(flags + ["make_query", "--resource_type", "directive"])
+    assert mock_config.call_args.kwargs["level"] == level
+    assert mock_fire.call_args.kwargs["command"] == [
+        "make_query",
+        "--resource_type",
+        "directive",
+    ]
+
+
+CURIA_LIST = """<html><body><table>
+<tr><th>Case</th><th>Information</th></tr>
+<tr><td><a name="C-12/19"></a><span><a href="javascript:openDocument(http://curia.europa.eu/juris/documents.jsf?CELEX&numdoc=62019CJ0012', 'curia');return;">C-12/19</a></span></td><td><i>Judgment of the Court, Party v Commission, ECLI:EU:C:2020:123</i></td></tr>
+<tr><td><a name="T-1/20"></a></td><td><i>Pending</i></td></tr>
+</table></body></html>"""
+
+
+@patch("eurlex.eurlex.requests.get")
+def test_curia_scraper(mock_get, eur):
+    def get(url, *args, **kwargs):
+        response = MagicMock(status_code=200)
+        response.text = (
+            CURIA_LIST
+            if url.endswith("_juris.htm")
+            else '<html><body><div id="menu">Menu</div><div id="TexteOnly"><p>JUDGMENT</p></div></body></html>'
+        )
+        return response
+
+    mock_get.side_effect = get
+    url = eur.curia_url + "en/content/juris/c2_juris.htm"
+    records = eur.curia_scraper([url], 10)[url]
+    assert records[1] == {
+        "case_number": "C-12/19",
+        "case_info": "Judgment of the Court, Party v Commission, ECLI:EU:C:2020:123",
+        "link": "http://curia.europa.eu/juris/documents.jsf?CELEX&numdoc=62019CJ0012",
+        "ecli": "ECLI:EU:C:2020:123",
+        "celex": "62019CJ0012",
+        "case_text": "JUDGMENT",
+    }
+    assert records[2] == {"case_number": "T-1/20", "case_info": "Pending"}
+    # the list and one document
+    assert mock_get.call_count == 2
+    assert list(eur.curia_scraper([url], 1)[url]) == [1]
+
+
+def _curia_row(case_number, ecli):
+    return (
+        '<tr><td><a name="{0}"></a><span><a href="javascript:openDocument(http://curia.europa.eu/juris/documents.jsf?CELEX&numdoc={0}\', \'curia\');return;">{0}</a></span></td>'
+        "<td><i>Judgment, {1}</i></td></tr>"
+    ).format(case_number, ecli)
+
+
+CURIA_LISTS = {
+    "c1_juris.htm": [("C-1/19", "ECLI:EU:C:2019:1"), ("C-2/19", "ECLI:EU:C:2019:2")],
+    "c2_juris.htm": [("C-2/19", "ECLI:EU:C:2019:2"), ("C-3/20", "ECLI:EU:C:2020:3")],
+    "t2_juris.htm": [("T-1/19", "ECLI:EU:T:2019:1")],
+    "f1_juris.htm": [("F-1/10", "ECLI:EU:F:2010:1")],
+}
+
+
+@pytest.fixture
+def curia_get():
+    def get(url, *args, **kwargs):
+        response = MagicMock(status_code=200)
+        page = url.rsplit("/", 1)[-1]
+        if page in CURIA_LISTS:
+            response.text = (
+                "<html><body><table><tr><th>Case</th></tr>"
+                + "".join(_curia_row(*row) for row in CURIA_LISTS[page])
+                + "</table></body></html>"
+            )
+        else:
+            response.text = '<div id="TexteOnly">Text of {}</div>'.format(
+                url.rsplit("=", 1)[-1]
+            )
+        return response
+
+    with patch("eurlex.eurlex.requests.get", side_effect=get) as mock_get:
+        yield mock_get
+
+
+def test_parse_curia_all_lists(eur, curia_get):
+    cases = eur.parse_curia()
+    # C-2/19 is in both lists of the Court of Justice
+    assert list(cases["case_number"]) == [
+        "C-1/19",
+        "C-2/19",
+        "C-3/20",
+        "T-1/19",
+        "F-1/10",
+    ]
+    assert list(cases["case_list"]) == ["ecj", "ecj", "ecj", "gc", "cst"]
+    assert cases.loc[3, "case_text"] == "Text of T-1/19"
+    # four list pages and five documents
+    assert curia_get.call_count == 9
+
+
+def test_parse_curia_selected_lists_and_limit(eur, curia_get, caplog):
+    cases = eur.parse_curia(["gc", "cst", "unknown"], limit=1)
+    assert list(cases["case_number"]) == ["T-1/19", "F-1/10"]
+    assert "Unknown case lists" in caplog.text
+    cases = eur.parse_curia("ecj", limit=1)
+    assert list(cases["case_number"]) == ["C-1/19", "C-2/19"]
+
+
+def test_iter_curia_streams(eur, curia_get):
+    cases = eur.iter_curia("all", texts=False)
+    first = next(cases)
+    assert first["case_number"] == "C-1/19" and "case_text" not in first
+    assert len(list(cases)) == 4
+    assert curia_get.call_count == 4
+    cases = eur.iter_curia("gc", max_workers=1)
+    assert next(cases)["case_text"] == "Text of T-1/19"
+
+
+@pytest.mark.parametrize("without_ecli", ["c1_juris.htm", "c2_juris.htm"])
+def test_parse_curia_skips_cases_listed_without_ecli(eur, curia_get, without_ecli):
+    rows = [
+        (number, "Pending" if number == "C-2/19" else ecli)
+        for number, ecli in CURIA_LISTS[without_ecli]
+    ]
+    with patch.dict(CURIA_LISTS, {without_ecli: rows}):
+        cases = eur.parse_curia("ecj")
+    assert list(cases["case_number"]) == ["C-1/19", "C-2/19", "C-3/20"]
+
+
+def test_iter_curia_yields_lists_as_they_arrive(eur, curia_get):
+    release = threading.Event()
+    get = curia_get.side_effect
+
+    def slow_second_list(url, *args, **kwargs):
+        # fails the list if the first one is only yielded after it
+        if url.endswith("c2_juris.htm") and not release.wait(1):
+            raise TimeoutError(url)
+        return get(url, *args, **kwargs)
+
+    curia_get.side_effect = slow_second_list
+    cases = eur.iter_curia("ecj", texts=False, max_workers=2)
+    assert [next(cases)["case_number"] for _ in range(2)] == ["C-1/19", "C-2/19"]
+    release.set()
+    assert [case["case_number"] for case in cases] == ["C-3/20"]
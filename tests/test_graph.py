@@ -0,0 +1,72 @@
+"""Unit tests for the citation graph."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from eurlex.graph import CitationGraph
+
+
+@pytest.fixture
+def graph():
+    pages = [
+        pd.DataFrame(
+            {
+                "work": ["w1", "w1", "w2"],
+                "celex": ["A", "A", "B"],
+                "citationcelex": ["B", "C", "C"],
+            }
+        ),
+        pd.DataFrame(
+            {
+                "work": ["w1", "w3", "w4"],
+                "celex": ["A", "D", "E"],
+                "citationcelex": ["B", "A", None],
+            }
+        ),
+    ]
+    return CitationGraph.from_frames(iter(pages))
+
+
+def test_from_frames_interns_and_deduplicates(graph):
+    assert graph.num_nodes == 4
+    assert graph.num_edges == 4
+    assert "E" not in graph
+    assert sorted(graph.cites("A")) == ["B", "C"]
+    assert graph.cited_by("C") == ["A", "B"] or graph.cited_by("C") == ["B", "A"]
+
+
+def test_degrees(graph):
+    assert graph.out_degree("A") == 2
+    assert graph.in_degree("C") == 2
+    assert graph.in_degree("D") == 0
+    assert graph.out_degree().sum() == graph.in_degree().sum() == graph.num_edges
+
+
+def test_neighbourhood(graph):
+    assert sorted(graph.neighbourhood("D", k=1)) == ["A"]
+    assert sorted(graph.neighbourhood("D", k=2)) == ["A", "B", "C"]
+    assert sorted(graph.neighbourhood("C", k=1, direction="in")) == ["A", "B"]
+    assert sorted(graph.neighbourhood("B", k=1, direction="both")) == ["A", "C"]
+
+
+def test_pagerank(graph):
+    ranks = graph.pagerank()
+    assert ranks.index[0] == "C"
+    assert ranks.sum() == pytest.approx(1.0)
+
+
+def test_save_and_load_memory_mapped(graph, tmp_path):
+    graph.save(str(tmp_path))
+    loaded = CitationGraph.load(str(tmp_path))
+    assert isinstance(loaded.indices, np.memmap)
+    assert loaded.cites("A") == graph.cites("A")
+    pd.testing.assert_series_equal(loaded.pagerank(), graph.pagerank())
+
+
+def test_empty_graph():
+    graph = CitationGraph.from_frames(
+        pd.DataFrame({"celex": ["A"], "citationcelex": [None]})
+    )
+    assert graph.num_nodes == 0
+    assert graph.pagerank().empty
@@ -0,0 +1,123 @@
+"""Unit tests for the cached concept hierarchies."""
+
+import os
+import re
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from eurlex.eurlex import Eurlex
+from eurlex.hierarchy import ConceptHierarchy
+
+FD = "http://publications.europa.eu/resource/authority/fd_555/"
+
+
+@pytest.fixture
+def hierarchy():
+    return ConceptHierarchy(
+        narrower={
+            FD + "04": [FD + "04.10"],
+            FD + "04.10": [FD + "04.10.30", FD + "04.10.40"],
+            FD + "04.10.30": [FD + "04.10.30.00"],
+        },
+        labels={"http://eurovoc.europa.eu/1": "data protection"},
+    )
+
+
+def test_descendants(hierarchy):
+    assert hierarchy.descendants(FD + "04") == {
+        FD + "04.10",
+        FD + "04.10.30",
+        FD + "04.10.40",
+        FD + "04.10.30.00",
+    }
+    assert hierarchy.descendants(FD + "04.10.30.00") == set()
+
+
+def test_descendants_with_cycle():
+    hierarchy = ConceptHierarchy(narrower={"a": ["b"], "b": ["a"]})
+    assert "b" in hierarchy.descendants("a")
+
+
+def test_make_query_expands_directory_client_side(hierarchy):
+    eur = Eurlex(hierarchy=hierarchy)
+    q = eur.make_query(resource_type="directive", directory="04.10")
+    assert "narrower+" not in q
+    assert "<" + FD + "04.10.30.00>" in q
+    assert "dir-eu-legal-act/04.10>" in q
+
+
+def test_resolve_labels(hierarchy):
+    labels = hierarchy.resolve_labels(
+        pd.Series(["http://eurovoc.europa.eu/1", "http://eurovoc.europa.eu/2"])
+    )
+    assert labels.iloc[0] == "data protection"
+    assert pd.isna(labels.iloc[1])
+
+
+def test_fetch_and_cache(tmp_path):
+    eur = MagicMock()
+    eur.explain.return_value = {"rows": 3}
+    eur.query_eurlex.return_value = pd.DataFrame(
+        {
+            "concept": [FD + "04", FD + "04", FD + "04.10"],
+            "narrower": [FD + "04.10", FD + "04.11", None],
+            "label": ["Internal market", "Internal market", None],
+        }
+    )
+    filename = str(tmp_path / "hierarchy.json.gz")
+    hierarchy = ConceptHierarchy.load_or_fetch(filename, eur, schemes=["scheme"])
+    assert os.path.isfile(filename)
+    assert hierarchy.label(FD + "04") == "Internal market"
+    assert "<scheme>" in eur.query_eurlex.call_args.args[0]
+    # a fresh cache is not downloaded again
+    cached = ConceptHierarchy.load_or_fetch(filename, eur, schemes=["scheme"])
+    assert eur.query_eurlex.call_count == 1
+    assert cached.descendants(FD + "04") == {FD + "04.10", FD + "04.11"}
+    # an outdated one is
+    ConceptHierarchy.load_or_fetch(filename, eur, max_age=-1, schemes=["scheme"])
+    assert eur.query_eurlex.call_count == 2
+
+
+def _paged_endpoint(rows):
+    def query_eurlex(query):
+        limit, offset = map(
+            int, re.search(r"limit (\d+) offset (\d+)$", query).groups()
+        )
+        return rows.iloc[offset : offset + limit].reset_index(drop=True)
+
+    return query_eurlex
+
+
+def test_fetch_pages_scheme():
+    rows = pd.DataFrame(
+        {
+            "concept": [FD + "04"] * 5,
+            "narrower": [FD + "04.1" + str(i) for i in range(5)],
+            "label": "Internal market",
+        }
+    )
+    eur = MagicMock()
+    eur.explain.return_value = {"rows": 5}
+    eur.query_eurlex.side_effect = _paged_endpoint(rows)
+    hierarchy = ConceptHierarchy.fetch(eur, schemes=["scheme"], page_size=2)
+    assert eur.query_eurlex.call_count == 3
+    assert "order by ?concept ?narrower ?label" in eur.query_eurlex.call_args.args[0]
+    assert len(hierarchy.descendants(FD + "04")) == 5
+
+
+def test_incomplete_fetch_is_not_cached(tmp_path):
+    filename = str(tmp_path / "hierarchy.json.gz")
+    eur = MagicMock()
+    # the endpoint caps results, so pages beyond the cap are empty
+    eur.explain.return_value = {"rows": 5}
+    eur.query_eurlex.side_effect = _paged_endpoint(
+        pd.DataFrame({"concept": [FD + "04"] * 2, "narrower": None, "label": None})
+    )
+    with pytest.raises(RuntimeError):
+        ConceptHierarchy.load_or_fetch(filename, eur, schemes=["scheme"], page_size=2)
+    assert not os.path.exists(filename)
+    eur.explain.return_value = {"rows": None}
+    with pytest.raises(RuntimeError):
+        ConceptHierarchy.fetch(eur, schemes=["scheme"])
@@ -0,0 +1,77 @@
+"""Tests of the tracing hooks, run against the local Cellar mirror."""
+
+import pandas as pd
+import pytest
+
+from eurlex.eurlex import Eurlex
+from eurlex.instrumentation import NullTracer, SummaryTracer
+from eurlex.mirror import MirrorServer, record_query
+
+QUERY = "select ?work where { ?work ?p ?o } limit 2"
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    resource = tmp_path / "resource" / "32016R0679"
+    resource.mkdir(parents=True)
+    (resource / "text.html").write_text(
+        "<html><body>General Data Protection Regulation</body></html>"
+    )
+    record_query(str(tmp_path), QUERY, pd.DataFrame({"work": ["a", "b"]}))
+    with MirrorServer(str(tmp_path)) as server:
+        yield server
+
+
+@pytest.fixture
+def tracer():
+    return SummaryTracer()
+
+
+@pytest.fixture
+def eur(mirror, tracer):
+    return Eurlex(
+        endpoint=mirror.sparql_url, resource_url=mirror.resource_url, tracer=tracer
+    )
+
+
+def test_default_tracer_records_nothing():
+    eur = Eurlex()
+    assert isinstance(eur.tracer, NullTracer)
+    with eur.tracer.start_as_current_span("x") as span:
+        span.set_attribute("a", 1)
+        assert not span.is_recording()
+        assert span.attributes == {}
+
+
+def test_get_data_spans(eur, tracer):
+    eur.get_data("32016R0679", "text")
+    spans = tracer.to_frame().set_index("name")
+    assert {"get_data", "http.get", "read_data", "parse.html"} <= set(spans.index)
+    assert spans.loc["get_data", "data_type"] == "text"
+    request = spans.loc["http.get"]
+    assert request["status"] == 200
+    assert request["content_type"].startswith("text/html")
+    assert request["bytes"] > 0
+    assert request["time_to_headers"] >= 0 and request["download"] >= 0
+    # the outer span encloses the request and the parsing
+    assert spans.loc["get_data", "duration"] >= request["duration"]
+
+
+def test_query_spans(eur, tracer):
+    frame = eur.query_eurlex(QUERY)
+    spans = tracer.to_frame().set_index("name")
+    assert spans.loc["sparql.query", "rows"] == len(frame) == 2
+    assert "query_eurlex" in spans.index
+
+
+def test_report(eur, tracer):
+    assert tracer.report() == "No spans recorded."
+    for _ in range(3):
+        eur.get_data("32016R0679", "text")
+    summary = tracer.summary()
+    assert summary.loc["get_data", "count"] == 3
+    assert summary.loc["http.get", "bytes"] > 0
+    assert list(summary.columns) == ["count", "total", "mean", "p50", "p95", "bytes"]
+    assert "http.get" in tracer.report()
+    tracer.clear()
+    assert tracer.to_frame().empty
@@ -0,0 +1,56 @@
+"""Unit tests for the legal basis and proposal index."""
+
+import pandas as pd
+import pytest
+
+from eurlex.links import LinkIndex
+
+
+@pytest.fixture
+def index():
+    index = LinkIndex()
+    index.update(
+        pd.DataFrame(
+            {
+                "work": ["w1", "w1", "w2", "w3"],
+                "celex": ["32016R0679", "32016R0679", "32019R1020", "32019R1020"],
+                "lbs": ["l1", "l1", "l2", "l2"],
+                "lbcelex": ["12012E016", "12012E016", "12012E114", "12012E114"],
+                "lbsuffix": ["A16P2", "A16P2", None, "A114"],
+                "proposal": ["52012PC0011", None, "52017PC0795", None],
+            }
+        )
+    )
+    return index
+
+
+def test_lookups(index):
+    assert len(index) == 2
+    assert index.legal_bases("32016R0679") == [("12012E016", "A16P2")]
+    assert index.acts_based_on("12012E114") == ["32019R1020"]
+    assert index.acts_based_on("12012E114", suffix="A114") == ["32019R1020"]
+    assert index.acts_based_on("12012E114", suffix="A115") == []
+    assert index.proposals("32016R0679") == ["52012PC0011"]
+    assert index.adopted_acts("52017PC0795") == ["32019R1020"]
+    assert index.legal_bases("unknown") == []
+
+
+def test_incremental_update(index):
+    new_harvest = pd.DataFrame(
+        {
+            "celex": ["32016R0679", "32022R2065"],
+            "lbcelex": ["12012E016", "12012E114"],
+            "lbsuffix": ["A16P2", None],
+        }
+    )
+    assert index.update(new_harvest) == 1
+    assert index.acts_based_on("12012E114") == ["32019R1020", "32022R2065"]
+
+
+@pytest.mark.parametrize("filename", ["links.json", "links.json.gz"])
+def test_save_and_load(index, tmp_path, filename):
+    path = str(tmp_path / filename)
+    index.save(path)
+    loaded = LinkIndex.load(path)
+    assert loaded.legal_bases("32019R1020") == index.legal_bases("32019R1020")
+    assert loaded.adopted_acts("52012PC0011") == ["32016R0679"]
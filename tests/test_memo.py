@@ -0,0 +1,160 @@
+"""Unit tests of the in-memory memo."""
+
+import threading
+
+import pytest
+
+from eurlex.memo import Memo, size_of
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_size_of():
+    assert size_of("a" * 1000) > 1000
+    assert size_of(["a" * 1000, "b" * 1000]) > 2000
+    assert size_of({"title": "a" * 1000}) > 1000
+
+
+def test_lru_eviction_by_bytes():
+    memo = Memo(max_bytes=3 * size_of("x" * 100))
+    for key in "abc":
+        memo.put(key, key * 100)
+    assert memo.get("a") == "a" * 100  # a is now the most recently used
+    memo.put("d", "d" * 100)
+    assert "b" not in memo and "a" in memo and "d" in memo
+    assert memo.stats["evictions"] == 1
+    assert memo.bytes == 3 * size_of("x" * 100)
+    # values larger than the memo are not stored
+    memo.put("e", "e" * 1000)
+    assert "e" not in memo and len(memo) == 3
+
+
+def test_lru_eviction_by_entries():
+    memo = Memo(max_entries=2)
+    for key in "abc":
+        memo.put(key, key)
+    assert list(memo._entries) == ["b", "c"]
+    memo.invalidate("b")
+    assert len(memo) == 1 and memo.bytes == size_of("c")
+    memo.clear()
+    assert len(memo) == 0 and memo.bytes == 0
+
+
+def test_ttl():
+    clock = Clock()
+    memo = Memo(ttl=10, clock=clock)
+    assert memo.get_or_compute("a", lambda: 1) == 1
+    clock.now = 9
+    assert memo.get_or_compute("a", lambda: 2) == 1
+    clock.now = 10
+    assert memo.get_or_compute("a", lambda: 2) == 2
+    assert memo.stats == {
+        "hits": 1,
+        "misses": 2,
+        "coalesced": 0,
+        "evictions": 0,
+        "expirations": 1,
+    }
+
+
+def test_single_flight():
+    memo = Memo()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "text"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(memo.get_or_compute("k", compute))
+        )
+        for _ in range(8)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while memo.stats["coalesced"] < 7:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["text"] * 8
+    assert len(calls) == 1
+    assert memo.stats["misses"] == 1 and memo.stats["coalesced"] == 7
+
+
+def test_errors_are_shared_and_not_stored():
+    memo = Memo(cache_if=lambda value: value != "failed")
+    with pytest.raises(ValueError):
+        memo.get_or_compute("a", lambda: (_ for _ in ()).throw(ValueError()))
+    assert "a" not in memo
+    assert memo.get_or_compute("b", lambda: "failed") == "failed"
+    assert "b" not in memo
+    assert memo.get_or_compute("b", lambda: "text") == "text"
+    assert "b" in memo
+
+
+def test_waiters_are_released_when_cache_if_raises():
+    def cache_if(value):
+        raise RuntimeError("cache_if failed")
+
+    memo = Memo(cache_if=cache_if)
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return "text"
+
+    errors, results = [], []
+
+    def leader():
+        try:
+            memo.get_or_compute("k", compute)
+        except RuntimeError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=leader)
+    second = threading.Thread(
+        target=lambda: results.append(memo.get_or_compute("k", compute)),
+        daemon=True,
+    )
+    first.start()
+    started.wait(5)
+    second.start()
+    while memo.stats["coalesced"] < 1:
+        pass
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert not second.is_alive()
+    assert results == ["text"] and len(errors) == 1
+    assert "k" not in memo
+    # the key can be computed again
+    memo.cache_if = None
+    assert memo.get_or_compute("k", lambda: "again") == "again"
+
+
+def test_cache_if_per_call():
+    memo = Memo(cache_if=lambda value: value != "memo rejects")
+    for value in ["call rejects", "memo rejects", "text"]:
+        memo.get_or_compute(
+            value, lambda v=value: v, cache_if=lambda v: v != "call rejects"
+        )
+    assert list(memo._entries) == ["text"]
+    assert memo.get_or_compute("other", lambda: "call rejects") == "call rejects"
+    assert "other" in memo
@@ -0,0 +1,75 @@
+"""Tests of Eurlex against the local Cellar mirror."""
+
+import pandas as pd
+import pytest
+
+from eurlex.eurlex import Eurlex
+from eurlex.mirror import MirrorServer, record_query
+
+QUERY = "select ?work where { ?work ?p ?o } limit 2"
+
+
+@pytest.fixture
+def root(tmp_path):
+    resource = tmp_path / "resource"
+    (resource / "32016R0679").mkdir(parents=True)
+    (resource / "32016R0679" / "text.html").write_text(
+        "<html><body>General Data Protection Regulation</body></html>"
+    )
+    (resource / "32016R0679" / "tree.xml").write_text("<NOTICE>tree</NOTICE>")
+    (resource / "32014R0001").mkdir()
+    (resource / "32014R0001" / "choices").write_text("doc1.html\ndoc2.html\n")
+    (resource / "32000R0000").mkdir()
+    (tmp_path / "items").mkdir()
+    (tmp_path / "items" / "doc1.html").write_text("<html><body>Part 1</body></html>")
+    (tmp_path / "items" / "doc2.html").write_text("<html><body>Part 2</body></html>")
+    record_query(str(tmp_path), QUERY, pd.DataFrame({"work": ["a", "b"]}))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def mirror(root):
+    with MirrorServer(root) as server:
+        yield server
+
+
+@pytest.fixture
+def eur(mirror):
+    return Eurlex(
+        endpoint=mirror.sparql_url,
+        resource_url=mirror.resource_url,
+        curia_url=mirror.curia_url,
+    )
+
+
+def test_mirror_text(eur):
+    assert "General Data Protection" in eur.get_data("32016R0679", "text")
+
+
+def test_mirror_multiple_choices(eur):
+    d = eur.get_data("32014R0001", "text", include_breaks=True)
+    assert d.index("Part 1") < d.index("Part 2")
+
+
+def test_mirror_not_acceptable(eur):
+    assert eur.get_data("32000R0000", "text") == "NaN406"
+
+
+def test_mirror_notice(eur, tmp_path):
+    filename = str(tmp_path / "tree.xml")
+    assert "tree" in eur.download_xml("32016R0679", notice="tree", filename=filename)
+    assert (
+        eur.get_data("32016R0679", "notice", notice="tree") == "<NOTICE>tree</NOTICE>"
+    )
+
+
+def test_mirror_replays_queries(eur):
+    assert eur.query_eurlex(QUERY)["work"].tolist() == ["a", "b"]
+
+
+def test_mirror_error_injection(root):
+    with MirrorServer(root, error_rate=1.0, seed=1) as mirror:
+        eur = Eurlex(endpoint=mirror.sparql_url, resource_url=mirror.resource_url)
+        assert eur.query_eurlex(QUERY).empty
+        assert eur.get_data("32016R0679", "ids") == "503"
+        assert mirror.requests == 2
@@ -0,0 +1,101 @@
+"""Tests of the text post-processing pipeline."""
+
+import os
+import shutil
+
+import pytest
+
+from eurlex.eurlex import Eurlex
+from eurlex.mirror import MirrorServer
+from eurlex.pipeline import (
+    TextPipeline,
+    normalize_whitespace,
+    process,
+    split_pages,
+    strip_headers_footers,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as reader:
+        return reader.read()
+
+
+def test_normalize_whitespace():
+    text = "  Article \t 1\xa0 \r\n\n\n\n  Scope  \n"
+    assert normalize_whitespace(text) == "Article 1\n\nScope"
+
+
+def test_split_pages():
+    text = "one---pagebreak---two\fthree---documentbreak---  ---pagebreak---four"
+    assert split_pages(text) == ["one", "two", "three", "four"]
+
+
+def test_strip_headers_footers():
+    bodies = ["Scope", "Definitions", "Principles", "Rights"]
+    pages = [
+        "Official Journal L 119\n{}\nArticle text\nPage {}".format(body, i)
+        for i, body in enumerate(bodies, 1)
+    ]
+    pages[1] += "\n"  # trailing blank lines do not count
+    stripped = strip_headers_footers(pages)
+    assert stripped[0] == "Scope"
+    assert all("Official Journal" not in page for page in stripped)
+    # a single page has nothing to compare with
+    assert strip_headers_footers(pages[:1]) == pages[:1]
+
+
+def test_process_html_and_pdf():
+    pages = process(
+        [
+            ("text/html; charset=UTF-8", _fixture("document.html")),
+            ("application/pdf", _fixture("document.pdf")),
+        ]
+    )
+    assert len(pages) == 2
+    assert pages[0].startswith("REGULATION")
+    assert all(page == normalize_whitespace(page) for page in pages)
+
+
+@pytest.fixture(scope="module")
+def mirror(tmp_path_factory):
+    root = tmp_path_factory.mktemp("mirror")
+    for celex, extension in [("32016R0001", "html"), ("32016R0002", "pdf")]:
+        resource = root / "resource" / celex
+        resource.mkdir(parents=True)
+        shutil.copy(
+            os.path.join(FIXTURES, "document." + extension),
+            resource / ("text." + extension),
+        )
+    (root / "resource" / "32016R0003").mkdir()
+    with MirrorServer(str(root)) as server:
+        yield server
+
+
+def test_pipeline_run(mirror):
+    eur = Eurlex(resource_url=mirror.resource_url)
+    pipeline = TextPipeline(eur, io_workers=2, processes=2, queue_size=1)
+    results = dict(pipeline.run(["32016R0001", "32016R0002", "32016R0003"]))
+    assert sorted(results) == ["32016R0001", "32016R0002", "32016R0003"]
+    assert len(results["32016R0001"]) >= 1
+    assert len(results["32016R0002"]) >= 1
+    # no manifestation in an acceptable format
+    assert results["32016R0003"] == []
+
+
+def test_pipeline_download_error():
+    eur = Eurlex(resource_url="http://127.0.0.1:1/resource/")
+    results = list(TextPipeline(eur, processes=1).run(["32016R0001"]))
+    assert results == [("32016R0001", None)]
+
+
+def test_pipeline_stops_when_closed_early(mirror):
+    eur = Eurlex(resource_url=mirror.resource_url)
+    results = TextPipeline(eur, io_workers=1, processes=1, queue_size=1).run(
+        ["32016R0001"] * 10
+    )
+    celex, pages = next(results)
+    assert celex == "32016R0001" and pages
+    results.close()
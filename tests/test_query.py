@@ -0,0 +1,116 @@
+"""Unit tests of the query objects and the query builder."""
+
+import pytest
+
+from eurlex.eurlex import Eurlex
+from eurlex.query import FIELDS, Query
+
+
+@pytest.fixture
+def eur():
+    return Eurlex()
+
+
+OPTIONS = [
+    {"resource_type": "caselaw", "order": True, "limit": 10},
+    {"resource_type": "directive", "include_date_transposed": True},
+    {"resource_type": "manual", "manual_type": "SWD", "include_date": True},
+    {
+        "resource_type": "regulation",
+        "include_eurovoc": True,
+        "include_author": True,
+        "include_title": True,
+        "language": ["en", "fr"],
+        "date_from": "2020-01-01",
+        "date_to": "2021-01-01",
+        "sector": 3,
+    },
+]
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_make_query_serializes_query(eur, options):
+    query = eur.make_query(as_query=True, **options)
+    assert isinstance(query, Query)
+    assert str(query) == eur.make_query(**options)
+    assert "\n" not in str(query)
+
+
+def test_builder_matches_make_query(eur):
+    builder = eur.query("regulation").select("celex", "date", "eurovoc")
+    assert str(builder) == eur.make_query(
+        resource_type="regulation", include_date=True, include_eurovoc=True
+    )
+    query = builder.between("2020-01-01", "2021-01-01").order_by("date").limit(5)
+    assert str(query) == eur.make_query(
+        resource_type="regulation",
+        include_date=True,
+        include_eurovoc=True,
+        date_from="2020-01-01",
+        date_to="2021-01-01",
+        order=True,
+        limit=5,
+    )
+    # the base builder is not changed
+    assert builder.build().limit is None
+    assert str(builder.select("title").language("fr")) == eur.make_query(
+        resource_type="regulation",
+        include_celex=False,
+        include_title=True,
+        language="fr",
+    )
+    with pytest.raises(AssertionError):
+        builder.select("unknown")
+    assert "title" in FIELDS
+
+
+def test_equality_and_hash(eur):
+    first = eur.make_query(resource_type="directive", as_query=True)
+    second = eur.query("directive").build()
+    assert first == second and hash(first) == hash(second)
+    assert first.fingerprint == second.fingerprint
+    assert first != first.replace(limit=10)
+    assert len({first, second, first.replace(limit=10)}) == 2
+
+
+def test_diff(eur):
+    first = eur.make_query(resource_type="directive", as_query=True)
+    second = eur.make_query(
+        resource_type="directive", include_date=True, limit=10, as_query=True
+    )
+    assert first.diff(first) == {}
+    diff = first.diff(second)
+    assert diff["variables"] == {"removed": [], "added": ["?date"]}
+    assert diff["patterns"]["added"] == [
+        "OPTIONAL{?work cdm:work_date_document ?date.}"
+    ]
+    assert diff["limit"] == (None, 10)
+
+
+def test_count(eur):
+    query = eur.make_query(
+        resource_type="directive", order=True, limit=10, as_query=True
+    )
+    count = query.count()
+    sparql = str(count)
+    assert "select (count(*) as ?count) where{{ select distinct ?work" in sparql
+    assert "order by" not in sparql and "limit" not in sparql
+    assert eur.count_query(query) == sparql
+
+
+def test_pages_and_shards(eur):
+    query = eur.make_query(resource_type="directive", as_query=True)
+    pages = list(query.pages(1000, rows=2500))
+    assert [(p.limit, p.offset) for p in pages] == [
+        (1000, 0),
+        (1000, 1000),
+        (1000, 2000),
+    ]
+    assert all(p.order_by == ("?work",) for p in pages)
+    assert str(pages[1]).endswith("order by ?work limit 1000 offset 1000")
+    ordered = query.order("desc(?date)", "work")
+    assert ordered.page(0, 10).order_by == ("desc(?date)", "?work")
+    shards = list(query.shards("2020-01-01", "2022-07-01"))
+    assert len(shards) == 3
+    assert '?date >= "2022-01-01"^^xsd:date' in str(shards[-1])
+    assert '?date < "2022-07-01"^^xsd:date' in str(shards[-1])
@@ -0,0 +1,34 @@
+"""Unit tests for compressed storage of notices and texts."""
+
+import pytest
+
+from eurlex import storage
+
+
+def test_compress_roundtrip_gzip():
+    data = b"<xml>notice</xml>" * 100
+    compressed = storage.compress(data, "gzip")
+    assert len(compressed) < len(data)
+    assert storage.decompress(compressed) == data
+
+
+def test_compress_none_is_identity():
+    assert storage.compress(b"data") == b"data"
+    assert storage.decompress(b"data") == b"data"
+
+
+def test_compress_invalid_type():
+    with pytest.raises(ValueError):
+        storage.compress(b"data", "lzma")
+
+
+def test_compressed_filename():
+    assert storage.compressed_filename("notice.xml", "gzip") == "notice.xml.gz"
+    assert storage.compressed_filename("notice.xml.zst", "zstd") == "notice.xml.zst"
+    assert storage.compressed_filename("notice.xml") == "notice.xml"
+
+
+def test_read_file_decompresses(tmp_path):
+    path = tmp_path / "notice.xml.gz"
+    path.write_bytes(storage.compress(b"<xml/>", "gzip"))
+    assert storage.read_file(str(path)) == b"<xml/>"